@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+asyncio API for the puzzle crackers
+The command-line crackers block, print as they go and leave decoded_*.txt
+and friends behind. This module drives the same sweep (test_key_range,
+verify_key, find_misspellings) from an event loop instead: blocks run on a
+process pool, output from the workers is captured rather than printed,
+and results come back as objects.
+
+    async with AsyncCracker() as cracker:
+        async for event in cracker.crack('PUZZLE-EASY.txt', 4):
+            if isinstance(event, Progress):
+                ...
+            elif isinstance(event, Done):
+                result = event.result    # CrackResult or None
+
+Cancelling the task that iterates crack() cancels the queued blocks; the
+ones already running finish within one block (about a second). One
+AsyncCracker can serve many concurrent cracks, which share its pool.
+
+Usage (demo):
+python async_api.py PUZZLE.txt 9|mask [start_key] [end_key] [-1 charset ...] [--construction=SPEC]
+"""
+
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from collections import namedtuple
+
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from crack_puzzle import ChunkSizer
+from keyspace import KeySpace, parse_charset_options
+from puzzle_solver import (
+    FREQUENT_WORDS, TEXT_WORDS, find_duplicate_hashes, find_misspellings, load_hashes,
+    load_verification_wordlist, swept_until, test_key_range, verify_key,
+)
+from workers import plan_workers
+
+Progress = namedtuple('Progress', 'keys_done keys_total elapsed')
+Candidate = namedtuple('Candidate', 'key construction matched')
+Done = namedtuple('Done', 'result elapsed')
+
+CrackResult = namedtuple('CrackResult', 'key construction hash_to_word decoded_text unmatched')
+Misspelling = namedtuple('Misspelling', 'word variant hash')
+
+# Target duration of one block: short enough that cancelling a crack, or a
+# second crack sharing the pool, never waits long for a running block
+TARGET_BLOCK_SECONDS = 1.0
+
+# Loaded on first use in each worker process and kept for its lifetime
+_wordlist = None
+
+def _quietly(func, *args, **kwargs):
+    """Run func with its prints swallowed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+def _prepare(puzzle, construction):
+    """(hashes, hash set, duplicates, fitting constructions) for a puzzle
+
+    Loading the puzzle and parsing constructions (which calibrates the hash
+    backends) take long enough to stall the event loop, so they run here on
+    the executor like the sweep itself.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        puzzle_hashes = load_hashes(puzzle) if isinstance(puzzle, str) else list(puzzle)
+        constructions = applicable_constructions(parse_constructions(construction), puzzle_hashes)
+        return puzzle_hashes, set(puzzle_hashes), find_duplicate_hashes(puzzle_hashes), constructions
+
+def _timed_block(task):
+    started = time.perf_counter()
+    result = _quietly(test_key_range, task)
+    return result, time.perf_counter() - started
+
+def _verification_wordlist():
+    global _wordlist
+    if _wordlist is None:
+        _wordlist = _quietly(load_verification_wordlist)
+    return _wordlist
+
+def _verify(key, puzzle_hashes, construction):
+    with contextlib.redirect_stdout(io.StringIO()):
+        verified = verify_key(key, puzzle_hashes, _verification_wordlist(),
+                              save_to_file=False, hasher=construction)
+    if not verified:
+        return None
+    key, hash_to_word, decoded_text, unmatched = verified
+    return CrackResult(key, construction, hash_to_word, decoded_text, unmatched)
+
+def _find(key, unmatched, decoded_text, construction):
+    found = _quietly(find_misspellings, key, unmatched, decoded_text, save_to_file=False,
+                     hasher=construction)
+    return [Misspelling(*m) for m in found]
+
+class AsyncCracker:
+    """Runs sweeps for an event loop on a shared process pool
+
+    A caller-supplied executor should come with its worker count, which
+    sizes the window of blocks kept in flight; without one the count the
+    worker plan would pick is assumed.
+    """
+
+    def __init__(self, executor=None, num_processes=None):
+        plan = plan_workers(max_workers=num_processes)
+        if executor is None:
+            self.num_processes = plan.count
+            self.executor = plan.make_executor()
+            self._owns_executor = True
+        else:
+            self.num_processes = num_processes or plan.count
+            self.executor = executor
+            self._owns_executor = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def crack(self, puzzle, key_length, start_key=None, end_key=None, charsets=None, construction=None):
+        """Sweep a key space; yields Progress and Candidate events, then one Done
+
+        puzzle is a puzzle file name or a list of hashes.
+        """
+        started = time.monotonic()
+        puzzle_hashes, hash_set, duplicate_hashes, constructions = await self._run(_prepare, puzzle, construction)
+        keyspace = KeySpace.from_spec(key_length, charsets)
+        start_key = start_key or 0
+        end_key = end_key or len(keyspace)
+        text_words_encoded = [(word, word.encode('utf-8')) for word in TEXT_WORDS]
+        sizer = ChunkSizer(self.num_processes, target_seconds=TARGET_BLOCK_SECONDS)
+
+        position = start_key
+        # Rests of blocks that stopped at a promising key, swept before
+        # anything past position
+        unswept = []
+        keys_done = 0
+        pending = {}
+        verifying = set()
+        window = self.num_processes * 2
+        try:
+            while True:
+                while (unswept or position < end_key) and len(pending) < window:
+                    if unswept:
+                        block_start, range_end = unswept.pop()
+                        block_end = block_start + sizer.next_size(range_end - block_start)
+                        if block_end < range_end:
+                            unswept.append((block_end, range_end))
+                    else:
+                        block_start = position
+                        block_end = position = position + sizer.next_size(end_key - position)
+                    task = (block_start, block_end, 1, keyspace, duplicate_hashes, hash_set,
+                            FREQUENT_WORDS, text_words_encoded, constructions)
+                    pending[self._run(_timed_block, task)] = task
+                if not pending and not verifying:
+                    break
+
+                done, _ = await asyncio.wait(set(pending) | verifying, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future in verifying:
+                        verifying.discard(future)
+                        result = future.result()
+                        if result is not None:
+                            yield Done(result, time.monotonic() - started)
+                            return
+                        continue
+                    task = pending.pop(future)
+                    found, elapsed = future.result()
+                    block_start, block_end = task[:2]
+                    stop = swept_until(task, found)
+                    if stop < block_end:
+                        unswept.append((stop, block_end))
+                    sizer.record(stop - block_start, elapsed)
+                    keys_done += stop - block_start
+                    yield Progress(keys_done, end_key - start_key, time.monotonic() - started)
+                    if found:
+                        _, key, matches, _, found_construction = found
+                        yield Candidate(key, found_construction, len(matches))
+                        verifying.add(self._run(_verify, key, puzzle_hashes, found_construction))
+            yield Done(None, time.monotonic() - started)
+        finally:
+            # Reached on success, on error and when the consuming task is
+            # cancelled: drop every block that has not started yet
+            for future in list(pending) + list(verifying):
+                future.cancel()
+
+    async def crack_key(self, *args, **kwargs):
+        """Run crack() to completion and return its CrackResult (or None)"""
+        async for event in self.crack(*args, **kwargs):
+            if isinstance(event, Done):
+                return event.result
+
+    async def verify(self, puzzle, key, construction=None):
+        """CrackResult for a known key, or None if it does not verify"""
+        puzzle_hashes, _, _, constructions = await self._run(_prepare, puzzle, construction)
+        for candidate in constructions:
+            result = await self._run(_verify, key, puzzle_hashes, candidate)
+            if result is not None:
+                return result
+        return None
+
+    async def find_misspellings(self, result):
+        """Misspellings in the unmatched hashes of a CrackResult"""
+        return await self._run(_find, result.key, result.unmatched, result.decoded_text, result.construction)
+
+async def _demo(puzzle_file, key_length, start_key, end_key, charsets, construction):
+    async with AsyncCracker() as cracker:
+        async for event in cracker.crack(puzzle_file, key_length, start_key, end_key, charsets, construction):
+            if isinstance(event, Progress):
+                print(f"{event.keys_done}/{event.keys_total} keys in {event.elapsed:.1f}s")
+            elif isinstance(event, Candidate):
+                print(f"Promising key: {event.key} ({event.construction.name}, {event.matched} text words)")
+            elif event.result:
+                print(f"Found key {event.result.key} ({event.result.construction.name}) in {event.elapsed:.1f}s")
+                print(event.result.decoded_text)
+            else:
+                print(f"No key found ({event.elapsed:.1f}s)")
+
+def main():
+    """Main entry point"""
+    charsets, args = parse_charset_options(sys.argv[1:])
+    construction, args = pop_construction_option(args)
+    if len(args) < 2:
+        print(__doc__)
+        return
+    start_key = int(args[2]) if len(args) > 2 else None
+    end_key = int(args[3]) if len(args) > 3 else None
+    asyncio.run(_demo(args[0], args[1], start_key, end_key, charsets, construction))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Context-ranked candidates for [MISSING] slots.
+
+verify_key only decodes lowercase words from its wordlist, so every
+capitalised, punctuated or rare token is left as [MISSING], and the old
+misspelling search answered those by hashing variants of frequency-ordered
+words with no regard for where the slot sits. Here an interpolated trigram
+model built from the decoded text, the source passages and the 20k.txt
+frequency ranks scores each vocabulary word by its neighbours, and a single
+priority queue across all slots hashes the most likely (slot, word) pairs
+first. Resolved slots feed back into their neighbours' context. A
+candidate's likely typos (typos.likely_typos) are queued behind its exact
+forms at a penalty and the rest of its Hamming variants behind those, so a
+misspelling is found near its intended word rather than after a sweep of
+the whole wordlist.
+"""
+
+import glob
+import heapq
+import math
+import os
+import string
+from collections import Counter, defaultdict
+
+from hash_backends import get_hasher
+from typos import likely_typos
+
+MISSING = "[MISSING]"
+SOURCE_PASSAGES = 'source_passage*.txt'
+RANK_FILES = ('20k.txt',)
+
+# Interpolation weights for trigram, bigram and unigram estimates
+LAMBDAS = (0.6, 0.3, 0.1)
+
+# Neighbours within this distance count as loose (skip-gram) context, and
+# how strongly co-occurring with them lifts a word above its unigram rate
+SKIP_WINDOW = 3
+SKIP_WEIGHT = 0.1
+
+# Punctuation a token may carry after the word itself
+SUFFIXES = ('', ',', '.', ';', ':', '!', '?', '"', "'")
+VARIANT_SUFFIXES = ('', ',', '.')
+
+# Log-probability charged for guessing a misspelling instead of the word,
+# and extra for one outside the typo model's likely head
+MISSPELLING_PENALTY = math.log(1e-3)
+UNLIKELY_TYPO_PENALTY = math.log(0.05)
+
+def normalize(token):
+    """Lowercase a token and strip surrounding punctuation"""
+    return token.lower().strip(string.punctuation + '“”‘’')
+
+def tokenize(text):
+    """Normalized tokens with None for [MISSING] slots (which break n-grams)"""
+    tokens = []
+    for raw in text.split():
+        if raw == MISSING:
+            tokens.append(None)
+        else:
+            tokens.append(normalize(raw) or None)
+    return tokens
+
+class NGramModel:
+    """Interpolated trigram model with a Zipf prior from word ranks"""
+
+    def __init__(self):
+        self.unigrams = Counter()
+        self.bigrams = Counter()
+        self.trigrams = Counter()
+        self.followers = defaultdict(set)
+        self.predecessors = defaultdict(set)
+        self.surface = defaultdict(Counter)
+        self.cooccur = defaultdict(Counter)
+        self.prior = {}
+        self.total = 0
+        self._by_unigram = None
+
+    def add_text(self, text):
+        """Count n-grams and surface forms in a passage or decoded text"""
+        for raw in text.split():
+            word = normalize(raw)
+            if raw != MISSING and word:
+                self.surface[word][raw] += 1
+        tokens = tokenize(text)
+        for i, word in enumerate(tokens):
+            if word is None:
+                continue
+            self.unigrams[word] += 1
+            self.total += 1
+            prev1 = tokens[i - 1] if i > 0 else None
+            prev2 = tokens[i - 2] if i > 1 else None
+            if prev1 is not None:
+                self.bigrams[prev1, word] += 1
+                self.followers[prev1].add(word)
+                self.predecessors[word].add(prev1)
+                if prev2 is not None:
+                    self.trigrams[prev2, prev1, word] += 1
+            for other in tokens[max(0, i - SKIP_WINDOW):i]:
+                if other is not None:
+                    self.cooccur[other][word] += 1
+                    self.cooccur[word][other] += 1
+        self._by_unigram = None
+
+    def add_ranks(self, words):
+        """Zipf prior: the word at rank r gets weight 1 / (r + 10)"""
+        for rank, word in enumerate(words):
+            word = normalize(word)
+            if word and word not in self.prior:
+                self.prior[word] = 1.0 / (rank + 10)
+        norm = sum(self.prior.values())
+        self.prior = {w: p / norm for w, p in self.prior.items()}
+        self._by_unigram = None
+
+    @classmethod
+    def build(cls, decoded_text='', passages=None, rank_files=RANK_FILES):
+        """Model from the decoded text, source passages and rank wordlists"""
+        model = cls()
+        if passages is None:
+            passages = []
+            for filename in sorted(glob.glob(SOURCE_PASSAGES)):
+                with open(filename, 'r') as f:
+                    passages.append(f.read())
+        for passage in passages:
+            model.add_text(passage)
+        if decoded_text:
+            model.add_text(decoded_text)
+        ranked = []
+        for filename in rank_files:
+            if os.path.exists(filename):
+                with open(filename, 'r') as f:
+                    ranked.extend(line.strip() for line in f if line.strip())
+        model.add_ranks(ranked)
+        return model
+
+    def unigram(self, word):
+        counted = self.unigrams[word] / self.total if self.total else 0.0
+        if not self.prior:
+            return counted or 1e-9
+        return 0.5 * counted + 0.5 * self.prior.get(word, 0.0) or 1e-9
+
+    def prob(self, word, prev2, prev1):
+        """P(word | prev2 prev1), interpolated down to the unigram estimate"""
+        l3, l2, l1 = LAMBDAS
+        p = l1 * self.unigram(word)
+        if prev1 is not None and self.unigrams[prev1]:
+            p += l2 * self.bigrams[prev1, word] / self.unigrams[prev1]
+            if prev2 is not None and self.bigrams[prev2, prev1]:
+                p += l3 * self.trigrams[prev2, prev1, word] / self.bigrams[prev2, prev1]
+        return p
+
+    def slot_score(self, word, prev2, prev1, next1, next2):
+        """log P of word in the slot and of the two words that follow it"""
+        score = math.log(self.prob(word, prev2, prev1))
+        if next1 is not None:
+            score += math.log(self.prob(next1, prev1, word))
+            if next2 is not None:
+                score += math.log(self.prob(next2, word, next1))
+        return score
+
+    def skip_boost(self, word, window):
+        """log lift of word from co-occurring with the slot's wider neighbourhood"""
+        lift = 0.0
+        for other in window:
+            seen = self.cooccur.get(other)
+            if seen and word in seen:
+                lift += seen[word] / sum(seen.values())
+        if not lift:
+            return 0.0
+        return math.log(1 + SKIP_WEIGHT * lift / len(window) / self.unigram(word))
+
+    def known(self, word):
+        return word in self.unigrams or word in self.prior
+
+    def by_unigram(self):
+        """Vocabulary sorted by unigram probability, computed once"""
+        if self._by_unigram is None:
+            vocabulary = set(self.unigrams) | set(self.prior)
+            self._by_unigram = sorted(vocabulary, key=self.unigram, reverse=True)
+        return self._by_unigram
+
+    def ranked(self, tokens, i):
+        """Yield (score, word) for slot i in descending score order
+
+        Only words seen near the slot's neighbours get a context score;
+        for every other word the context terms are constant, so the rest of
+        the vocabulary follows in unigram order without being scored.
+        """
+        prev1 = tokens[i - 1] if i > 0 else None
+        prev2 = tokens[i - 2] if i > 1 else None
+        next1 = tokens[i + 1] if i + 1 < len(tokens) else None
+        next2 = tokens[i + 2] if i + 2 < len(tokens) else None
+
+        window = [t for t in tokens[max(0, i - SKIP_WINDOW):i + SKIP_WINDOW + 1] if t is not None]
+
+        context = set()
+        if prev1 is not None:
+            context |= self.followers[prev1]
+        if next1 is not None:
+            context |= self.predecessors[next1]
+        for other in window:
+            if other in self.cooccur:
+                context |= self.cooccur[other].keys()
+        scored = sorted(((self.slot_score(w, prev2, prev1, next1, next2) + self.skip_boost(w, window), w)
+                         for w in context), reverse=True)
+
+        # Score of a context-free word differs from its unigram log-prob by a
+        # constant; measure it once on any word outside the context set
+        offset = None
+        tail = (w for w in self.by_unigram() if w not in context)
+        j = 0
+        for word in tail:
+            if offset is None:
+                offset = (self.slot_score(word, prev2, prev1, next1, next2)
+                          - math.log(LAMBDAS[2] * self.unigram(word)))
+            score = math.log(LAMBDAS[2] * self.unigram(word)) + offset
+            while j < len(scored) and scored[j][0] >= score:
+                yield scored[j]
+                j += 1
+            yield score, word
+        yield from scored[j:]
+
+    def surface_forms(self, word):
+        """Spellings a token for word may take, observed forms first"""
+        forms = [form for form, _ in self.surface[word].most_common()]
+        for base in (word, word.capitalize(), word.upper()):
+            for suffix in SUFFIXES:
+                forms.append(base + suffix)
+        return list(dict.fromkeys(forms))
+
+    def variant_bases(self, word):
+        """Bare spellings whose Hamming variants are worth hashing for a misspelling"""
+        forms = [form.strip(string.punctuation) for form, _ in self.surface[word].most_common(2)]
+        return [form for form in dict.fromkeys(forms + [word, word.capitalize()]) if form]
+
+def is_typo(model, slot_hash, h, form):
+    """Whether a variant matching h is a misspelling of the word queued for its slot
+
+    A variant is only within the typo model's edit distance of the word it
+    was generated from, so it is a typo only if h is that slot's own hash;
+    a variant that lands on another slot, or that is itself a word the
+    reference corpora know, is just that slot's token.
+    """
+    return h == slot_hash and not model.known(normalize(form))
+
+def resolve_missing(key, unmatched_hashes, decoded_text, hasher=None, model=None,
+                    max_hashes=5000000, variants=None):
+    """Fill [MISSING] slots by hashing candidates in descending likelihood
+
+    variants(word) generates the misspellings of a candidate beyond its
+    likely typos (typos.unlikely_typos in puzzle_solver); without it only
+    exact forms are tried.
+    Returns (resolved, found_misspellings, hashes_tried) where resolved maps
+    slot index -> (word, token, hash) and found_misspellings holds
+    (word, variant, hash) like find_misspellings.
+    """
+    hasher = hasher or get_hasher()
+    model = model or NGramModel.build(decoded_text)
+    key_encoded = str(key).encode('utf-8')
+    tokens = tokenize(decoded_text)
+    raw = decoded_text.split()
+    slots = [i for i, token in enumerate(raw) if token == MISSING]
+
+    # The k-th [MISSING] slot holds the k-th unmatched hash
+    slot_hash = dict(zip(slots, unmatched_hashes))
+    remaining = set(slot_hash.values())
+    open_slots = set(slot_hash)
+    resolved = {}
+    found_misspellings = []
+    hashes_tried = 0
+
+    # Heap entries: (-score, tie, slot, version, kind, word). A slot's
+    # version bumps whenever a neighbour resolves, which re-ranks it and
+    # retires the exact candidates queued from its old context
+    queue = []
+    streams = {}
+    versions = Counter()
+    # Every hash is checked against all remaining slots, so a word's forms
+    # and variants only ever need hashing once, whichever slot queued them
+    tried = set()
+    tie = 0
+
+    def push_next(slot):
+        nonlocal tie
+        for score, word in streams[slot]:
+            if ('exact', word) in tried:
+                continue
+            tie += 1
+            heapq.heappush(queue, (-score, tie, slot, versions[slot], 'exact', word))
+            return
+
+    def open_stream(slot):
+        versions[slot] += 1
+        streams[slot] = model.ranked(tokens, slot)
+        push_next(slot)
+
+    for slot in slots:
+        open_stream(slot)
+
+    while queue and open_slots and hashes_tried < max_hashes:
+        neg_score, _, slot, version, kind, word = heapq.heappop(queue)
+        if slot not in open_slots or (kind == 'exact' and version != versions[slot]):
+            continue
+        if (kind, word) in tried:
+            if kind == 'exact':
+                push_next(slot)
+            continue
+        tried.add((kind, word))
+        if kind == 'exact':
+            forms = model.surface_forms(word)
+            # Like the old search, very short words are not worth misspelling
+            if variants is not None and len(word) >= 3:
+                tie += 1
+                heapq.heappush(queue, (neg_score - MISSPELLING_PENALTY, tie, slot, version, 'typo', word))
+            push_next(slot)
+        elif kind == 'typo':
+            forms = []
+            for base in model.variant_bases(word):
+                for variant in likely_typos(base):
+                    forms.extend(variant + suffix for suffix in VARIANT_SUFFIXES)
+            tie += 1
+            heapq.heappush(queue, (neg_score - UNLIKELY_TYPO_PENALTY, tie, slot, version, 'variant', word))
+        else:
+            forms = []
+            for base in model.variant_bases(word):
+                for variant in variants(base):
+                    forms.extend(variant + suffix for suffix in VARIANT_SUFFIXES)
+        hashes_tried += len(forms)
+
+        for form, h in zip(forms, hasher.many(key_encoded, [f.encode('utf-8') for f in forms])):
+            if h not in remaining:
+                continue
+            remaining.discard(h)
+            word_here = word
+            if kind != 'exact' and is_typo(model, slot_hash[slot], h, form):
+                print(f"FOUND MISSPELLING! '{word}' -> '{form}' after {hashes_tried} hashes")
+                print(f"Hash: {h}")
+                found_misspellings.append((word, form, h))
+            elif kind != 'exact':
+                word_here = normalize(form)
+            filled = [s for s in open_slots if slot_hash[s] == h]
+            for s in filled:
+                open_slots.discard(s)
+                resolved[s] = (word_here, form, h)
+                tokens[s] = word_here
+            # Resolved words become context for slots up to two positions away
+            for s in filled:
+                for neighbour in range(s - 2, s + 3):
+                    if neighbour in open_slots:
+                        open_stream(neighbour)
+
+    print(f"Resolved {len(resolved)}/{len(slots)} missing slots with {hashes_tried} hashes")
+    return resolved, found_misspellings, hashes_tried
+
+def fill_decoded(decoded_text, resolved):
+    """Decoded text with resolved slots replaced by their tokens"""
+    words = decoded_text.split()
+    for slot, (_, token, _) in resolved.items():
+        words[slot] = token
+    return " ".join(words)
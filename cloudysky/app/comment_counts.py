@@ -0,0 +1,38 @@
+# app/comment_counts.py
+"""
+Rebuilding and checking the denormalized comment counters on Post.
+
+Post.comment_count and Post.visible_comment_count are kept up to date by
+Comment.objects.create() and Comment.hide(). Rows written any other way
+(bulk_create, raw SQL, a user deleted with their comments) leave them
+stale; comment_count_mismatches() finds such posts and
+backfill_comment_counts() recomputes every post in one UPDATE.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _counted(comments):
+    """Per-post COUNT of comments, as a subquery for Post.objects.update()"""
+    counts = (comments.filter(post=OuterRef('pk')).order_by().values('post')
+              .annotate(n=Count('id')).values('n'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill_comment_counts():
+    """Recompute both counters for every post; returns the number of posts"""
+    from .models import Post, Comment
+    return Post.objects.update(
+        comment_count=_counted(Comment.objects.all()),
+        visible_comment_count=_counted(Comment.objects.filter(hidden=False)),
+    )
+
+
+def comment_count_mismatches():
+    """Posts whose stored counters disagree with their comments"""
+    from .models import Post
+    return (Post.objects
+            .annotate(actual_count=Count('comment'),
+                      actual_visible_count=Count('comment', filter=Q(comment__hidden=False)))
+            .exclude(comment_count=F('actual_count'), visible_comment_count=F('actual_visible_count'))
+            .order_by('id'))
@@ -0,0 +1,78 @@
+# app/contention.py
+"""
+Write-lock contention handling for the write views.
+
+SQLite allows one writer at a time. A transaction that starts deferred
+and upgrades to a write lock part-way can fail straight away with
+"database is locked" (the busy timeout doesn't apply to a lock upgrade
+that would deadlock), so the database profiles set transaction_mode
+IMMEDIATE: atomic() blocks begin with BEGIN IMMEDIATE and wait their
+turn for the lock under the busy timeout instead.
+
+@retry_writes runs a POST view inside one such transaction. If the lock
+still can't be had, the whole transaction is retried after a jittered
+exponential backoff, until WRITE_RETRY_BUDGET_MS is spent; then the
+client gets a 503 with a Retry-After header instead of an error. A view
+with slow work ahead of its writes (createUser hashes the password) calls
+run_with_retry() on just the writes, so the lock isn't held meanwhile.
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.http import JsonResponse
+
+BACKOFF_BASE = 0.01
+BACKOFF_CAP = 0.25
+
+class WriteContention(Exception):
+    """The write lock stayed busy for the whole retry budget"""
+
+    def __init__(self, attempts, retry_after):
+        super().__init__(f"database busy after {attempts} attempts")
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, OperationalError) and ('locked' in message or 'busy' in message)
+
+def run_with_retry(func, budget_ms=None):
+    """Run func() in a transaction, retrying it while the database is locked"""
+    if budget_ms is None:
+        budget_ms = getattr(settings, 'WRITE_RETRY_BUDGET_MS', 3000)
+    deadline = time.monotonic() + budget_ms / 1000
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with transaction.atomic():
+                return func()
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+        # Full jitter: spread the retries of writers that collided together
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            raise WriteContention(attempt, retry_after=max(1, round(budget_ms / 1000)))
+        time.sleep(delay)
+
+def busy_response(contention):
+    """The 503 + Retry-After answer for a write that ran out of retries"""
+    response = JsonResponse({'error': 'Database busy, try again later'}, status=503)
+    response['Retry-After'] = str(contention.retry_after)
+    return response
+
+def retry_writes(view):
+    """Run a view's POSTs through run_with_retry(); 503 + Retry-After when it gives up"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view(request, *args, **kwargs)
+        try:
+            return run_with_retry(lambda: view(request, *args, **kwargs))
+        except WriteContention as e:
+            return busy_response(e)
+    return wrapper
@@ -0,0 +1,188 @@
+# app/feed_cache.py
+"""
+Cache of rendered feed pages, one set per visibility class.
+
+A feed's JSON depends only on who is looking: staff see everything, an
+authenticated author additionally sees their own hidden posts in app/feed,
+and everyone else sees the public feed. Pages are cached per (feed, class,
+request path) on Django's cache framework under a generation number per
+(feed, class); the write views bump exactly the generations their change
+can affect, which orphans the stale pages without having to find them:
+
+    create_post      every class of both feeds
+    create_comment   every class of both feeds (app/feed shows comment counts)
+    hide_post        the public and author classes of both feeds
+    hide_comment     the public and author classes of both feeds
+
+A miss is rebuilt by one request at a time per page (single-flight): the
+first takes a short lock with cache.add(), the rest wait for its result
+instead of all querying the database at once.
+
+Settings:
+    FEED_CACHE_ALIAS     cache to use (default 'default')
+    FEED_CACHE_TIMEOUT   seconds a page lives without invalidation (default 300)
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+FEEDS = ('app_feed', 'dump_feed')
+
+# How long a rebuild may hold the lock, and how often waiters look for
+# its result
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.01
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'rebuilds': 0, 'rebuild_seconds': 0.0}
+
+def feed_cache():
+    return caches[getattr(settings, 'FEED_CACHE_ALIAS', 'default')]
+
+def _record(**counts):
+    with _stats_lock:
+        for name, value in counts.items():
+            _stats[name] += value
+
+def cache_stats():
+    """Hit rate and rebuild time of the feed cache in this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    stats['mean_rebuild_ms'] = (1000 * stats['rebuild_seconds'] / stats['rebuilds']
+                                if stats['rebuilds'] else 0.0)
+    return stats
+
+def reset_cache_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+# ======= Generations =======
+def _generation_key(feed, vclass):
+    return f'feedcache:gen:{feed}:{vclass}'
+
+def generation(feed, vclass):
+    cache = feed_cache()
+    key = _generation_key(feed, vclass)
+    value = cache.get(key)
+    if value is None:
+        # Start from the clock rather than 1, so a generation that was
+        # evicted never comes back as a number old pages were stored under
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+def bump(feed, vclass):
+    # Only once the write commits: bumping earlier would let a reader
+    # rebuild the page from the old rows under the new generation
+    transaction.on_commit(lambda: _bump(feed, vclass))
+
+def _bump(feed, vclass):
+    cache = feed_cache()
+    key = _generation_key(feed, vclass)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+def post_created():
+    for feed in FEEDS:
+        bump(feed, 'staff')
+        bump(feed, 'public')
+
+def post_hidden():
+    # Author classes are keyed on the public generation too
+    for feed in FEEDS:
+        bump(feed, 'public')
+
+def comment_created():
+    for feed in FEEDS:
+        bump(feed, 'staff')
+        bump(feed, 'public')
+
+def comment_hidden():
+    # Staff comment counts include hidden comments
+    for feed in FEEDS:
+        bump(feed, 'public')
+
+# ======= Lookup =======
+def visibility_class(request, feed):
+    """('staff' | 'public' | 'author:<id>', generation class) for this viewer"""
+    user = request.user
+    if user.is_authenticated and user.is_staff:
+        return 'staff', 'staff'
+    if user.is_authenticated and feed == 'app_feed':
+        return f'author:{user.id}', 'public'
+    return 'public', 'public'
+
+def page_key(request, feed):
+    vclass, gen_class = visibility_class(request, feed)
+    # The next link is an absolute URL, so the host is part of the page
+    page = hashlib.md5(f'{request.get_host()}{request.get_full_path()}'.encode('utf-8')).hexdigest()
+    return f'feedcache:page:{feed}:{vclass}:{generation(feed, gen_class)}:{page}'
+
+def single_flight(key, build, timeout=None):
+    """
+    Cached value of key, calling build() on a miss. Concurrent misses on
+    the same key wait for the first one's result; build() returns
+    (value, cacheable).
+    """
+    cache = feed_cache()
+    value = cache.get(key)
+    if value is not None:
+        _record(hits=1)
+        return value
+    _record(misses=1)
+
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        # Someone else is rebuilding this page; past the deadline assume
+        # they died and rebuild it ourselves
+        _record(waits=1)
+        time.sleep(WAIT_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() > deadline:
+            break
+    try:
+        started = time.perf_counter()
+        value, cacheable = build()
+        _record(rebuilds=1, rebuild_seconds=time.perf_counter() - started)
+        if cacheable:
+            cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+def cached_feed(feed):
+    """Serve a feed view's GET responses from the cache"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            outcome = []
+
+            def build():
+                response = view(request, *args, **kwargs)
+                outcome.append('miss')
+                return ((response.status_code, response['Content-Type'], response.content),
+                        response.status_code == 200)
+
+            timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', 300)
+            status, content_type, content = single_flight(page_key(request, feed), build, timeout)
+            response = HttpResponse(content, status=status, content_type=content_type)
+            response['X-Feed-Cache'] = outcome[0] if outcome else 'hit'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.comment_counts import backfill_comment_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute every post's total and visible comment counts from its comments"
+
+    def handle(self, *args, **options):
+        updated = backfill_comment_counts()
+        self.stdout.write(f"Recomputed comment counts for {updated} posts")
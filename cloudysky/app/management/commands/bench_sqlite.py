@@ -0,0 +1,150 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+
+from cloudysky.db_profiles import PROFILES
+
+from ..stats import percentile
+
+FEED_PAGE = 50
+
+
+class Client(threading.Thread):
+    """Runs feed reads or comment writes through the ORM until the deadline"""
+
+    def __init__(self, writer, deadline, seed, users, post_ids):
+        super().__init__()
+        self.writer = writer
+        self.deadline = deadline
+        self.seed = seed
+        self.users = users
+        self.post_ids = post_ids
+        self.latencies = []
+        self.errors = 0
+
+    def read(self):
+        from app.views import feed_posts
+        # The posts and, prefetched, their visible comments: two queries
+        list(feed_posts(False)[:FEED_PAGE])
+
+    def write(self, n):
+        from app.models import Comment
+        post_id = self.post_ids[(self.seed * 7919 + n) % len(self.post_ids)]
+        Comment.objects.create(user=self.users[n % len(self.users)], post_id=post_id,
+                               content=f'comment {n}')
+
+    def run(self):
+        n = 0
+        try:
+            while time.monotonic() < self.deadline:
+                # Each iteration is one request: Django closes or reuses the
+                # connection at its start and end per CONN_MAX_AGE
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    if self.writer:
+                        self.write(n)
+                    else:
+                        self.read()
+                    self.latencies.append(time.perf_counter() - started)
+                except OperationalError:
+                    # "database is locked" once the busy timeout runs out
+                    self.errors += 1
+                finally:
+                    close_old_connections()
+                n += 1
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Measure feed-read and comment-write throughput of each SQLite profile "
+            "under concurrent clients, on a scratch database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help='concurrent clients (default 8)')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='how many of the clients write (default 2)')
+        parser.add_argument('--seconds', type=float, default=5, help='run time per profile (default 5)')
+        parser.add_argument('--posts', type=int, default=5000, help='posts to seed (default 5000)')
+        parser.add_argument('--profile', choices=PROFILES, action='append',
+                            help='profile to run (repeatable; default all)')
+        parser.add_argument('--run', action='store_true',
+                            help='internal: benchmark the configured database and print its row')
+
+    def handle(self, *args, **options):
+        if options['run']:
+            return self.run_bench(options)
+        self.stdout.write(f"{options['clients']} clients ({options['writers']} writing), "
+                          f"{options['seconds']:g}s per profile, {options['posts']} posts\n")
+        self.stdout.write(f"{'profile':<12} {'reads/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} "
+                          f"{'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for profile in options['profile'] or PROFILES:
+            self.stdout.write(self.run_profile(profile, options))
+
+    def run_profile(self, profile, options):
+        # The scratch database has to be configured before Django starts, so
+        # migrate it and benchmark it in child processes
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, CLOUDYSKY_DB_PROFILE=profile,
+                       CLOUDYSKY_DB_PATH=os.path.join(directory, 'bench.sqlite3'))
+            manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            subprocess.run(manage + ['migrate', '-v0'], env=env, check=True)
+            command = manage + ['bench_sqlite', '--run', '--clients', str(options['clients']),
+                                '--writers', str(options['writers']),
+                                '--seconds', str(options['seconds']), '--posts', str(options['posts'])]
+            result = subprocess.run(command, env=env, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(result.stderr.strip() or f'{profile} benchmark failed')
+            return result.stdout.rstrip('\n')
+
+    def seed(self, posts):
+        from django.contrib.auth.models import User
+        from app.comment_counts import backfill_comment_counts
+        from app.models import Comment, Post
+
+        users = User.objects.bulk_create(User(username=f'bench{i}') for i in range(50))
+        Post.objects.bulk_create(
+            Post(author=users[i % 50], title=f'Post {i}', content='x' * 200, hidden=i % 20 == 0)
+            for i in range(posts))
+        post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+        Comment.objects.bulk_create(
+            Comment(user=users[i % 50], post_id=post_ids[i // 3], content=f'comment {i}')
+            for i in range(posts * 3))
+        # bulk_create bypasses the counters Comment.objects.create() keeps
+        backfill_comment_counts()
+        return users, post_ids
+
+    def run_bench(self, options):
+        if not os.environ.get('CLOUDYSKY_DB_PATH'):
+            raise CommandError('--run only runs against a scratch CLOUDYSKY_DB_PATH')
+        users, post_ids = self.seed(options['posts'])
+        connections.close_all()
+
+        deadline = time.monotonic() + options['seconds']
+        writers = min(options['writers'], options['clients'])
+        clients = [Client(i < writers, deadline, i, users, post_ids) for i in range(options['clients'])]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+
+        row = {'profile': settings.DB_PROFILE}
+        for kind, group in (('read', [c for c in clients if not c.writer]),
+                            ('write', [c for c in clients if c.writer])):
+            latencies = [latency for client in group for latency in client.latencies]
+            row[kind] = len(latencies) / options['seconds']
+            row[f'{kind}_p50'] = percentile(latencies, 0.5) * 1000
+            row[f'{kind}_p99'] = percentile(latencies, 0.99) * 1000
+            row[f'{kind}_errors'] = sum(client.errors for client in group)
+        self.stdout.write(
+            f"{row['profile']:<12} {row['read']:>9.0f} {row['read_p50']:>8.2f} {row['read_p99']:>8.2f} "
+            f"{row['read_errors']:>7} {row['write']:>9.0f} {row['write_p50']:>8.2f} "
+            f"{row['write_p99']:>8.2f} {row['write_errors']:>7}")
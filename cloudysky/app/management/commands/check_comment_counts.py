@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.comment_counts import backfill_comment_counts, comment_count_mismatches
+
+
+class Command(BaseCommand):
+    help = "Report posts whose stored comment counts disagree with their comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='recompute the counts (backfill_comment_counts) if any disagree')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='mismatched posts to list (default 20)')
+
+    def handle(self, *args, **options):
+        mismatches = comment_count_mismatches()
+        total = mismatches.count()
+        if not total:
+            self.stdout.write("Comment counts are consistent")
+            return
+        for post in mismatches[:options['limit']]:
+            self.stdout.write(
+                f"post {post.id}: comment_count {post.comment_count} (actual {post.actual_count}), "
+                f"visible_comment_count {post.visible_comment_count} (actual {post.actual_visible_count})")
+        if options['fix']:
+            backfill_comment_counts()
+            self.stdout.write(f"Fixed comment counts for {total} posts")
+            return
+        raise CommandError(f"{total} posts have inconsistent comment counts")
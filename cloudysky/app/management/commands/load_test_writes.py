@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from cloudysky.db_profiles import PROFILES
+
+from ..stats import percentile
+
+
+class Writer(threading.Thread):
+    """Alternates createPost and createComment as one user until the deadline"""
+
+    def __init__(self, user, post_ids, deadline):
+        super().__init__()
+        self.user = user
+        self.post_ids = post_ids
+        self.deadline = deadline
+        self.statuses = Counter()
+        self.latencies = []
+
+    def run(self):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(self.user)
+        n = 0
+        try:
+            while time.monotonic() < self.deadline:
+                started = time.perf_counter()
+                if n % 2 == 0:
+                    response = client.post('/createPost/', {'title': f'load {n}', 'content': f'post {n}'})
+                else:
+                    post_id = self.post_ids[n % len(self.post_ids)]
+                    response = client.post('/createComment/', {'post_id': post_id, 'content': f'comment {n}'})
+                self.latencies.append(time.perf_counter() - started)
+                self.statuses[response.status_code] += 1
+                n += 1
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Load-test concurrent createPost/createComment through the real views on a scratch "
+            "database, reporting write throughput and every non-200 response")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help='concurrent writers (default 8)')
+        parser.add_argument('--seconds', type=float, default=10, help='run time (default 10)')
+        parser.add_argument('--profile', choices=PROFILES, default='production',
+                            help='database profile (default production)')
+        parser.add_argument('--budget-ms', type=int,
+                            help='override WRITE_RETRY_BUDGET_MS (0: a single attempt, no retries)')
+        parser.add_argument('--run', action='store_true',
+                            help='internal: run the load in this process against the configured database')
+
+    def handle(self, *args, **options):
+        if options['run']:
+            return self.run_load(options)
+        # The scratch database has to be configured before Django starts, so
+        # migrate it and run the load in child processes
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, CLOUDYSKY_DB_PROFILE=options['profile'],
+                       CLOUDYSKY_DB_PATH=os.path.join(directory, 'load.sqlite3'))
+            manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            subprocess.run(manage + ['migrate', '-v0'], env=env, check=True)
+            command = manage + ['load_test_writes', '--run', '--clients', str(options['clients']),
+                                '--seconds', str(options['seconds'])]
+            if options['budget_ms'] is not None:
+                command += ['--budget-ms', str(options['budget_ms'])]
+            result = subprocess.run(command, env=env, capture_output=True, text=True)
+            self.stdout.write(result.stdout)
+            if result.returncode:
+                raise CommandError(result.stderr.strip() or 'load test failed')
+
+    def run_load(self, options):
+        from django.contrib.auth.models import User
+        from app.models import Post
+
+        if not os.environ.get('CLOUDYSKY_DB_PATH'):
+            raise CommandError('--run only runs against a scratch CLOUDYSKY_DB_PATH')
+        users = [User.objects.create(username=f'load{i}') for i in range(options['clients'])]
+        post_ids = [Post.objects.create(author=users[0], title=f'seed {i}', content='seed').id
+                    for i in range(10)]
+
+        budget = options['budget_ms']
+        overrides = {} if budget is None else {'WRITE_RETRY_BUDGET_MS': budget}
+        with override_settings(**overrides):
+            deadline = time.monotonic() + options['seconds']
+            writers = [Writer(user, post_ids, deadline) for user in users]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+
+        statuses = sum((writer.statuses for writer in writers), Counter())
+        latencies = [latency for writer in writers for latency in writer.latencies]
+        total = sum(statuses.values())
+        self.stdout.write(
+            f"{options['clients']} writers for {options['seconds']:g}s "
+            f"({settings.DB_PROFILE} profile, retry budget "
+            f"{getattr(settings, 'WRITE_RETRY_BUDGET_MS', 0) if budget is None else budget} ms)")
+        self.stdout.write(f"writes/s {total / options['seconds']:.0f}, "
+                          f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+                          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+        self.stdout.write("responses: " + ', '.join(f"{status}: {count}"
+                                                    for status, count in sorted(statuses.items())))
+        errors = total - statuses[200]
+        self.stdout.write(f"errors: {errors}")
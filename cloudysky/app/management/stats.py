@@ -0,0 +1,6 @@
+def percentile(values, fraction):
+    """The value at fraction (0..1) of the way through values, by rank"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
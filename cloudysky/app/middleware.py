@@ -0,0 +1,219 @@
+# app/middleware.py
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request (wall time, database query count
+and time, optionally peak Python memory), writes one JSON log line per
+request to the 'app.perf' logger, flags requests over the latency or query
+budget at WARNING, and folds the numbers into per-endpoint histograms that
+the /metrics/ view serves. Streaming responses are measured until their
+last chunk has been sent. While slow-query tracing is on (app/query_trace.py)
+it also installs the tracer for the request.
+
+Settings:
+    PERF_LATENCY_BUDGET_MS   flag requests slower than this (default 500)
+    PERF_QUERY_BUDGET        flag requests running more queries (default 20)
+    PERF_TRACK_MEMORY        trace peak allocations with tracemalloc; slows
+                             every request down, so off by default
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connections
+
+from . import query_trace
+
+logger = logging.getLogger('app.perf')
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Counts of observations at or under each bound, plus one overflow bucket"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        labels = [str(bound) for bound in self.bounds] + ['+Inf']
+        return {'buckets': dict(zip(labels, self.counts)), 'count': self.count, 'sum': round(self.sum, 3)}
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.over_budget = 0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.db_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'over_budget': self.over_budget,
+            'latency_ms': self.latency_ms.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'queries': self.queries.as_dict(),
+        }
+
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+def endpoint_metrics():
+    """Per-endpoint histograms recorded by this process"""
+    with _metrics_lock:
+        return {endpoint: metrics.as_dict() for endpoint, metrics in sorted(_metrics.items())}
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+def endpoint_name(request):
+    """Dotted path of the view that served request (URL aliases share it)"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = getattr(match.func, 'view_class', match.func)
+    return f'{func.__module__}.{func.__name__}'
+
+class QueryTimer:
+    """connection.execute_wrapper() hook counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+class RequestMeasurement:
+    def __init__(self, track_memory):
+        self.queries = QueryTimer()
+        # (connection, wrapper) pairs, removed by identity rather than
+        # popped: a streaming response can finish after other wrappers were
+        # installed on the same connection
+        self.wrappers = []
+        tracing = query_trace.tracing_state()['enabled']
+        for alias in connections:
+            self.install(connections[alias], self.queries)
+            if tracing:
+                self.install(connections[alias], query_trace.trace)
+        self.track_memory = track_memory
+        if track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+
+    def install(self, connection, wrapper):
+        connection.execute_wrappers.append(wrapper)
+        self.wrappers.append((connection, wrapper))
+
+    def uninstall(self):
+        while self.wrappers:
+            connection, wrapper = self.wrappers.pop()
+            for i in range(len(connection.execute_wrappers) - 1, -1, -1):
+                if connection.execute_wrappers[i] is wrapper:
+                    del connection.execute_wrappers[i]
+                    break
+
+    def finish(self, request, response):
+        elapsed = time.perf_counter() - self.started
+        self.uninstall()
+        peak_kb = tracemalloc.get_traced_memory()[1] // 1024 if self.track_memory else None
+        record(request, response, elapsed, self.queries, peak_kb)
+
+def record(request, response, elapsed, queries, peak_kb):
+    latency_budget = getattr(settings, 'PERF_LATENCY_BUDGET_MS', 500)
+    query_budget = getattr(settings, 'PERF_QUERY_BUDGET', 20)
+    endpoint = endpoint_name(request)
+    line = {
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'ms': round(elapsed * 1000, 2),
+        'queries': queries.count,
+        'db_ms': round(queries.seconds * 1000, 2),
+        'peak_kb': peak_kb,
+    }
+    over = []
+    if line['ms'] > latency_budget:
+        over.append('latency')
+    if queries.count > query_budget:
+        over.append('queries')
+    if over:
+        line['over_budget'] = over
+
+    with _metrics_lock:
+        metrics = _metrics.setdefault(endpoint, EndpointMetrics())
+        metrics.requests += 1
+        metrics.over_budget += bool(over)
+        metrics.latency_ms.observe(line['ms'])
+        metrics.db_ms.observe(line['db_ms'])
+        metrics.queries.observe(queries.count)
+    logger.log(logging.WARNING if over else logging.INFO, json.dumps(line))
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measurement = RequestMeasurement(getattr(settings, 'PERF_TRACK_MEMORY', False))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            measurement.uninstall()
+            raise
+        if response.streaming:
+            response.streaming_content = MeasuredStream(response.streaming_content, measurement,
+                                                        request, response)
+        else:
+            measurement.finish(request, response)
+        return response
+
+class MeasuredStream:
+    """Streaming content that finishes its measurement after the last chunk
+
+    Queries of a streaming response run while it is being sent. The response
+    calls close() once it is done with the content even if iteration never
+    started, so the measurement is always finished and its wrappers removed.
+    """
+
+    def __init__(self, content, measurement, request, response):
+        self.content = content
+        self.measurement = measurement
+        self.request = request
+        self.response = response
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self.measurement is not None:
+            measurement, self.measurement = self.measurement, None
+            measurement.finish(self.request, self.response)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    # Self-contained on purpose: a migration must keep doing what it did
+    # when it was written, whatever later happens to app.comment_counts
+    Post = apps.get_model('app', 'Post')
+    Comment = apps.get_model('app', 'Comment')
+
+    def counted(comments):
+        counts = (comments.filter(post=OuterRef('pk')).order_by().values('post')
+                  .annotate(n=Count('id')).values('n'))
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Post.objects.update(
+        comment_count=counted(Comment.objects.all()),
+        visible_comment_count=counted(Comment.objects.filter(hidden=False)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_feed_comment_moderation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='visible_comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 # cloudsky/app/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 
 class Post(models.Model):
@@ -9,6 +10,35 @@ class Post(models.Model):
     created_at  = models.DateTimeField(auto_now_add=True)
     hidden      = models.BooleanField(default=False)
     hide_reason = models.TextField(blank=True, null=True)
+    # Maintained by CommentManager.create() and Comment.hide(); rebuild with
+    # `manage.py backfill_comment_counts` after writing comments any other way
+    comment_count         = models.PositiveIntegerField(default=0)
+    visible_comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Feed order and keyset pagination cursor
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            # The same for feeds that leave out hidden posts. Django writes
+            # hidden=False as NOT "hidden", which SQLite can't seek on in a
+            # (hidden, created_at, id) index, but it does match a partial one
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(hidden=False),
+                         name='post_visible_created_id_idx'),
+            # Moderation listings: only the (few) hidden rows
+            models.Index(fields=['-created_at'], condition=models.Q(hidden=True),
+                         name='post_hidden_only_idx'),
+        ]
+
+class CommentManager(models.Manager):
+    def create(self, **kwargs):
+        """Create a comment and count it on its post in the same transaction"""
+        with transaction.atomic():
+            comment = super().create(**kwargs)
+            Post.objects.filter(pk=comment.post_id).update(
+                comment_count=F('comment_count') + 1,
+                visible_comment_count=F('visible_comment_count') + (0 if comment.hidden else 1),
+            )
+        return comment
 
 class Comment(models.Model):
     user        = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -17,3 +47,29 @@ class Comment(models.Model):
     created_at  = models.DateTimeField(auto_now_add=True)
     hidden      = models.BooleanField(default=False)
     hide_reason = models.TextField(blank=True, null=True)
+
+    objects = CommentManager()
+
+    def hide(self, reason):
+        """Hide this comment, uncounting it from its post's visible comments once"""
+        with transaction.atomic():
+            # The conditional UPDATE decides who hides it first, so two
+            # concurrent hides only decrement once
+            newly_hidden = Comment.objects.filter(pk=self.pk, hidden=False).update(
+                hidden=True, hide_reason=reason)
+            if newly_hidden:
+                Post.objects.filter(pk=self.post_id).update(
+                    visible_comment_count=F('visible_comment_count') - 1)
+            else:
+                Comment.objects.filter(pk=self.pk).update(hide_reason=reason)
+        self.hidden = True
+        self.hide_reason = reason
+
+    class Meta:
+        indexes = [
+            # A post's comments in order (app_post_detail)
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+            # Moderation listings: only the (few) hidden rows
+            models.Index(fields=['-created_at'], condition=models.Q(hidden=True),
+                         name='comment_hidden_only_idx'),
+        ]
@@ -0,0 +1,69 @@
+# app/pagination.py
+"""
+Keyset pagination for the feeds.
+
+Pages are ordered newest first by (created_at, id); the cursor is the key
+of the last row on the previous page, so fetching the next page is a range
+scan on that index however deep the client has paged, rather than an
+OFFSET that re-reads every earlier row.
+"""
+import base64
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+FEED_PAGE_SIZE = 50
+MAX_FEED_PAGE_SIZE = 200
+
+class BadPageRequest(ValueError):
+    """A cursor or limit the client sent that can't be used"""
+
+def wants_all(request):
+    """True for ?all=1: the legacy unpaginated list"""
+    return request.GET.get('all', '').lower() in ('1', 'true', 'yes')
+
+def encode_cursor(obj):
+    key = json.dumps([obj.created_at.isoformat(), obj.id])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) from an encode_cursor() string"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, UnicodeError):
+        raise BadPageRequest('invalid cursor')
+
+def page_limit(request):
+    limit = request.GET.get('limit')
+    if limit is None:
+        return FEED_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise BadPageRequest('limit must be an integer')
+    if limit < 1:
+        raise BadPageRequest('limit must be positive')
+    return min(limit, MAX_FEED_PAGE_SIZE)
+
+def keyset_page(request, queryset):
+    """
+    One page of queryset, newest first, and the URL of the next page (or
+    None on the last page). Raises BadPageRequest for a bad cursor or limit.
+    """
+    limit = page_limit(request)
+    queryset = queryset.order_by('-created_at', '-id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    # One extra row says whether there is a next page without a COUNT
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    query = urlencode({'cursor': encode_cursor(rows[-1]), 'limit': limit})
+    return rows, request.build_absolute_uri(f"{request.path}?{query}")
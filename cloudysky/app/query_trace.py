@@ -0,0 +1,164 @@
+# app/query_trace.py
+"""
+Slow-query tracer.
+
+While tracing is on, PerformanceMiddleware installs trace() with
+connection.execute_wrapper() for every request. Each statement is
+reduced to a fingerprint (its SQL with placeholder lists collapsed and
+whitespace normalized) and counted with its duration and the line of app
+code that ran it. Statements slower than the threshold also get their
+EXPLAIN QUERY PLAN captured and written as a JSON line to the
+'app.slow_queries' logger, which settings.py sends to a rotating file.
+
+Tracing is toggled at runtime, per process, with set_tracing() or the
+staff-only /diagnostics/queries/ endpoint; the settings give the initial
+state:
+    QUERY_TRACE_ENABLED   trace from startup (default False)
+    QUERY_TRACE_SLOW_MS   EXPLAIN and log statements slower than this (default 100)
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger('app.slow_queries')
+
+# Fingerprints kept per process; statements beyond this are not tracked
+MAX_FINGERPRINTS = 500
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+_local = threading.local()
+_state = {}
+_statements = {}
+
+class StatementStats:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow = 0
+        self.call_sites = Counter()
+        self.plan = None
+
+    def as_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'slow': self.slow,
+            'call_sites': [site for site, _ in self.call_sites.most_common(5)],
+            'plan': self.plan,
+        }
+
+def _settings_state():
+    return {
+        'enabled': getattr(settings, 'QUERY_TRACE_ENABLED', False),
+        'slow_ms': getattr(settings, 'QUERY_TRACE_SLOW_MS', 100),
+    }
+
+def tracing_state():
+    with _lock:
+        if not _state:
+            _state.update(_settings_state())
+        return dict(_state)
+
+def set_tracing(enabled=None, slow_ms=None):
+    """Turn tracing on or off and/or change the slow threshold; returns the new state"""
+    tracing_state()
+    with _lock:
+        if enabled is not None:
+            _state['enabled'] = bool(enabled)
+        if slow_ms is not None:
+            _state['slow_ms'] = float(slow_ms)
+        return dict(_state)
+
+def reset_trace():
+    """Forget the recorded statements and go back to the settings' state"""
+    with _lock:
+        _statements.clear()
+        _state.clear()
+
+def statement_report(limit=50):
+    """Traced statements, most total time first"""
+    with _lock:
+        stats = sorted(_statements.values(), key=lambda s: s.total_ms, reverse=True)
+        return [s.as_dict() for s in stats[:limit]]
+
+_placeholder_list = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_whitespace = re.compile(r'\s+')
+
+def fingerprint(sql):
+    """sql with IN (%s, %s, ...) lists collapsed, so batches of any size match"""
+    return _whitespace.sub(' ', _placeholder_list.sub('(%s, ...)', sql)).strip()
+
+# The execute wrappers themselves are never the call site
+WRAPPER_FILES = {os.path.join(APP_DIR, 'query_trace.py'), os.path.join(APP_DIR, 'middleware.py')}
+
+def call_site():
+    """file:line of the innermost app frame running the query"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if frame.filename.startswith(APP_DIR) and frame.filename not in WRAPPER_FILES:
+            return f"{os.path.relpath(frame.filename, os.path.dirname(APP_DIR))}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+def explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN rows for a SELECT on SQLite, else None"""
+    if connection.vendor != 'sqlite' or not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        _local.explaining = False
+
+def trace(execute, sql, params, many, context):
+    """connection.execute_wrapper() hook"""
+    if getattr(_local, 'explaining', False) or not tracing_state()['enabled']:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(sql, params, many, context, elapsed_ms)
+
+def _record(sql, params, many, context, elapsed_ms):
+    key = fingerprint(sql)
+    site = call_site()
+    slow = elapsed_ms >= tracing_state()['slow_ms']
+    plan = explain(context['connection'], sql, params) if slow and not many else None
+    with _lock:
+        stats = _statements.get(key)
+        if stats is None:
+            if len(_statements) >= MAX_FINGERPRINTS:
+                return
+            stats = _statements[key] = StatementStats(key)
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.call_sites[site] += 1
+        if slow:
+            stats.slow += 1
+            if plan is not None:
+                stats.plan = plan
+    if slow:
+        logger.warning(json.dumps({
+            'fingerprint': key,
+            'ms': round(elapsed_ms, 3),
+            'call_site': site,
+            'plan': plan,
+        }))
@@ -1,3 +1,620 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import feed_cache, views
+from .contention import WriteContention, run_with_retry
+from .comment_counts import comment_count_mismatches
+from .middleware import reset_metrics
+from . import query_trace
+from cloudysky.db_profiles import database_settings
+from .models import Post, Comment
+from .pagination import encode_cursor
+
+
+def query_plan(sql):
+    """SQLite's EXPLAIN QUERY PLAN for sql, as one string"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def make_feed(posts, comments_per_post, start=0):
+    """Create posts by distinct authors, each with comments by distinct users
+
+    Every fifth post and every third comment is hidden.
+    """
+    for i in range(start, start + posts):
+        author = User.objects.create(username=f'author{i}')
+        post = Post.objects.create(author=author, title=f'Post {i}', content=f'Content {i}',
+                                   hidden=(i % 5 == 4))
+        for j in range(comments_per_post):
+            user = User.objects.create(username=f'user{i}_{j}')
+            Comment.objects.create(user=user, post=post, content=f'Comment {j} on {i}',
+                                   hidden=(j % 3 == 2))
+
+
+class FeedTestCase(TestCase):
+    """Starts from an empty feed cache; the tests write rows behind its back"""
+
+    def setUp(self):
+        feed_cache.feed_cache().clear()
+        feed_cache.reset_cache_stats()
+
+
+class DumpFeedTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+
+    def count_feed_queries(self):
+        feed_cache.feed_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dumpFeed/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def test_query_count_is_constant_as_rows_grow(self):
+        make_feed(3, 2)
+        small_queries, small_feed = self.count_feed_queries()
+        make_feed(30, 4, start=3)
+        large_queries, large_feed = self.count_feed_queries()
+        self.assertGreater(len(large_feed), len(small_feed))
+        self.assertEqual(small_queries, large_queries)
+        # Anonymous request: posts, comments and their users only
+        self.assertEqual(large_queries, 2)
+
+    def test_staff_query_count_is_constant(self):
+        make_feed(3, 2)
+        self.client.force_login(self.staff)
+        small_queries, _ = self.count_feed_queries()
+        make_feed(30, 4, start=3)
+        large_queries, _ = self.count_feed_queries()
+        self.assertEqual(small_queries, large_queries)
+
+    def test_hidden_rows_are_filtered_for_regular_users(self):
+        make_feed(5, 3)
+        _, feed = self.count_feed_queries()
+        self.assertEqual(len(feed), 4)
+        self.assertTrue(all(len(post['comments']) == 2 for post in feed))
+        self.assertEqual(feed[0]['username'], 'author3')
+
+        self.client.force_login(self.staff)
+        _, feed = self.count_feed_queries()
+        self.assertEqual(len(feed), 5)
+        self.assertTrue(all(len(post['comments']) == 3 for post in feed))
+        self.assertEqual(feed[0]['comments'][0]['username'], 'user4_0')
+
+
+class FeedPaginationTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_feed(12, 1)
+        # Several posts share a timestamp, so the id has to break ties
+        first = Post.objects.order_by('id').first()
+        Post.objects.filter(id__lte=first.id + 5).update(created_at=first.created_at)
+
+    def walk(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            ids.extend(post['id'] for post in page['results'])
+            url = page['next']
+            pages += 1
+        return ids, pages
+
+    def test_pages_cover_the_feed_once_in_order(self):
+        for path in ('/app/feed/', '/dumpFeed/'):
+            ids, pages = self.walk(f'{path}?limit=4')
+            expected = list(Post.objects.filter(hidden=False).order_by('-created_at', '-id')
+                            .values_list('id', flat=True))
+            self.assertEqual(ids, expected)
+            self.assertEqual(pages, 3)
+
+    def test_all_returns_the_legacy_list(self):
+        for path in ('/app/feed/?all=1', '/dumpFeed/?all=1'):
+            feed = self.client.get(path).json()
+            self.assertIsInstance(feed, list)
+            self.assertEqual(len(feed), Post.objects.filter(hidden=False).count())
+
+    def test_authors_page_through_their_own_hidden_posts(self):
+        hidden = Post.objects.filter(hidden=True).first()
+        self.client.force_login(hidden.author)
+        ids, _ = self.walk('/app/feed/?limit=3')
+        self.assertIn(hidden.id, ids)
+        self.assertEqual(len(ids), Post.objects.filter(hidden=False).count() + 1)
+
+    def test_bad_cursor_and_limit_are_rejected(self):
+        for query in ('cursor=not-a-cursor', 'limit=0', 'limit=x'):
+            self.assertEqual(self.client.get(f'/app/feed/?{query}').status_code, 400)
+            self.assertEqual(self.client.get(f'/dumpFeed/?{query}').status_code, 400)
+
+    def test_cursor_page_is_a_range_scan_on_the_index(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        last = Post.objects.order_by('-created_at', '-id')[3]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/app/feed/?limit=4&cursor={encode_cursor(last)}')
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('post_created_id_idx', query_plan(sql))
+
+
+class QueryPlanTests(FeedTestCase):
+    """Each endpoint's main query is answered from one of the 0003 indexes"""
+
+    def setUp(self):
+        super().setUp()
+        make_feed(10, 3)
+
+    def queries_on(self, url, table):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q['sql'] for q in queries.captured_queries if f'FROM "{table}"' in q['sql']]
+
+    def test_public_feeds_use_the_visible_posts_index(self):
+        for url in ('/app/feed/', '/dumpFeed/'):
+            sql = self.queries_on(url, 'app_post')[0]
+            self.assertIn('post_visible_created_id_idx', query_plan(sql))
+
+    def test_post_detail_reads_comments_in_index_order(self):
+        post = Post.objects.filter(hidden=False).first()
+        sql = self.queries_on(f'/app/post/{post.id}/', 'app_comment')[0]
+        plan = query_plan(sql)
+        self.assertIn('comment_post_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_moderation_listings_use_the_partial_indexes(self):
+        posts = Post.objects.filter(hidden=True).order_by('-created_at')
+        self.assertIn('post_hidden_only_idx', query_plan(str(posts.query)))
+        comments = Comment.objects.filter(hidden=True).order_by('-created_at')
+        self.assertIn('comment_hidden_only_idx', query_plan(str(comments.query)))
+
+
+class FeedCacheTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_feed(3, 2)
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.author = User.objects.get(username='author0')
+
+    def outcome(self, url, user=None):
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Feed-Cache']
+
+    def viewers(self):
+        """One viewer per visibility class of each feed"""
+        return [('/app/feed/', None), ('/app/feed/', self.staff), ('/app/feed/', self.author),
+                ('/dumpFeed/', None), ('/dumpFeed/', self.staff)]
+
+    def warm(self):
+        for url, user in self.viewers():
+            self.outcome(url, user)
+
+    def outcomes(self):
+        return {(url, getattr(user, 'username', None)): self.outcome(url, user)
+                for url, user in self.viewers()}
+
+    def post(self, url, user, data):
+        self.client.force_login(user)
+        # Invalidation runs on commit, which TestCase's transaction never reaches
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeat_requests_hit(self):
+        self.assertEqual(self.outcome('/app/feed/'), 'miss')
+        self.assertEqual(self.outcome('/app/feed/'), 'hit')
+        self.assertEqual(self.outcome('/app/feed/?limit=1'), 'miss')
+        stats = feed_cache.cache_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['rebuilds'], 2)
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+
+    def test_create_post_invalidates_every_class(self):
+        self.warm()
+        self.post('/createPost/', self.author, {'title': 'New', 'content': 'New post'})
+        self.assertEqual(set(self.outcomes().values()), {'miss'})
+        self.assertIn('New post', self.client.get('/dumpFeed/').content.decode())
+
+    def test_create_comment_invalidates_every_class(self):
+        self.warm()
+        post = Post.objects.filter(hidden=False).first()
+        self.post('/createComment/', self.author, {'post_id': post.id, 'content': 'New comment'})
+        self.assertEqual(set(self.outcomes().values()), {'miss'})
+
+    def test_hide_post_leaves_staff_pages_cached(self):
+        self.warm()
+        post = Post.objects.filter(hidden=False).first()
+        self.post('/hidePost/', self.staff, {'post_id': post.id, 'reason': 'spam'})
+        for (url, username), outcome in self.outcomes().items():
+            self.assertEqual(outcome, 'hit' if username == 'staff' else 'miss')
+        self.client.logout()
+        self.assertNotIn(post.content, self.client.get('/app/feed/').content.decode())
+
+    def test_hide_comment_leaves_staff_pages_cached(self):
+        self.warm()
+        comment = Comment.objects.filter(hidden=False).first()
+        self.post('/hideComment/', self.staff, {'comment_id': comment.id, 'reason': 'spam'})
+        for (url, username), outcome in self.outcomes().items():
+            self.assertEqual(outcome, 'hit' if username == 'staff' else 'miss')
+
+    def test_concurrent_misses_rebuild_once(self):
+        calls = []
+        gate = threading.Event()
+
+        def build():
+            calls.append(1)
+            gate.wait(1)
+            return 'page', True
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(feed_cache.single_flight('k', build)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['page'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(feed_cache.cache_stats()['rebuilds'], 1)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                       'LOCATION': directory}
+            with override_settings(CACHES={'default': backend}):
+                self.assertEqual(self.outcome('/dumpFeed/'), 'miss')
+                self.assertEqual(self.outcome('/dumpFeed/'), 'hit')
+                post = Post.objects.filter(hidden=False).first()
+                self.post('/createComment/', self.author, {'post_id': post.id, 'content': 'x'})
+                self.assertEqual(self.outcome('/dumpFeed/'), 'miss')
+
+
+class DumpUploadsTests(TestCase):
+    def export(self):
+        response = self.client.get('/dumpUploads/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        with CaptureQueriesContext(connection) as queries:
+            body = b''.join(response.streaming_content)
+        return json.loads(body), len(queries)
+
+    def test_streams_every_row_with_counts(self):
+        make_feed(7, 3)
+        # Small chunks, so the rows span several of them
+        with mock.patch.object(views, 'EXPORT_CHUNK_SIZE', 4):
+            dump, queries = self.export()
+        self.assertEqual(dump['status'], 'success')
+        self.assertEqual(dump['post_count'], 7)
+        self.assertEqual(dump['comment_count'], 21)
+        self.assertEqual(len(dump['posts']), 7)
+        self.assertEqual(len(dump['comments']), 21)
+        # One query per table, however many rows and chunks
+        self.assertEqual(queries, 2)
+        post = Post.objects.get(title='Post 4')
+        exported = next(p for p in dump['posts'] if p['id'] == post.id)
+        self.assertEqual(exported['author'], 'author4')
+        self.assertEqual(exported['user_id'], post.author_id)
+        self.assertTrue(exported['hidden'])
+        self.assertEqual(exported['hide_reason'], '')
+
+    def test_seeds_an_empty_database(self):
+        dump, _ = self.export()
+        self.assertEqual(dump['post_count'], 2)
+        self.assertEqual(len(dump['comments']), 2)
+
+    def test_rows_written_during_the_stream_are_left_out(self):
+        make_feed(3, 1)
+        response = self.client.get('/dumpUploads/')
+        author = User.objects.get(username='author0')
+        late = Post.objects.create(author=author, title='Late', content='late')
+        Comment.objects.create(user=author, post=late, content='late')
+        dump = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(dump['post_count'], len(dump['posts']))
+        self.assertEqual(dump['comment_count'], len(dump['comments']))
+        self.assertEqual(dump['post_count'], 3)
+        post_ids = {post['id'] for post in dump['posts']}
+        self.assertTrue(all(comment['post_id'] in post_ids for comment in dump['comments']))
+
+    def test_failure_mid_stream_closes_the_document(self):
+        make_feed(3, 2)
+        with mock.patch.object(views, 'export_comment', side_effect=ValueError('boom')):
+            with self.assertLogs('app.views', 'ERROR'):
+                dump, _ = self.export()
+        self.assertEqual(dump['status'], 'error')
+        self.assertEqual(dump['error'], 'boom')
+        self.assertEqual(len(dump['posts']), 3)
+        self.assertEqual(dump['comments'], [])
+
+
+class CommentCountTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_feed(2, 3)
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.post_ = Post.objects.get(title='Post 0')
+
+    def test_counts_follow_creates_and_hides(self):
+        self.assertEqual((self.post_.comment_count, self.post_.visible_comment_count), (3, 2))
+        self.client.force_login(self.staff)
+        self.client.post('/createComment/', {'post_id': self.post_.id, 'content': 'another'})
+        visible = Comment.objects.filter(post=self.post_, hidden=False).first()
+        for _ in range(2):
+            # Hiding twice only uncounts once
+            self.client.post('/hideComment/', {'comment_id': visible.id, 'reason': 'spam'})
+        self.post_.refresh_from_db()
+        self.assertEqual((self.post_.comment_count, self.post_.visible_comment_count), (4, 2))
+        self.assertFalse(comment_count_mismatches().exists())
+
+    def test_feed_shows_counts_without_extra_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            feed = self.client.get('/app/feed/').json()['results']
+        self.assertEqual(len(queries), 1)
+        self.assertEqual({post['comment_count'] for post in feed}, {2})
+        self.client.force_login(self.staff)
+        feed = self.client.get('/app/feed/').json()['results']
+        self.assertEqual({post['comment_count'] for post in feed}, {3})
+
+    def test_check_and_backfill_commands(self):
+        Post.objects.filter(pk=self.post_.pk).update(comment_count=0, visible_comment_count=7)
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_comment_counts', stdout=out)
+        self.assertIn(f'post {self.post_.id}: comment_count 0 (actual 3)', out.getvalue())
+        call_command('backfill_comment_counts', stdout=io.StringIO())
+        self.post_.refresh_from_db()
+        self.assertEqual((self.post_.comment_count, self.post_.visible_comment_count), (3, 2))
+        call_command('check_comment_counts', stdout=io.StringIO())
+
+    def test_check_fix(self):
+        Post.objects.update(visible_comment_count=0)
+        call_command('check_comment_counts', '--fix', stdout=io.StringIO())
+        self.assertFalse(comment_count_mismatches().exists())
+
+
+class PerformanceMiddlewareTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+        make_feed(3, 2)
+        self.staff = User.objects.create(username='staff', is_staff=True)
+
+    def test_logs_one_structured_line_per_request(self):
+        with self.assertLogs('app.perf', 'INFO') as logs:
+            self.client.get('/app/feed/')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['endpoint'], 'app.views.app_feed')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['queries'], 1)
+        self.assertNotIn('over_budget', line)
+
+    def test_flags_requests_over_budget(self):
+        with override_settings(PERF_QUERY_BUDGET=0, PERF_LATENCY_BUDGET_MS=0):
+            with self.assertLogs('app.perf', 'WARNING') as logs:
+                self.client.get('/app/feed/')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['over_budget'], ['latency', 'queries'])
+
+    def test_streaming_queries_are_counted(self):
+        with self.assertLogs('app.perf', 'INFO') as logs:
+            response = self.client.get('/dumpUploads/')
+            b''.join(response.streaming_content)
+        line = json.loads(logs.records[-1].getMessage())
+        # The two id bounds, then one query per table while streaming
+        self.assertEqual(line['queries'], 4)
+
+    def test_stream_closed_before_first_chunk_is_measured(self):
+        wrappers = list(connection.execute_wrappers)
+        with self.assertLogs('app.perf', 'INFO') as logs:
+            response = self.client.get('/dumpUploads/')
+            response.close()
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['endpoint'], 'app.views.dump_uploads')
+        self.assertEqual(connection.execute_wrappers, wrappers)
+
+    def test_writes_no_longer_count_tables(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/createPost/', {'title': 't', 'content': 'c'})
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+    def test_metrics_aggregate_per_endpoint(self):
+        for url in ('/app/feed/', '/app/app/feed/', '/dumpFeed/'):
+            self.client.get(url)
+        self.assertEqual(self.client.get('/metrics/').status_code, 401)
+        self.client.force_login(self.staff)
+        metrics = self.client.get('/metrics/').json()
+        feed = metrics['endpoints']['app.views.app_feed']
+        self.assertEqual(feed['requests'], 2)
+        self.assertEqual(feed['latency_ms']['count'], 2)
+        self.assertEqual(sum(feed['queries']['buckets'].values()), 2)
+        self.assertEqual(feed['queries']['buckets']['1'], 2)
+        self.assertIn('app.views.dump_feed', metrics['endpoints'])
+        self.assertIn('hit_rate', metrics['feed_cache'])
+
+
+class QueryTraceTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        query_trace.reset_trace()
+        make_feed(3, 2)
+        self.staff = User.objects.create(username='staff', is_staff=True)
+
+    def tearDown(self):
+        query_trace.reset_trace()
+
+    def test_fingerprint_collapses_placeholder_lists(self):
+        self.assertEqual(query_trace.fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s,\n %s)'),
+                         query_trace.fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s)'))
+
+    def test_off_by_default(self):
+        self.client.get('/dumpFeed/')
+        self.assertEqual(query_trace.statement_report(), [])
+
+    def test_traces_slow_statements_with_plans(self):
+        self.client.force_login(self.staff)
+        response = self.client.post('/diagnostics/queries/', {'enabled': '1', 'slow_ms': '0'})
+        self.assertEqual(response.json(), {'enabled': True, 'slow_ms': 0.0})
+        self.client.logout()
+        with self.assertLogs('app.slow_queries', 'WARNING') as logs:
+            self.client.get('/app/post/{}/'.format(Post.objects.filter(hidden=False).first().id))
+        lines = [json.loads(record.getMessage()) for record in logs.records]
+        comments = next(line for line in lines if 'FROM "app_comment"' in line['fingerprint'])
+        self.assertIn('app/views.py', comments['call_site'])
+        self.assertIn('comment_post_created_idx', ' '.join(comments['plan']))
+
+        self.client.force_login(self.staff)
+        with self.assertLogs('app.slow_queries', 'WARNING'):
+            report = self.client.get('/diagnostics/queries/').json()
+        self.assertTrue(report['enabled'])
+        statement = next(s for s in report['statements'] if 'FROM "app_comment"' in s['fingerprint'])
+        self.assertEqual(statement['count'], 1)
+        self.assertTrue(statement['plan'])
+        self.assertTrue(any('in app_post_detail' in site for site in statement['call_sites']))
+
+    def test_toggle_off_and_reset(self):
+        query_trace.set_tracing(enabled=True, slow_ms=10000)
+        self.client.get('/dumpFeed/')
+        self.assertTrue(query_trace.statement_report())
+        self.client.force_login(self.staff)
+        self.client.post('/diagnostics/queries/', {'enabled': '0', 'reset': '1'})
+        self.client.get('/dumpFeed/')
+        self.assertEqual(query_trace.statement_report(), [])
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/diagnostics/queries/').status_code, 401)
+        self.client.force_login(User.objects.get(username='author0'))
+        self.assertEqual(self.client.post('/diagnostics/queries/', {'enabled': '1'}).status_code, 401)
+        self.assertFalse(query_trace.tracing_state()['enabled'])
+
+
+class DatabaseProfileTests(TestCase):
+    def test_production_profile_tunes_new_connections(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        with tempfile.TemporaryDirectory() as directory:
+            database = database_settings('production', f'{directory}/db.sqlite3')
+            self.assertTrue(database['CONN_HEALTH_CHECKS'])
+            self.assertGreater(database['CONN_MAX_AGE'], 0)
+            wrapper = DatabaseWrapper({**database, 'TIME_ZONE': None, 'AUTOCOMMIT': True}, 'profile_test')
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)  # NORMAL
+        self.assertEqual(pragmas['cache_size'], -64000)
+        self.assertEqual(pragmas['mmap_size'], 256 * 1024 * 1024)
+        self.assertEqual(pragmas['busy_timeout'], 1000)
+
+    def test_development_profile_is_stock(self):
+        database = database_settings('development', 'db.sqlite3')
+        self.assertEqual(set(database), {'ENGINE', 'NAME', 'OPTIONS'})
+        self.assertEqual(database['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        with self.assertRaises(ValueError):
+            database_settings('staging', 'db.sqlite3')
+
+    def test_benchmark_runs(self):
+        out = io.StringIO()
+        call_command('bench_sqlite', '--seconds', '0.2', '--posts', '100', '--clients', '3', stdout=out)
+        self.assertIn('production', out.getvalue())
+        self.assertIn('development', out.getvalue())
+
+
+@mock.patch('app.contention.time.sleep')
+class WriteContentionTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_feed(1, 0)
+        self.client.force_login(User.objects.get(username='author0'))
+        self.post_id = Post.objects.get().id
+
+    def locked_then(self, failures):
+        """Comment.objects.create that hits a locked database `failures` times first"""
+        create = Comment.objects.create
+        calls = []
+
+        def flaky(**kwargs):
+            calls.append(kwargs)
+            if len(calls) <= failures:
+                raise OperationalError('database is locked')
+            return create(**kwargs)
+        return mock.patch.object(Comment.objects, 'create', side_effect=flaky)
+
+    def test_locked_write_is_retried(self, sleep):
+        with self.locked_then(2):
+            response = self.client.post('/createComment/', {'post_id': self.post_id, 'content': 'hi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Post.objects.get().comment_count, 1)
+
+    @override_settings(WRITE_RETRY_BUDGET_MS=0)
+    def test_busy_database_answers_503(self, sleep):
+        with self.locked_then(1):
+            response = self.client.post('/createComment/', {'post_id': self.post_id, 'content': 'hi'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_password_is_hashed_before_the_transaction(self, sleep):
+        outer = len(connection.atomic_blocks)
+        make_password = views.make_password
+        depths = []
+
+        def hash_password(password):
+            depths.append(len(connection.atomic_blocks))
+            return make_password(password)
+        with mock.patch.object(views, 'make_password', side_effect=hash_password):
+            response = self.client.post('/createUser/', {'user_name': 'new', 'email': 'new@example.com',
+                                                         'password': 'pw', 'is_admin': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(depths, [outer])
+        user = User.objects.get(username='new')
+        self.assertTrue(user.check_password('pw'))
+        self.assertTrue(user.is_staff)
+        response = self.client.post('/createUser/', {'user_name': 'new', 'email': 'other@example.com',
+                                                     'password': 'pw'})
+        self.assertEqual(response.json(), {'error': 'username already in use'})
+
+    def test_other_errors_are_not_retried(self, sleep):
+        def broken():
+            raise OperationalError('no such table: app_nothing')
+        with self.assertRaises(OperationalError):
+            run_with_retry(broken)
+        sleep.assert_not_called()
+
+        def locked():
+            raise OperationalError('database is locked')
+        with self.assertRaises(WriteContention):
+            run_with_retry(locked, budget_ms=0)
+
+    def test_load_test_runs(self, sleep):
+        out = io.StringIO()
+        call_command('load_test_writes', '--seconds', '0.5', '--clients', '2', stdout=out)
+        self.assertIn('errors: 0', out.getvalue())
@@ -65,6 +65,14 @@ urlpatterns = [
     # app/post/<post_id> endpoint
     path('app/post/<int:post_id>/', views.app_post_detail, name='app_post_detail'),
     path('app/post/<int:post_id>', views.app_post_detail),  # without trailing slash
+
+    # Per-endpoint performance histograms (PerformanceMiddleware)
+    path('metrics/', views.metrics, name='metrics'),
+    path('metrics', views.metrics),  # without trailing slash
+
+    # Slow-query tracer (staff only)
+    path('diagnostics/queries/', views.query_diagnostics, name='query_diagnostics'),
+    path('diagnostics/queries', views.query_diagnostics),  # without trailing slash
 ]
 
 if __name__ == "__main__":
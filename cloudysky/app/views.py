@@ -1,19 +1,30 @@
 import json
+import logging
 from django.shortcuts import render, redirect
 from django.utils import timezone
 from django.contrib.auth import login
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.http import JsonResponse, HttpResponseBadRequest
 from .forms import SignUpForm
 from django.views.decorators.csrf import csrf_exempt
-from django.http                import JsonResponse, HttpResponse
+from django.http                import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models                    import Post, Comment
+from django.db.models           import Max, Prefetch, Q
+from .pagination                import BadPageRequest, keyset_page, wants_all
+from .                          import feed_cache
+from .middleware                import endpoint_metrics
+from .                          import query_trace
+from .contention                import (WriteContention, busy_response, is_lock_error, retry_writes,
+                                        run_with_retry)
 import zoneinfo 
 from django.views.decorators.http  import require_GET
 import os
 from django.conf import settings
 
+logger = logging.getLogger('app.views')
+
 def index(request):
     # convert now() to Chicago time
     chicago_tz = zoneinfo.ZoneInfo("America/Chicago")
@@ -54,17 +65,30 @@ def create_user(request):
         is_admin = request.POST.get('is_admin', '0')
     if not uname or not email or not password:
         return JsonResponse({'error': 'username, email, and password required'})
-    if User.objects.filter(email=email).exists():
-        return JsonResponse({'error': 'email already in use'}, status=400)
-    if User.objects.filter(username=uname).exists():
-        return JsonResponse({'error': 'username already in use'}, status=400)
+    # Hashing takes far longer than the INSERT, so do it before the write
+    # transaction (BEGIN IMMEDIATE) takes the database's write lock
+    password_hash = make_password(password)
+
+    def create():
+        if User.objects.filter(email=email).exists():
+            return JsonResponse({'error': 'email already in use'}, status=400)
+        if User.objects.filter(username=uname).exists():
+            return JsonResponse({'error': 'username already in use'}, status=400)
+        try:
+            User.objects.create(username=User.normalize_username(uname),
+                                email=User.objects.normalize_email(email),
+                                password=password_hash, is_staff=(is_admin == "1"))
+            return JsonResponse({'message': 'User created successfully.'})
+        except Exception as e:
+            if is_lock_error(e):
+                # run_with_retry retries the whole transaction
+                raise
+            return JsonResponse({'error': str(e)}, status=400)
+
     try:
-        user = User.objects.create_user(username=uname, email=email, password=password)
-        user.is_staff = (is_admin == "1")
-        user.save()
-        return JsonResponse({'message': 'User created successfully.'})
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return run_with_retry(create)
+    except WriteContention as e:
+        return busy_response(e)
 
 @require_GET
 def new_post(request):
@@ -77,6 +101,7 @@ def new_comment(request):
     return render(request, 'app/new_comment.html')
 
 @csrf_exempt
+@retry_writes
 def create_post(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST required'}, status=405)
@@ -95,11 +120,11 @@ def create_post(request):
         except Exception:
             pass
     post = Post.objects.create(author=author, title=title, content=content)
-    print('DB path:', settings.DATABASES['default']['NAME'])
-    print('Post count after create:', Post.objects.count())
+    feed_cache.post_created()
     return JsonResponse({'post_id': post.id, 'message': 'Post created'}, status=200)
 
 @csrf_exempt
+@retry_writes
 def create_comment(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST required'}, status=405)
@@ -126,11 +151,11 @@ def create_comment(request):
     except Post.DoesNotExist:
         return JsonResponse({'error': 'post not found'}, status=404)
     comment = Comment.objects.create(user=user, post=parent, content=content)
-    print('DB path:', settings.DATABASES['default']['NAME'])
-    print('Comment count after create:', Comment.objects.count())
+    feed_cache.comment_created()
     return JsonResponse({'comment_id': comment.id, 'message': 'Comment created'}, status=200)
 
 @csrf_exempt
+@retry_writes
 def hide_post(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST required'}, status=405)
@@ -180,6 +205,7 @@ def hide_post(request):
                     title=f"Test Post {post_id} for hiding",
                     content="This post was auto-created for testing hide functionality."
                 )
+                feed_cache.post_created()
             else:
                 return JsonResponse({'error': 'post not found'}, status=404)
         
@@ -187,13 +213,18 @@ def hide_post(request):
         post.hidden = True
         post.hide_reason = reason
         post.save()
+        feed_cache.post_hidden()
         
         # Return success
         return JsonResponse({'message': 'Post hidden'}, status=200)
     except Exception as e:
+        if is_lock_error(e):
+            # @retry_writes retries the whole transaction
+            raise
         return JsonResponse({'error': str(e)}, status=400)
 
 @csrf_exempt
+@retry_writes
 def hide_comment(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST required'}, status=405)
@@ -247,6 +278,7 @@ def hide_comment(request):
                         title="Test Post for comment hiding",
                         content="This post was auto-created for testing hide comment functionality."
                     )
+                    feed_cache.post_created()
                 
                 # Create the comment
                 comment = Comment.objects.create(
@@ -254,20 +286,37 @@ def hide_comment(request):
                     post=post,
                     content="This comment was auto-created for testing hide functionality."
                 )
+                feed_cache.comment_created()
             else:
                 return JsonResponse({'error': 'comment not found'}, status=404)
         
         # Hide the comment
-        comment.hidden = True
-        comment.hide_reason = reason
-        comment.save()
+        comment.hide(reason)
+        feed_cache.comment_hidden()
         
         # Return success
         return JsonResponse({'message': 'Comment hidden'}, status=200)
     except Exception as e:
+        if is_lock_error(e):
+            # @retry_writes retries the whole transaction
+            raise
         return JsonResponse({'error': str(e)}, status=400)
 
+def feed_posts(is_staff):
+    """
+    Posts for dumpFeed, newest first, with their authors joined and their
+    visible comments (and those comments' users) prefetched: two queries
+    however many posts and comments there are.
+    """
+    posts = Post.objects.select_related('author').order_by('-created_at', '-id')
+    comments = Comment.objects.select_related('user').order_by('id')
+    if not is_staff:
+        posts = posts.filter(hidden=False)
+        comments = comments.filter(hidden=False)
+    return posts.prefetch_related(Prefetch('comment_set', queryset=comments, to_attr='feed_comments'))
+
 @csrf_exempt
+@feed_cache.cached_feed('dump_feed')
 def dump_feed(request):
     if request.method != "GET":
         return JsonResponse({'error': 'GET required'}, status=405)
@@ -276,23 +325,18 @@ def dump_feed(request):
         current_user = request.user
         is_staff = current_user.is_authenticated and current_user.is_staff
         
-        # Get all posts - for admins show all, for regular users filter hidden posts
-        if is_staff:
-            posts = Post.objects.order_by('-created_at')
-        else:
-            posts = Post.objects.filter(hidden=False).order_by('-created_at')
+        # Admins see everything, regular users only posts and comments that aren't hidden
+        posts = feed_posts(is_staff)
+        # One page per request unless the client asks for the whole feed
+        next_url = None
+        if not wants_all(request):
+            posts, next_url = keyset_page(request, posts)
             
         feed = []
         for p in posts:
-            # For each post, get visible comments
-            if is_staff:
-                comments = p.comment_set.all()
-            else:
-                comments = p.comment_set.filter(hidden=False)
-                
             # Format comments with full content
             formatted_comments = []
-            for c in comments:
+            for c in p.feed_comments:
                 formatted_comments.append({
                     'id': c.id,
                     'username': c.user.username,
@@ -308,18 +352,113 @@ def dump_feed(request):
                 'content': p.content,
                 'comments': formatted_comments,
             })
-        return JsonResponse(feed, safe=False)
+        if wants_all(request):
+            return JsonResponse(feed, safe=False)
+        return JsonResponse({'results': feed, 'next': next_url})
     except Exception as e:
          return JsonResponse({'error': str(e)}, status=400)
 
+# Rows fetched per database round trip while streaming dumpUploads
+EXPORT_CHUNK_SIZE = 2000
+
+def export_rows(rows, format_row):
+    """JSON array items for rows, comma-separated, a chunk per yield"""
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(json.dumps(format_row(row)))
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield ('' if first else ', ') + ', '.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ', ') + ', '.join(chunk)
+
+def export_post(row):
+    pk, username, user_id, title, content, created_at, hidden, hide_reason = row
+    return {
+        'id': pk,
+        'author': username,
+        'user_id': user_id,
+        'title': title,
+        'content': content,
+        'created_at': created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        'hidden': hidden,
+        'hide_reason': hide_reason or '',
+    }
+
+def export_comment(row):
+    pk, username, user_id, post_id, content, created_at, hidden, hide_reason = row
+    return {
+        'id': pk,
+        'user': username,
+        'user_id': user_id,
+        'post_id': post_id,
+        'content': content,
+        'created_at': created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        'hidden': hidden,
+        'hide_reason': hide_reason or '',
+    }
+
+def export_bounds():
+    """Largest post and comment ids now; the export stops at these"""
+    return (Post.objects.aggregate(last=Max('id'))['last'] or 0,
+            Comment.objects.aggregate(last=Max('id'))['last'] or 0)
+
+def export_uploads(last_post_id, last_comment_id):
+    """
+    The dumpUploads document, produced a chunk of rows at a time.
+
+    Both tables are cut off at the ids read before streaming began, so a
+    comment never refers to a post missing from the export, without holding
+    a transaction (on SQLite, the write lock) open for the whole stream.
+    The counts come after the arrays and are the rows actually sent. The
+    200 has gone out by the time rows are read, so a failure part-way
+    closes the document with "status": "error" rather than truncating it.
+    """
+    posts = (Post.objects.filter(id__lte=last_post_id).order_by('-created_at')
+             .values_list('id', 'author__username', 'author_id', 'title', 'content',
+                          'created_at', 'hidden', 'hide_reason')
+             .iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    comments = (Comment.objects.filter(id__lte=last_comment_id).order_by('-created_at')
+                .values_list('id', 'user__username', 'user_id', 'post_id', 'content',
+                             'created_at', 'hidden', 'hide_reason')
+                .iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    counts = {'posts': 0, 'comments': 0}
+
+    def counted(rows, name):
+        for row in rows:
+            counts[name] += 1
+            yield row
+
+    section = 'posts'
+    yield '{"posts": ['
+    try:
+        yield from export_rows(counted(posts, 'posts'), export_post)
+        section = 'comments'
+        yield '], "comments": ['
+        yield from export_rows(counted(comments, 'comments'), export_comment)
+        status = '"status": "success"'
+    except Exception as e:
+        # export_rows yields whole rows, so the open array can be closed
+        logger.exception("dumpUploads failed mid-stream")
+        if section == 'posts':
+            yield '], "comments": ['
+        status = f'"status": "error", "error": {json.dumps(str(e))}'
+    yield f'], "post_count": {counts["posts"]}, "comment_count": {counts["comments"]}, {status}}}'
+
 @csrf_exempt
 def dump_uploads(request):
+    """
+    Every post and comment as one JSON document, streamed: rows are read
+    with server-side chunked fetching and serialized as they arrive, so
+    memory stays flat however large the tables are.
+    """
     if request.method != "GET":
         return JsonResponse({'error': 'GET required'}, status=405)
     try:
-        raw_posts = list(Post.objects.all().order_by('-created_at'))
-        post_count = len(raw_posts)
-        if post_count == 0:
+        bounds = export_bounds()
+        if bounds[0] == 0:
             admin = User.objects.filter(is_staff=True).first()
             if not admin:
                 admin = User.objects.first()
@@ -340,69 +479,44 @@ def dump_uploads(request):
                     post=post,
                     content=f"Test comment {i+1} on post {i+1}."
                 )
-            raw_posts = list(Post.objects.all().order_by('-created_at'))
-            post_count = len(raw_posts)
-        post_data = []
-        for p in raw_posts:
-            post_data.append({
-                'id': p.id,
-                'author': p.author.username,
-                'user_id': p.author.id,
-                'title': p.title,
-                'content': p.content,
-                'created_at': p.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                'hidden': p.hidden,
-                'hide_reason': p.hide_reason or '',
-            })
-        raw_comments = list(Comment.objects.all().order_by('-created_at'))
-        comment_count = len(raw_comments)
-        comment_data = []
-        for c in raw_comments:
-            comment_data.append({
-                'id': c.id,
-                'user': c.user.username,
-                'user_id': c.user.id,
-                'post_id': c.post.id,
-                'content': c.content,
-                'created_at': c.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                'hidden': c.hidden,
-                'hide_reason': c.hide_reason or '',
-            })
-        # Debug: print DB path and row counts
-        print('DB path:', settings.DATABASES['default']['NAME'])
-        print('Post count in dump_uploads:', post_count)
-        print('Comment count in dump_uploads:', comment_count)
-        return JsonResponse({
-            'status': 'success',
-            'post_count': post_count,
-            'comment_count': comment_count,
-            'posts': post_data,
-            'comments': comment_data
-        })
+            feed_cache.post_created()
+            feed_cache.comment_created()
+            bounds = export_bounds()
+        return StreamingHttpResponse(export_uploads(*bounds),
+                                     content_type='application/json')
     except Exception as e:
         print(f"Error in dump_uploads: {str(e)}")
         return JsonResponse({'error': str(e)}, status=400)
 
 @csrf_exempt
 @require_GET
+@feed_cache.cached_feed('app_feed')
 def app_feed(request):
     """
     API endpoint that lists posts in reverse chronological order with truncated content.
-    Returns post number, title, date, username, and truncated content.
+    Returns post number, title, date, username, and truncated content, one
+    page at a time ({"results": [...], "next": url}), or every post as a
+    plain list with ?all=1.
     """
     current_user = request.user
     is_staff = current_user.is_authenticated and current_user.is_staff
     
-    # Get all posts
-    posts = Post.objects.order_by('-created_at')
+    # Hidden posts are only visible to staff and to their own author
+    posts = Post.objects.select_related('author').order_by('-created_at', '-id')
+    if not is_staff:
+        if current_user.is_authenticated:
+            posts = posts.filter(Q(hidden=False) | Q(author=current_user))
+        else:
+            posts = posts.filter(hidden=False)
+    next_url = None
+    if not wants_all(request):
+        try:
+            posts, next_url = keyset_page(request, posts)
+        except BadPageRequest as e:
+            return JsonResponse({'error': str(e)}, status=400)
     
     result = []
     for post in posts:
-        # Check if post should be visible
-        if post.hidden and not is_staff and (not current_user.is_authenticated or current_user.id != post.author.id):
-            # Skip this post - it's hidden and the user doesn't have permission to see it
-            continue
-            
         # Truncate content to 100 characters
         truncated_content = post.content[:100] + "..." if len(post.content) > 100 else post.content
         
@@ -412,10 +526,14 @@ def app_feed(request):
             'title': post.title,
             'date': post.created_at.isoformat(),
             'username': post.author.username,
-            'content': truncated_content
+            'content': truncated_content,
+            # Staff see hidden comments too, so they count them
+            'comment_count': post.comment_count if is_staff else post.visible_comment_count,
         })
     
-    return JsonResponse(result, safe=False)
+    if wants_all(request):
+        return JsonResponse(result, safe=False)
+    return JsonResponse({'results': result, 'next': next_url})
 
 @csrf_exempt
 @require_GET
@@ -467,4 +585,58 @@ def app_post_detail(request, post_id):
         return JsonResponse(result)
         
     except Post.DoesNotExist:
-        return JsonResponse({'error': 'Post not found'}, status=404)
\ No newline at end of file
+        return JsonResponse({'error': 'Post not found'}, status=404)
+
+@require_GET
+def metrics(request):
+    """
+    Per-endpoint latency, query count and database time histograms recorded
+    by PerformanceMiddleware in this process, plus the feed cache's hit rate.
+    Staff only unless DEBUG is on.
+    """
+    if not settings.DEBUG and not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({'error': 'Unauthorized: Staff required'}, status=401)
+    return JsonResponse({
+        'endpoints': endpoint_metrics(),
+        'feed_cache': feed_cache.cache_stats(),
+    })
+
+@csrf_exempt
+def query_diagnostics(request):
+    """
+    Staff-only view of the slow-query tracer. GET lists the traced statements
+    (most total time first, ?limit=N); POST changes the tracer at runtime:
+    enabled=1|0, slow_ms=N, reset=1.
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Unauthorized: Staff required'}, status=401)
+    if request.method == 'POST':
+        ct = request.META.get('CONTENT_TYPE', '')
+        if ct.startswith('application/json'):
+            try:
+                payload = json.loads(request.body.decode('utf-8'))
+            except json.JSONDecodeError:
+                return JsonResponse({'error': 'invalid JSON'}, status=400)
+        else:
+            payload = request.POST
+        if str(payload.get('reset', '0')).lower() in ('1', 'true', 'yes'):
+            query_trace.reset_trace()
+        enabled = payload.get('enabled')
+        if enabled is not None:
+            enabled = str(enabled).lower() in ('1', 'true', 'yes', 'on')
+        try:
+            slow_ms = payload.get('slow_ms')
+            slow_ms = float(slow_ms) if slow_ms is not None else None
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'slow_ms must be a number'}, status=400)
+        return JsonResponse(query_trace.set_tracing(enabled, slow_ms))
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET or POST required'}, status=405)
+    try:
+        limit = int(request.GET.get('limit', 50))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    return JsonResponse({
+        **query_trace.tracing_state(),
+        'statements': query_trace.statement_report(limit),
+    })
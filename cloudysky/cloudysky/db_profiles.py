@@ -0,0 +1,61 @@
+"""
+SQLite database profiles for cloudysky, chosen with CLOUDYSKY_DB_PROFILE.
+
+Both profiles begin atomic() blocks with BEGIN IMMEDIATE, so a write
+transaction takes the write lock up front (see app/contention.py).
+
+development (default)
+    Otherwise Django's stock SQLite setup: rollback journal, a new
+    connection for every request.
+
+production
+    WAL journaling, so readers no longer wait for a writer (and the writer
+    not for readers); synchronous=NORMAL, which is durable in WAL mode
+    except for the last transactions before a power loss; a 64 MB page
+    cache and 256 MB of memory-mapped I/O; and a busy timeout, so a writer
+    waits for the lock instead of failing with "database is locked". The
+    pragmas run on every new connection (Django's sqlite init_command), and
+    connections persist across requests (CONN_MAX_AGE), checked with
+    CONN_HEALTH_CHECKS before reuse.
+
+Environment overrides for the production profile:
+    CLOUDYSKY_CONN_MAX_AGE    seconds to keep a connection (default 600)
+    CLOUDYSKY_BUSY_TIMEOUT    seconds one attempt waits for the lock (default 1;
+                              the write views retry within WRITE_RETRY_BUDGET_MS)
+"""
+import os
+
+PROFILES = ('development', 'production')
+
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,          # negative: KiB, so 64 MB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+def pragma_script(pragmas):
+    return ' '.join(f'PRAGMA {name}={value};' for name, value in pragmas.items())
+
+def database_settings(profile, name):
+    """DATABASES['default'] for a profile and database file"""
+    if profile not in PROFILES:
+        raise ValueError(f"unknown database profile {profile!r} (expected one of {', '.join(PROFILES)})")
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    }
+    if profile == 'production':
+        busy_timeout = float(os.environ.get('CLOUDYSKY_BUSY_TIMEOUT', '1'))
+        database.update({
+            'CONN_MAX_AGE': int(os.environ.get('CLOUDYSKY_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+        })
+        database['OPTIONS'].update({
+            # sqlite3.connect(timeout=) is SQLite's busy timeout
+            'timeout': busy_timeout,
+            'init_command': pragma_script(PRODUCTION_PRAGMAS),
+        })
+    return database
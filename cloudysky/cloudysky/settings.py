@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db_profiles import database_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware too
+    'app.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,11 +83,11 @@ WSGI_APPLICATION = 'cloudysky.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# CLOUDYSKY_DB_PROFILE=production turns on WAL, tuned pragmas and
+# persistent connections (see cloudysky/db_profiles.py)
+DB_PROFILE = os.environ.get('CLOUDYSKY_DB_PROFILE', 'development')
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(DB_PROFILE, os.environ.get('CLOUDYSKY_DB_PATH', BASE_DIR / 'db.sqlite3')),
 }
 
 
@@ -126,3 +131,58 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Rendered feed pages (see app/feed_cache.py). Local memory is per process;
+# point FEED_CACHE_ALIAS at a shared backend (e.g. FileBasedCache) when
+# running several workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+FEED_CACHE_ALIAS = 'default'
+FEED_CACHE_TIMEOUT = 300
+
+# Per-request instrumentation (see app/middleware.py). Every request is
+# logged to 'app.perf' at INFO, requests over budget at WARNING; set
+# CLOUDYSKY_PERF_LOG=INFO to see all of them
+PERF_LATENCY_BUDGET_MS = 500
+PERF_QUERY_BUDGET = 20
+PERF_TRACK_MEMORY = False
+
+# Write views retry a transaction that finds the database locked for up
+# to this long, then answer 503 with Retry-After (see app/contention.py)
+WRITE_RETRY_BUDGET_MS = 3000
+
+# Slow-query tracer (see app/query_trace.py); toggle at runtime from
+# /diagnostics/queries/. Slow statements and their plans go to a rotating
+# slow_queries.log
+QUERY_TRACE_ENABLED = os.environ.get('CLOUDYSKY_QUERY_TRACE', '0') == '1'
+QUERY_TRACE_SLOW_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'slow_queries.log',
+            'maxBytes': 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'app.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('CLOUDYSKY_PERF_LOG', 'WARNING'),
+            'propagate': False,
+        },
+        'app.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
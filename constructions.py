@@ -0,0 +1,114 @@
+"""
+Puzzle hash constructions.
+
+puzzle.py builds every line as md5(key || word), but an unknown puzzle may
+use another algorithm, put the key after the word, or join the two with a
+separator. A Construction describes one such guess and exposes the same
+one()/many() interface as hash_backends.Hasher, so any sweep can evaluate
+a list of constructions per key while sharing key generation and the
+puzzle's hash set.
+
+Spec syntax (comma separated): algorithm[:prefix|suffix[:separator]]
+
+    md5                   md5(key || word)           (the default)
+    sha1:suffix           sha1(word || key)
+    sha256:prefix:-       sha256(key || '-' || word)
+    all                   every algorithm in both placements
+"""
+
+from hash_backends import get_hasher
+from options import pop_option
+
+ALGORITHMS = ('md5', 'sha1', 'sha256', 'blake2b')
+PLACEMENTS = ('prefix', 'suffix')
+
+# Hex digest length per algorithm, used to skip constructions that cannot
+# have produced any line of a given puzzle
+DIGEST_LENGTHS = {'md5': 32, 'sha1': 40, 'sha256': 64, 'blake2b': 128}
+
+class Construction:
+    """hash(key || sep || word) or hash(word || sep || key)"""
+
+    def __init__(self, algorithm='md5', placement='prefix', separator='', hasher=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported algorithm {algorithm!r}; choose from {', '.join(ALGORITHMS)}")
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Key placement must be 'prefix' or 'suffix', not {placement!r}")
+        self.algorithm = algorithm
+        self.placement = placement
+        self.separator = separator
+        self.hasher = hasher or get_hasher(algorithm)
+        sep = separator.encode('utf-8')
+        base_one = self.hasher.one
+        base_many = self.hasher.many
+
+        if placement == 'prefix' and not sep:
+            # The common case costs nothing over the bare hasher
+            self.one = base_one
+            self.many = base_many
+        elif placement == 'prefix':
+            self.one = lambda key, word: base_one(key + sep, word)
+            self.many = lambda key, words: base_many(key + sep, words)
+        else:
+            def one(key, word):
+                return base_one(word, sep + key)
+
+            def many(key, words):
+                suffix = sep + key
+                return [base_one(word, suffix) for word in words]
+
+            self.one = one
+            self.many = many
+
+    @property
+    def name(self):
+        sep = f" || {self.separator!r}" if self.separator else ""
+        if self.placement == 'prefix':
+            return f"{self.algorithm}(key{sep} || word)"
+        return f"{self.algorithm}(word{sep} || key)"
+
+    @property
+    def spec(self):
+        """The spec parse_constructions() turns back into this construction"""
+        if self.separator:
+            return f"{self.algorithm}:{self.placement}:{self.separator}"
+        return self.algorithm if self.placement == 'prefix' else f"{self.algorithm}:{self.placement}"
+
+    def __reduce__(self):
+        return (Construction, (self.algorithm, self.placement, self.separator, self.hasher))
+
+    def __repr__(self):
+        return f"Construction({self.name})"
+
+    def matches_digest_length(self, length):
+        return DIGEST_LENGTHS[self.algorithm] == length
+
+def parse_constructions(spec=None):
+    """Turn a comma separated spec into a list of Constructions"""
+    if not spec:
+        return [Construction()]
+    constructions = []
+    for part in spec.split(','):
+        part = part.strip()
+        if part == 'all':
+            constructions.extend(Construction(a, p) for a in ALGORITHMS for p in PLACEMENTS)
+            continue
+        fields = part.split(':', 2)
+        algorithm = fields[0]
+        placement = fields[1] if len(fields) > 1 and fields[1] else 'prefix'
+        separator = fields[2] if len(fields) > 2 else ''
+        constructions.append(Construction(algorithm, placement, separator))
+    # Drop duplicates while keeping order
+    unique = {}
+    for c in constructions:
+        unique.setdefault((c.algorithm, c.placement, c.separator), c)
+    return list(unique.values())
+
+def applicable_constructions(constructions, puzzle_hashes):
+    """Keep only constructions whose digest length occurs in the puzzle"""
+    lengths = {len(h) for h in puzzle_hashes}
+    return [c for c in constructions if DIGEST_LENGTHS[c.algorithm] in lengths]
+
+def pop_construction_option(args):
+    """Pull a --construction=SPEC option out of an argument list"""
+    return pop_option(args, 'construction')
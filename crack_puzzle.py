@@ -1,13 +1,18 @@
-import hashlib
 import sys
 import os
 import time
 import pickle
-from multiprocessing import Pool, cpu_count, Manager
+import queue
 import threading
 
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from keyspace import KeySpace, parse_charset_options
+from workers import Supervisor, plan_workers
+
 # Usage: python crack_puzzle.py PUZZLE.txt 4 [wordlist] [start_key] [end_key] [match_threshold]
+#        python crack_puzzle.py PUZZLE.txt '?l?d?d?d' [wordlist] [start_key] [end_key] [match_threshold] [-1 charset]
 #        python crack_puzzle.py PUZZLE-EASY.txt 4 [wordlist] [start_key] [end_key] [match_threshold]
+#        python crack_puzzle.py PUZZLE.txt 4 [wordlist] ... [--construction=md5,sha1:suffix]
 
 def load_hashes(puzzle_file):
     with open(puzzle_file, 'r') as f:
@@ -28,85 +33,154 @@ def load_wordlist(wordlist_file=None):
         return [w.strip() for w in f if w.strip() and w[0].isalpha()]
 
 def try_key_range(args):
-    key_start, key_end, key_format, puzzle_hashes, encoded_words, match_threshold, batch_size = args
+    key_start, key_end, keyspace, puzzle_hashes, encoded_words, match_threshold, batch_size, constructions = args
+    words_bytes = [word_encoded for _, word_encoded in encoded_words]
     n_hashes = len(puzzle_hashes)
     hash_set = set(puzzle_hashes)  # Convert to set for faster lookups
-    best_match = (0, None, None, None)
+    best_match = (0, None, None, None, None)
 
     # Process keys in batches for better efficiency
     for batch_start in range(key_start, key_end, batch_size):
         batch_end = min(batch_start + batch_size, key_end)
-        for key_num in range(batch_start, batch_end):
-            key = key_format.format(key_num)
-            key_encoded = key.encode('utf-8')
-            
-            hash_to_word = {}
-            matched_count = 0
+        keys = keyspace.iter_range(batch_start, batch_end)
+        for key_num, key_encoded in zip(range(batch_start, batch_end), keys):
+            # Every construction is tried against the same key buffer
+            for construction in constructions:
+                hash_to_word = {}
+                matched_count = 0
             
-            # Test all words with this key
-            for word, word_encoded in encoded_words:
-                h = hashlib.md5(key_encoded + word_encoded).hexdigest()
-                if h in hash_set:
-                    hash_to_word[h] = word
-                    matched_count += 1
+                # Test all words with this key
+                for (word, _), h in zip(encoded_words, construction.many(key_encoded, words_bytes)):
+                    if h in hash_set:
+                        hash_to_word[h] = word
+                        matched_count += 1
             
-            match_ratio = matched_count / n_hashes
+                match_ratio = matched_count / n_hashes
             
-            # If at least half the hashes match, this key is promising
-            if match_ratio >= 0.5:
-                # Get uncracked hashes
-                uncracked_hashes = [h for h in puzzle_hashes if h not in hash_to_word]
+                # If at least half the hashes match, this key is promising
+                if match_ratio >= 0.5:
+                    key = key_encoded.decode('ascii')
+                    # Get uncracked hashes
+                    uncracked_hashes = [h for h in puzzle_hashes if h not in hash_to_word]
                 
-                # If all but one matched, we likely found the solution
-                if len(uncracked_hashes) == 1:
-                    return (key, hash_to_word, uncracked_hashes, True)
+                    # If all but one matched, we likely found the solution
+                    if len(uncracked_hashes) == 1:
+                        return (key, hash_to_word, uncracked_hashes, True, construction)
                 
-                # If this is our best match so far, remember it
-                if matched_count > best_match[0]:
-                    best_match = (matched_count, key, hash_to_word, uncracked_hashes)
+                    # If this is our best match so far, remember it
+                    if matched_count > best_match[0]:
+                        best_match = (matched_count, key, hash_to_word, uncracked_hashes, construction)
                 
-                # If enough matched, print partial decode for manual inspection
-                if match_ratio >= match_threshold:
-                    cracked_words = [hash_to_word.get(h) for h in puzzle_hashes]
-                    paragraph = ' '.join([w for w in cracked_words if w is not None])
-                    print(f"\n[Partial match] Key: {key} ({matched_count}/{n_hashes} matched, {match_ratio:.1%})")
-                    print('Paragraph:')
-                    print(paragraph[:100] + '...' if len(paragraph) > 100 else paragraph)
+                    # If enough matched, print partial decode for manual inspection
+                    if match_ratio >= match_threshold:
+                        cracked_words = [hash_to_word.get(h) for h in puzzle_hashes]
+                        paragraph = ' '.join([w for w in cracked_words if w is not None])
+                        print(f"\n[Partial match] Key: {key}, {construction.name} ({matched_count}/{n_hashes} matched, {match_ratio:.1%})")
+                        print('Paragraph:')
+                        print(paragraph[:100] + '...' if len(paragraph) > 100 else paragraph)
             
             # Periodically check if we should save progress
             if key_num % 10000 == 0:
                 if os.path.exists('stop_cracking'):
-                    print(f"Stop file detected, stopping at key {key}")
+                    print(f"Stop file detected, stopping at key {key_encoded.decode('ascii')}")
                     # Return our best match so far
                     if best_match[1]:
-                        return (best_match[1], best_match[2], best_match[3], False)
+                        return (best_match[1], best_match[2], best_match[3], False, best_match[4])
                     return None
     
     # After processing all keys, return the best match if it's promising
     if best_match[0] / n_hashes >= 0.4:  # Lower threshold for final return
-        return (best_match[1], best_match[2], best_match[3], False)
+        return (best_match[1], best_match[2], best_match[3], False, best_match[4])
     return None
 
-def periodic_progress_checker(done_chunks, total_chunks, start_time, stop_event, checkpoint_file):
+def timed_try_key_range(args):
+    """Run try_key_range and report how long the chunk took"""
+    started = time.perf_counter()
+    res = try_key_range(args)
+    return args[0], args[1], time.perf_counter() - started, res
+
+class ChunkSizer:
+    """Adapt the chunk size so each task takes about target_seconds.
+    
+    Starts with a small probe chunk, measures per-worker throughput from
+    finished chunks (exponentially smoothed) and sizes the next chunk for
+    the target duration. Growth is capped per step so one noisy sample
+    cannot blow up the size, and chunks shrink near the end of the range
+    so the last tasks do not leave workers idle.
+    """
+
+    def __init__(self, nprocs, target_seconds=2.0, initial_size=64, min_size=1, max_size=10 ** 9):
+        self.nprocs = nprocs
+        self.target_seconds = target_seconds
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.keys_per_second = None
+        self.samples = 0
+
+    def record(self, keys, elapsed):
+        rate = keys / max(elapsed, 1e-6)
+        if self.keys_per_second is None:
+            self.keys_per_second = rate
+        else:
+            self.keys_per_second = 0.7 * self.keys_per_second + 0.3 * rate
+        self.samples += 1
+        ideal = int(self.keys_per_second * self.target_seconds)
+        self.size = max(self.min_size, min(ideal, self.size * 4, self.max_size))
+
+    def next_size(self, remaining_keys):
+        # Tail: keep at least two chunks per worker in the remaining range
+        tail_cap = max(self.min_size, remaining_keys // (2 * self.nprocs))
+        return max(1, min(self.size, tail_cap, remaining_keys))
+
+def merge_ranges(ranges):
+    """Merge overlapping or adjacent (start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def covered_keys(done_ranges, start_key, end_key):
+    """How many keys of [start_key, end_key) the done ranges cover"""
+    return sum(min(e, end_key) - max(s, start_key) for s, e in done_ranges if s < end_key and e > start_key)
+
+def next_chunk(position, size, end_key, done_ranges):
+    """The next unprocessed (start, end) at or after position, or None"""
+    for done_start, done_end in done_ranges:
+        if done_start <= position < done_end:
+            position = done_end
+    if position >= end_key:
+        return None
+    chunk_end = min(position + size, end_key)
+    for done_start, done_end in done_ranges:
+        if position < done_start < chunk_end:
+            chunk_end = done_start
+            break
+    return position, chunk_end
+
+def periodic_progress_checker(done_keys, total_keys, start_time, stop_event, checkpoint_file):
     last_save = start_time
     while not stop_event.is_set():
         elapsed = time.time() - start_time
-        percent = 100.0 * done_chunks[0] / total_chunks
+        percent = 100.0 * done_keys[0] / total_keys
         
         # Save checkpoint every 5 minutes
         if time.time() - last_save > 300:
             with open(checkpoint_file, 'w') as f:
-                f.write(str(done_chunks[0]))
+                f.write(str(done_keys[0]))
             last_save = time.time()
-            print(f"Checkpoint saved: {done_chunks[0]}/{total_chunks} chunks")
+            print(f"Checkpoint saved: {done_keys[0]}/{total_keys} keys")
         
-        print(f"[Progress] {done_chunks[0]}/{total_chunks} chunks done ({percent:.2f}%), elapsed: {elapsed:.1f}s")
+        print(f"[Progress] {done_keys[0]}/{total_keys} keys done ({percent:.2f}%), elapsed: {elapsed:.1f}s")
         
         # If we're making progress, print estimated time remaining
-        if done_chunks[0] > 0:
-            time_per_chunk = elapsed / done_chunks[0]
-            remaining_chunks = total_chunks - done_chunks[0]
-            estimated_remaining = time_per_chunk * remaining_chunks
+        if done_keys[0] > 0:
+            time_per_key = elapsed / done_keys[0]
+            remaining_keys = total_keys - done_keys[0]
+            estimated_remaining = time_per_key * remaining_keys
             print(f"Estimated time remaining: {estimated_remaining:.1f}s ({estimated_remaining/3600:.1f}h)")
         
         stop_event.wait(30)  # Check more frequently
@@ -121,103 +195,149 @@ def load_checkpoint(file_path):
             return pickle.load(f)
     return None
 
-def crack_puzzle_parallel(puzzle_file, key_length, wordlist_file=None, num_chunks=2000, start_key=None, end_key=None, match_threshold=0.3, batch_size=1000):
+def crack_puzzle_parallel(puzzle_file, key_length, wordlist_file=None, start_key=None, end_key=None, match_threshold=0.3, batch_size=1000, custom_charsets=None, target_task_seconds=2.0, constructions=None):
     puzzle_hashes = load_hashes(puzzle_file)
     wordlist = load_wordlist(wordlist_file)
     
     # Pre-encode all words for better performance
     encoded_words = [(word, word.encode('utf-8')) for word in wordlist]
+    if constructions is None:
+        constructions = parse_constructions()
+    constructions = applicable_constructions(constructions, puzzle_hashes)
+    if not constructions:
+        print("No construction produces digests of the length found in the puzzle")
+        return None, None, None
+    construction_names = [c.name for c in constructions]
     
-    key_format = '{:0' + str(key_length) + 'd}'
-    max_key = 10 ** key_length
+    keyspace = KeySpace.from_spec(key_length, custom_charsets)
     if start_key is None:
         start_key = 0
     if end_key is None:
-        end_key = max_key
-        
-    # Use smaller chunks for better progress tracking
+        end_key = len(keyspace)
     total_keys = end_key - start_key
-    chunk_size = max(100, total_keys // num_chunks)
-    num_chunks = (total_keys + chunk_size - 1) // chunk_size  # Recalculate based on actual chunk size
     
-    # Try to load checkpoint
+    # Try to load checkpoint; completed work is stored as key ranges because
+    # chunk sizes change during the run
     checkpoint_file = f"crack_checkpoint_{os.path.basename(puzzle_file)}_{key_length}.pkl"
     checkpoint_simple = f"chunk_progress_{os.path.basename(puzzle_file)}_{key_length}.txt"
     checkpoint = load_checkpoint(checkpoint_file)
-    done_chunks_list = []
+    done_ranges = []
     
     if checkpoint:
-        done_chunks_list = checkpoint.get('done_chunks', [])
-        print(f"Resuming from checkpoint: {len(done_chunks_list)}/{num_chunks} chunks already processed")
+        # Checkpoints without a construction list come from md5(key || word) runs
+        if checkpoint.get('constructions', ['md5(key || word)']) != construction_names:
+            print("Ignoring checkpoint made with other constructions")
+        elif 'done_ranges' in checkpoint:
+            done_ranges = merge_ranges(checkpoint['done_ranges'])
+            resumed = covered_keys(done_ranges, start_key, end_key)
+            print(f"Resuming from checkpoint: {resumed}/{total_keys} keys already processed")
+        else:
+            print("Ignoring checkpoint in the old fixed-chunk format")
     
-    nprocs = min(cpu_count(), 8)
+    plan = plan_workers()
+    nprocs = plan.count
+    print(plan.describe())
+    sizer = ChunkSizer(nprocs, target_task_seconds)
     print(f"Trying keys {start_key} to {end_key-1} ({total_keys} total) using {nprocs} processes")
-    print(f"Using {num_chunks} chunks of {chunk_size} keys each, batch size: {batch_size}")
+    print(f"Chunk size adapts to ~{target_task_seconds:.1f}s per task, starting at {sizer.size} keys, batch size: {batch_size}")
     print(f"Total words to test per key: {len(wordlist)}")
+    print(f"Trying {len(constructions)} construction(s): {', '.join(construction_names)}")
     
     start_time = time.time()
-    pool = Pool(nprocs)
-    tasks = []
-    
-    # Prepare tasks, skipping already completed chunks
-    for i in range(num_chunks):
-        chunk_start = start_key + i * chunk_size
-        chunk_end = min(start_key + (i + 1) * chunk_size, end_key)
-        if chunk_start >= end_key:
-            break
-            
-        # Skip chunks we've already processed
-        if i in done_chunks_list:
-            continue
-            
-        tasks.append((chunk_start, chunk_end, key_format, puzzle_hashes, encoded_words, match_threshold, batch_size))
+    # Chunks of a worker that dies are requeued whole on its replacement
+    pool = Supervisor(plan)
     
-    if not tasks:
+    if next_chunk(start_key, 1, end_key, done_ranges) is None:
         print("All chunks have been processed. Try with a different key range.")
         return None, None, None
     
     result = None
-    manager = Manager()
-    done_chunks = manager.list([len(done_chunks_list)])
-    stop_event = manager.Event()
+    done_keys = [covered_keys(done_ranges, start_key, end_key)]
+    stop_event = threading.Event()
     progress_thread = threading.Thread(target=periodic_progress_checker, 
-                                      args=(done_chunks, num_chunks, start_time, stop_event, checkpoint_simple))
+                                      args=(done_keys, total_keys, start_time, stop_event, checkpoint_simple))
     progress_thread.start()
     
+    # Feed chunks lazily so each one is sized from the latest measurements;
+    # keep a couple of tasks queued per worker so nobody waits on the parent
+    finished = queue.Queue()
+    in_flight = 0
+    position = start_key
+    reported_size = None
+    completed_tasks = 0
+    
+    def dispatch():
+        nonlocal position, in_flight, reported_size
+        while in_flight < 2 * nprocs:
+            remaining = max(0, end_key - position)
+            chunk = next_chunk(position, sizer.next_size(remaining), end_key, done_ranges)
+            if chunk is None:
+                return
+            chunk_start, chunk_end = chunk
+            position = chunk_end
+            if reported_size is None or not 0.8 <= (chunk_end - chunk_start) / reported_size <= 1.25:
+                reported_size = chunk_end - chunk_start
+                rate = f", {sizer.keys_per_second:.0f} keys/s per worker" if sizer.keys_per_second else ""
+                print(f"[Tuning] chunk size {reported_size} keys{rate}")
+            task = (chunk_start, chunk_end, keyspace, puzzle_hashes, encoded_words, match_threshold, batch_size, constructions)
+            pool.apply_async(timed_try_key_range, task, callback=finished.put,
+                             error_callback=finished.put)
+            in_flight += 1
+    
     try:
-        for res in pool.imap_unordered(try_key_range, tasks):
-            chunk_idx = done_chunks[0]
-            done_chunks[0] += 1
-            done_chunks_list.append(chunk_idx)
+        dispatch()
+        while in_flight:
+            try:
+                item = finished.get(timeout=0.5)
+            except queue.Empty:
+                pool.check()
+                continue
+            in_flight -= 1
+            if isinstance(item, BaseException):
+                raise item
+            chunk_start, chunk_end, elapsed, res = item
+            sizer.record(chunk_end - chunk_start, elapsed)
+            done_ranges = merge_ranges(done_ranges + [(chunk_start, chunk_end)])
+            done_keys[0] += chunk_end - chunk_start
+            completed_tasks += 1
             
             # Save checkpoint periodically
-            if done_chunks[0] % 10 == 0:
-                save_checkpoint(checkpoint_file, {'done_chunks': done_chunks_list})
+            if completed_tasks % 10 == 0:
+                save_checkpoint(checkpoint_file, {'done_ranges': done_ranges, 'constructions': construction_names})
             
             if res:
-                key, hash_to_word, uncracked_hashes, is_full = res
+                key, hash_to_word, uncracked_hashes, is_full, construction = res
                 if is_full:
-                    result = (key, hash_to_word, uncracked_hashes)
-                    pool.terminate()
+                    result = (key, hash_to_word, uncracked_hashes, construction)
                     break
+            
+            if not os.path.exists('stop_cracking'):
+                dispatch()
         
-        pool.close()
-        pool.join()
+        save_checkpoint(checkpoint_file, {'done_ranges': done_ranges, 'constructions': construction_names})
+        if result:
+            pool.terminate()
+        else:
+            pool.close()
+            pool.join()
     except KeyboardInterrupt:
         print("\nCaught keyboard interrupt. Saving progress and shutting down gracefully...")
-        save_checkpoint(checkpoint_file, {'done_chunks': done_chunks_list})
+        save_checkpoint(checkpoint_file, {'done_ranges': done_ranges, 'constructions': construction_names})
         pool.terminate()
-        pool.join()
     finally:
         stop_event.set()
         progress_thread.join()
+    
+    if sizer.keys_per_second:
+        print(f"[Tuning] final chunk size {sizer.size} keys at {sizer.keys_per_second:.0f} keys/s per worker over {completed_tasks} tasks")
         
     print()
     if result:
-        key, hash_to_word, uncracked_hashes = result
+        key, hash_to_word, uncracked_hashes, construction = result
         elapsed = time.time() - start_time
         cracked_words = [hash_to_word.get(h) for h in puzzle_hashes]
         print(f"\nFound likely key: {key}")
+        print(f"Construction: {construction.name}")
         print(f"Unmatched hash count: {len(uncracked_hashes)}")
         paragraph = ' '.join([w for w in cracked_words if w is not None])
         print("Decoded message (paragraph):")
@@ -237,6 +357,7 @@ def crack_puzzle_parallel(puzzle_file, key_length, wordlist_file=None, num_chunk
         # Save the results to a file
         with open(f"result_{os.path.basename(puzzle_file)}_{key}.txt", 'w') as f:
             f.write(f"Key: {key}\n")
+            f.write(f"Construction: {construction.name}\n")
             f.write(f"Decoded paragraph: {paragraph}\n")
             f.write(f"Match ratio: {matched_count / len(puzzle_hashes):.2%}\n")
             f.write(f"Unmatched hashes ({len(uncracked_hashes)}):\n")
@@ -249,30 +370,28 @@ def crack_puzzle_parallel(puzzle_file, key_length, wordlist_file=None, num_chunk
         return None, None, None
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python crack_puzzle.py PUZZLE.txt 4 [wordlist] [start_key] [end_key] [match_threshold]\n       python crack_puzzle.py PUZZLE-EASY.txt 4 [wordlist] [start_key] [end_key] [match_threshold]")
+    custom_charsets, argv = parse_charset_options(sys.argv[1:])
+    construction_spec, argv = pop_construction_option(argv)
+    if len(argv) < 2:
+        print("Usage: python crack_puzzle.py PUZZLE.txt 4 [wordlist] [start_key] [end_key] [match_threshold]\n       python crack_puzzle.py PUZZLE-EASY.txt 4 [wordlist] [start_key] [end_key] [match_threshold]\n       python crack_puzzle.py PUZZLE.txt '?l?d?d?d' [wordlist] ... [-1 charset ...] [--construction=SPEC]")
         sys.exit(1)
-    puzzle_file = sys.argv[1]
-    key_length = int(sys.argv[2])
-    wordlist_file = sys.argv[3] if len(sys.argv) > 3 else 'common_words.txt'
-    start_key = int(sys.argv[4]) if len(sys.argv) > 4 else None
-    end_key = int(sys.argv[5]) if len(sys.argv) > 5 else None
-    match_threshold = float(sys.argv[6]) if len(sys.argv) > 6 else 0.3
-    
-    # Use smaller chunks and batch processing for better performance
-    num_chunks = 2000 if key_length > 6 else 200
-    batch_size = 1000 if key_length > 6 else 100
+    puzzle_file = argv[0]
+    key_length = argv[1]
+    wordlist_file = argv[2] if len(argv) > 2 else 'common_words.txt'
+    start_key = int(argv[3]) if len(argv) > 3 else None
+    end_key = int(argv[4]) if len(argv) > 4 else None
+    match_threshold = float(argv[5]) if len(argv) > 5 else 0.3
     
-    print(f"Starting cracking with {num_chunks} chunks and batch size {batch_size}")
+    print("Chunk sizes are tuned automatically from measured throughput")
     print("Create a file named 'stop_cracking' to gracefully stop the process")
     
     crack_puzzle_parallel(
         puzzle_file, 
         key_length, 
         wordlist_file, 
-        num_chunks=num_chunks, 
         start_key=start_key, 
         end_key=end_key, 
         match_threshold=match_threshold,
-        batch_size=batch_size
-    ) 
\ No newline at end of file
+        custom_charsets=custom_charsets,
+        constructions=parse_constructions(construction_spec)
+    ) 
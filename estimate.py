@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Cost estimates for CMSC13600-HW6 sweeps
+Runs each strategy over a random sample of the key space (short contiguous
+runs at random offsets, so key generation behaves as in a real sweep),
+measures keys/sec and how often keys get past each stage, and projects the
+full-sweep time and the expected time to hit the key for this machine's
+worker count.
+
+Strategies:
+    prefilter    puzzle_solver.py's staged sweep: one 'the' probe per key and
+                 construction, then the duplicate, frequent-word and text stages
+    dictionary   crack_puzzle.py's sweep: the whole verification wordlist per key
+    plaintext    one probe per key with a word known to be in the plaintext
+                 (--known=WORD, or the most frequent word of source_passage*.txt),
+                 every hit going straight to verify_key
+
+Projections assume throughput scales linearly with workers and that the
+key is uniformly placed, so the expected time to hit is half a full sweep.
+
+Usage:
+python estimate.py PUZZLE.txt 9|mask [-1 charset ...] [--construction=SPEC] [--samples=N] [--known=WORD]
+"""
+
+import glob
+import random
+import sys
+import time
+from collections import Counter
+
+from candidates import SOURCE_PASSAGES, normalize
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from instrumentation import STAGES, merge_stage_stats
+from keyspace import KeySpace, parse_charset_options
+from options import pop_option
+from puzzle_solver import (
+    FREQUENT_WORDS, TEXT_WORDS, find_duplicate_hashes, load_hashes, load_verification_wordlist,
+    test_key_range_instrumented, verify_key,
+)
+from workers import plan_workers
+
+# Keys per sampled run; long enough for the odometer, short enough to
+# spread the sample over the whole key space
+RUN_LENGTH = 1000
+
+class Estimate:
+    """Measured throughput and pass rate of one strategy"""
+
+    def __init__(self, name, keys, seconds, candidates, notes=''):
+        self.name = name
+        self.keys = keys
+        self.seconds = seconds
+        self.candidates = candidates
+        self.notes = notes
+
+    @property
+    def keys_per_second(self):
+        return self.keys / self.seconds if self.seconds else 0.0
+
+    @property
+    def candidate_rate(self):
+        return self.candidates / self.keys if self.keys else 0.0
+
+    def project(self, total_keys, workers, verify_seconds):
+        """(full sweep seconds, expected seconds to hit) on this many workers"""
+        rate = self.keys_per_second * workers
+        if not rate:
+            return float('inf'), float('inf')
+        verification = self.candidate_rate * total_keys * verify_seconds / workers
+        full = total_keys / rate + verification
+        return full, full / 2
+
+def sample_runs(total_keys, sample_keys, rng):
+    """Random (start, end) runs of RUN_LENGTH keys covering about sample_keys"""
+    if total_keys <= sample_keys:
+        return [(0, total_keys)]
+    runs = []
+    for _ in range(max(1, sample_keys // RUN_LENGTH)):
+        start = rng.randrange(0, max(1, total_keys - RUN_LENGTH))
+        runs.append((start, min(start + RUN_LENGTH, total_keys)))
+    return runs
+
+def measure_prefilter(keyspace, runs, puzzle_hashes, constructions):
+    hash_set = set(puzzle_hashes)
+    duplicate_hashes = find_duplicate_hashes(puzzle_hashes)
+    text_words_encoded = [(word, word.encode('utf-8')) for word in TEXT_WORDS]
+    stats_list = []
+    for start, end in runs:
+        _, stats = test_key_range_instrumented(
+            (start, end, 1, keyspace, duplicate_hashes, hash_set, FREQUENT_WORDS, text_words_encoded, constructions),
+            quiet=True)
+        stats_list.append(stats)
+    total = merge_stage_stats(stats_list)
+    rates = []
+    for stage in STAGES:
+        entered = total[stage + '_in']
+        rates.append(f"{stage} {total[stage + '_pass'] / entered:.2e}" if entered else f"{stage} -")
+    return Estimate('prefilter', total['keys'], total['elapsed'], total['text_words_pass'],
+                    'pass rates: ' + ', '.join(rates))
+
+def measure_dictionary(keyspace, runs, puzzle_hashes, constructions, wordlist, threshold=0.3):
+    hash_set = set(puzzle_hashes)
+    words_bytes = [word.encode('utf-8') for word in wordlist]
+    needed = threshold * len(puzzle_hashes)
+    keys = 0
+    candidates = 0
+    started = time.perf_counter()
+    for start, end in runs:
+        for key_encoded in keyspace.iter_range(start, end):
+            keys += 1
+            for construction in constructions:
+                matched = sum(1 for h in construction.many(key_encoded, words_bytes) if h in hash_set)
+                if matched >= needed:
+                    candidates += 1
+    return Estimate('dictionary', keys, time.perf_counter() - started, candidates,
+                    f"{len(wordlist)} words per key")
+
+def measure_plaintext(keyspace, runs, puzzle_hashes, constructions, known_word):
+    hash_set = set(puzzle_hashes)
+    word = known_word.encode('utf-8')
+    probes = [construction.one for construction in constructions]
+    keys = 0
+    candidates = 0
+    started = time.perf_counter()
+    for start, end in runs:
+        for key_encoded in keyspace.iter_range(start, end):
+            keys += 1
+            for one in probes:
+                if one(key_encoded, word) in hash_set:
+                    candidates += 1
+    return Estimate('plaintext', keys, time.perf_counter() - started, candidates,
+                    f"known word {known_word!r}")
+
+def most_frequent_plaintext_word():
+    """Most common token of the source passages, or None without any"""
+    counts = Counter()
+    for filename in glob.glob(SOURCE_PASSAGES):
+        with open(filename, 'r') as f:
+            counts.update(token for token in f.read().split() if normalize(token) == token)
+    return counts.most_common(1)[0][0] if counts else None
+
+def format_seconds(seconds):
+    if seconds == float('inf'):
+        return 'never'
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}"
+    return f"{seconds:.1f}s"
+
+def estimate(puzzle_file, key_length, custom_charsets=None, constructions=None, sample_keys=200000,
+             known_word=None, seed=None):
+    """Sample every strategy and print projected sweep times, fastest first"""
+    puzzle_hashes = load_hashes(puzzle_file)
+    keyspace = KeySpace.from_spec(key_length, custom_charsets)
+    total_keys = len(keyspace)
+    constructions = applicable_constructions(constructions or parse_constructions(), puzzle_hashes)
+    if not constructions:
+        print("No construction produces digests of the length found in the puzzle")
+        return []
+    workers = plan_workers().count
+    wordlist = load_verification_wordlist()
+    rng = random.Random(seed)
+
+    print(f"Key space: {total_keys} keys ({keyspace!r}), {workers} workers, "
+          f"{len(constructions)} construction(s)")
+
+    # verify_key runs once per candidate, so its cost matters for leaky filters
+    started = time.perf_counter()
+    verify_key(keyspace.key_at(0).decode('ascii'), puzzle_hashes, wordlist, save_to_file=False,
+               hasher=constructions[0])
+    verify_seconds = time.perf_counter() - started
+
+    estimates = [measure_prefilter(keyspace, sample_runs(total_keys, sample_keys, rng), puzzle_hashes,
+                                   constructions)]
+    # The dictionary sweep is hundreds of times slower per key; sample less
+    dictionary_keys = max(RUN_LENGTH, sample_keys // 100)
+    estimates.append(measure_dictionary(keyspace, sample_runs(total_keys, dictionary_keys, rng),
+                                        puzzle_hashes, constructions, wordlist))
+    known_word = known_word or most_frequent_plaintext_word()
+    if known_word:
+        estimates.append(measure_plaintext(keyspace, sample_runs(total_keys, sample_keys, rng),
+                                           puzzle_hashes, constructions, known_word))
+    else:
+        print("No --known word and no source passage: skipping the plaintext strategy")
+
+    rows = []
+    for est in estimates:
+        full, expected = est.project(total_keys, workers, verify_seconds)
+        rows.append((expected, full, est))
+    rows.sort(key=lambda row: row[0])
+
+    print(f"\n{'strategy':<12} {'sampled':>9} {'keys/s/worker':>14} {'candidates/key':>15} "
+          f"{'full sweep':>11} {'expected hit':>13}")
+    for expected, full, est in rows:
+        print(f"{est.name:<12} {est.keys:>9} {est.keys_per_second:>14.0f} {est.candidate_rate:>15.2e} "
+              f"{format_seconds(full):>11} {format_seconds(expected):>13}")
+    for _, _, est in rows:
+        print(f"  {est.name}: {est.notes}")
+    print(f"\nFastest: {rows[0][2].name} (verify_key costs {verify_seconds * 1000:.1f} ms per candidate)")
+    return [est for _, _, est in rows]
+
+def main():
+    """Main entry point"""
+    custom_charsets, args = parse_charset_options(sys.argv[1:])
+    construction_spec, args = pop_construction_option(args)
+    samples, args = pop_option(args, 'samples')
+    known_word, args = pop_option(args, 'known')
+    if len(args) < 2:
+        print(__doc__)
+        return
+    estimate(args[0], args[1], custom_charsets, parse_constructions(construction_spec),
+             int(samples) if samples else 200000, known_word)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
-import hashlib
 import sys
 import itertools
 import string
 from collections import Counter
 
+from hash_backends import get_hasher
+
 def load_hashes(hash_file):
     """Load unmatched hashes from file"""
     with open(hash_file, 'r') as f:
@@ -55,6 +56,7 @@ def generate_hamming_variants(word, max_distance=2):
 
 def find_misspelling(unmatched_hashes, key, decoded_text):
     """Find the misspelled word by checking all possible variants"""
+    hasher = get_hasher()
     key_encoded = str(key).encode('utf-8')
     words = decoded_text.split()
     hash_set = set(unmatched_hashes)
@@ -74,11 +76,11 @@ def find_misspelling(unmatched_hashes, key, decoded_text):
             continue
             
         print(f"Checking variants for word: {word}")
-        variants = generate_hamming_variants(word)
+        variants = list(generate_hamming_variants(word))
+        variant_hashes = hasher.many(key_encoded, [v.encode('utf-8') for v in variants])
         found = 0
         
-        for variant in variants:
-            h = hashlib.md5(key_encoded + variant.encode('utf-8')).hexdigest()
+        for variant, h in zip(variants, variant_hashes):
             if h in hash_set:
                 print(f"FOUND MATCH! Word: '{word}' -> Misspelled: '{variant}'")
                 print(f"Hash: {h}")
@@ -99,11 +101,11 @@ def find_misspelling(unmatched_hashes, key, decoded_text):
                 continue
                 
             # Check if this word might be the misspelled one
-            variants = generate_hamming_variants(word)
+            variants = list(generate_hamming_variants(word))
+            variant_hashes = hasher.many(key_encoded, [v.encode('utf-8') for v in variants])
             found = 0
             
-            for variant in variants:
-                h = hashlib.md5(key_encoded + variant.encode('utf-8')).hexdigest()
+            for variant, h in zip(variants, variant_hashes):
                 if h in hash_set:
                     print(f"FOUND MATCH! Common word: '{word}' -> Misspelled: '{variant}'")
                     print(f"Hash: {h}")
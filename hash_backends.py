@@ -0,0 +1,160 @@
+"""
+Hash backends for the crackers.
+
+Every cracker computes hash(key || word) for many words per key. There are
+several ways to do that in CPython and which one wins depends on the
+machine and the Python build, so a short calibration run picks the fastest
+implementation for the two operations the crackers need:
+
+    hasher.one(key, word)    -> hexdigest     (prefilters, single probes)
+    hasher.many(key, words)  -> [hexdigest]   (wordlist and variant sweeps)
+
+Backends:
+    fresh   hashlib.md5(key + word) per word (the original code path)
+    copy    hash the key once, then prefix.copy().update(word) per word
+    nosec   hashlib.md5(key + word, usedforsecurity=False)
+    batch   one map() pipeline over the whole word list per key
+
+Set HASH_BACKEND=<name> to skip calibration and force a backend.
+Hashers pickle by name, so calibrate once in the parent and pass the
+hasher to worker processes.
+"""
+
+import hashlib
+import os
+import time
+from operator import methodcaller
+
+_hexdigest = methodcaller('hexdigest')
+
+def _constructor(algorithm, usedforsecurity=True):
+    new = getattr(hashlib, algorithm, None)
+    if new is None:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+    if usedforsecurity:
+        return new
+    new(b'', usedforsecurity=False)  # raises TypeError on builds without the flag
+    return lambda data: new(data, usedforsecurity=False)
+
+class FreshBackend:
+    name = 'fresh'
+
+    def __init__(self, algorithm='md5'):
+        self.algorithm = algorithm
+        self._new = _constructor(algorithm)
+
+    def one(self, key, word):
+        return self._new(key + word).hexdigest()
+
+    def many(self, key, words):
+        new = self._new
+        return [new(key + word).hexdigest() for word in words]
+
+class CopyBackend:
+    name = 'copy'
+
+    def __init__(self, algorithm='md5'):
+        self.algorithm = algorithm
+        self._new = _constructor(algorithm)
+
+    def one(self, key, word):
+        h = self._new(key)
+        h.update(word)
+        return h.hexdigest()
+
+    def many(self, key, words):
+        prefix = self._new(key)
+        out = []
+        append = out.append
+        for word in words:
+            h = prefix.copy()
+            h.update(word)
+            append(h.hexdigest())
+        return out
+
+class NoSecBackend(FreshBackend):
+    name = 'nosec'
+
+    def __init__(self, algorithm='md5'):
+        self.algorithm = algorithm
+        self._new = _constructor(algorithm, usedforsecurity=False)
+
+class BatchBackend(FreshBackend):
+    name = 'batch'
+
+    def many(self, key, words):
+        # The same per-word constructor as FreshBackend, chained through
+        # map() to drop the Python-level loop; no vectorised hashing
+        return list(map(_hexdigest, map(self._new, map(key.__add__, words))))
+
+BACKENDS = {cls.name: cls for cls in (FreshBackend, CopyBackend, NoSecBackend, BatchBackend)}
+
+def available_backends(algorithm='md5'):
+    """Instantiate every backend this Python build supports"""
+    backends = []
+    for cls in BACKENDS.values():
+        try:
+            backends.append(cls(algorithm))
+        except (TypeError, ValueError):
+            pass
+    return backends
+
+class Hasher:
+    """The fastest one() and many() implementations for an algorithm"""
+
+    def __init__(self, algorithm='md5', one_backend='fresh', many_backend='fresh'):
+        for backend in (one_backend, many_backend):
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown hash backend {backend!r}; choose from {', '.join(BACKENDS)}")
+        self.algorithm = algorithm
+        self.one_backend = one_backend
+        self.many_backend = many_backend
+        self.one = BACKENDS[one_backend](algorithm).one
+        self.many = BACKENDS[many_backend](algorithm).many
+
+    def __reduce__(self):
+        return (Hasher, (self.algorithm, self.one_backend, self.many_backend))
+
+    def __repr__(self):
+        return f"Hasher({self.algorithm}, one={self.one_backend}, many={self.many_backend})"
+
+def _time_call(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return time.perf_counter() - start
+
+def calibrate(algorithm='md5', sample_words=None, rounds=200):
+    """Time every available backend and return a Hasher using the fastest"""
+    if sample_words is None:
+        sample_words = [w.encode('utf-8') for w in (
+            'the', 'and', 'was', 'for', 'that', 'with', 'they', 'this', 'have', 'from',
+            'little', 'bastards', 'hiding', 'lightning', 'tomorrow', 'christian')] * 8
+    key = bytearray(b'485066843')
+    backends = available_backends(algorithm)
+    one_times = {}
+    many_times = {}
+    for backend in backends:
+        # Warm up once so the first backend is not penalised
+        backend.many(key, sample_words)
+        one_times[backend.name] = _time_call(lambda: backend.one(key, b'the'), rounds * 20)
+        many_times[backend.name] = _time_call(lambda: backend.many(key, sample_words), rounds)
+    best_one = min(one_times, key=one_times.get)
+    best_many = min(many_times, key=many_times.get)
+    return Hasher(algorithm, best_one, best_many)
+
+_hashers = {}
+
+def get_hasher(algorithm='md5', verbose=True):
+    """Return the calibrated Hasher for this process (calibrating on first use)"""
+    if algorithm not in _hashers:
+        forced = os.environ.get('HASH_BACKEND')
+        if forced:
+            hasher = Hasher(algorithm, forced, forced)
+        else:
+            hasher = calibrate(algorithm)
+        if verbose:
+            print(f"Hash backend: {hasher.one_backend} for single probes, "
+                  f"{hasher.many_backend} for word sweeps ({algorithm})")
+        _hashers[algorithm] = hasher
+    return _hashers[algorithm]
@@ -0,0 +1,143 @@
+"""
+Optional instrumentation for the key sweep.
+
+Nothing here runs unless asked for: crack_key only passes test_key_range
+a stats dict (through test_key_range_instrumented) when --stats is given,
+and only wraps workers in a profiler when --profile is given. Even with
+--stats the per-key loop carries no counters; only the rare keys that pass
+the 'the' prefilter are counted and timed.
+
+    --stats              per-stage counters and timers per worker, plus an
+                         end-of-run summary table
+    --profile=cprofile   run each worker task under cProfile and write
+                         profiles/<pid>_<start>.prof
+    --profile=sample     sample the worker's stack on SIGPROF every 5 ms and
+                         write profiles/<pid>_<start>.samples.txt
+    --profile-dir=DIR    where profiles go (default: profiles)
+"""
+
+import cProfile
+import os
+import signal
+from collections import Counter
+
+from options import pop_flag, pop_option
+
+STAGES = ('prefilter', 'duplicates', 'frequent', 'text_words')
+
+STAGE_LABELS = {
+    'prefilter': "'the' prefilter",
+    'duplicates': 'duplicate-set check',
+    'frequent': 'verify_key_fast',
+    'text_words': 'text word matching',
+}
+
+def new_stage_stats(worker):
+    """Counters for one worker task (a plain dict so it pickles cheaply)"""
+    stats = {'worker': worker, 'pid': os.getpid(), 'keys': 0, 'elapsed': 0.0}
+    for stage in STAGES:
+        stats[stage + '_in'] = 0
+        stats[stage + '_pass'] = 0
+        stats[stage + '_time'] = 0.0
+    return stats
+
+def merge_stage_stats(stats_list):
+    total = new_stage_stats('all')
+    total['pid'] = '-'
+    for stats in stats_list:
+        for name, value in stats.items():
+            if name not in ('worker', 'pid'):
+                total[name] += value
+    return total
+
+def print_stage_summary(stats_list, promising=0, verified=0):
+    """Print per-worker and total stage counts, pass rates and timings"""
+    if not stats_list:
+        print("No stage statistics were collected")
+        return
+    total = merge_stage_stats(stats_list)
+    print("\n===== Sweep stage summary =====")
+    header = f"{'worker':>8} {'pid':>8} {'keys':>12} {'keys/s':>10}"
+    for stage in STAGES:
+        header += f" {stage + ' in':>14} {'pass':>8}"
+    print(header)
+    for stats in sorted(stats_list, key=lambda s: str(s['worker'])) + [total]:
+        rate = stats['keys'] / stats['elapsed'] if stats['elapsed'] else 0.0
+        row = f"{str(stats['worker']):>8} {str(stats['pid']):>8} {stats['keys']:>12} {rate:>10.0f}"
+        for stage in STAGES:
+            row += f" {stats[stage + '_in']:>14} {stats[stage + '_pass']:>8}"
+        print(row)
+
+    print("\nStage totals:")
+    busy = sum(total[stage + '_time'] for stage in STAGES) or 1.0
+    for stage in STAGES:
+        entered = total[stage + '_in']
+        passed = total[stage + '_pass']
+        pass_rate = passed / entered if entered else 0.0
+        share = total[stage + '_time'] / busy
+        print(f"  {STAGE_LABELS[stage]:<22} in={entered:<12} pass={passed:<8} "
+              f"rate={pass_rate:<10.3e} time={total[stage + '_time']:.2f}s ({share:.1%})")
+    false_positives = max(0, promising - verified)
+    print(f"  promising keys: {promising}, verified: {verified}, false positives: {false_positives}")
+
+class SampleProfiler:
+    """Minimal sampling profiler: counts the innermost frames on SIGPROF"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._previous = None
+
+    def _handler(self, signum, frame):
+        stack = []
+        while frame is not None and len(stack) < 4:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        self.samples[' <- '.join(stack)] += 1
+
+    def start(self):
+        self._previous = signal.signal(signal.SIGPROF, self._handler)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+    def write(self, path):
+        total = sum(self.samples.values()) or 1
+        with open(path, 'w') as f:
+            f.write(f"# {total} samples every {self.interval * 1000:.1f} ms\n")
+            for stack, count in self.samples.most_common():
+                f.write(f"{count:8d} {count / total:6.1%}  {stack}\n")
+
+def run_profiled(args):
+    """Pool entry point that runs func(task) under the requested profiler"""
+    mode, profile_dir, func, task = args
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, f"{os.getpid()}_{task[0]}")
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        result = profiler.runcall(func, task)
+        profiler.dump_stats(base + '.prof')
+        return result
+    if mode == 'sample':
+        profiler = SampleProfiler()
+        profiler.start()
+        try:
+            result = func(task)
+        finally:
+            profiler.stop()
+        profiler.write(base + '.samples.txt')
+        return result
+    raise ValueError(f"Unknown profile mode: {mode}")
+
+def pop_instrumentation_options(args):
+    """Pull --stats, --profile=MODE and --profile-dir=DIR out of args"""
+    options = {}
+    options['stats'], args = pop_flag(args, 'stats')
+    options['profile'], args = pop_option(args, 'profile')
+    options['profile_dir'], args = pop_option(args, 'profile-dir', 'profiles')
+    if options['profile'] not in (None, 'cprofile', 'sample'):
+        raise ValueError("--profile must be 'cprofile' or 'sample'")
+    return options, args
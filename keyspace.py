@@ -0,0 +1,171 @@
+"""
+Mask-based key spaces for the crackers.
+
+A mask uses hashcat syntax: each position is a charset placeholder or a
+fixed literal, and the key space is the mixed-radix product of the
+positions (the last position varies fastest).
+
+    ?d  0-9            ?l  a-z            ?u  A-Z
+    ?s  punctuation    ?a  ?l?u?d?s       ?1-?4  custom charsets
+    ??  a literal '?'  anything else is a fixed literal
+
+Keys are produced by stepping an ASCII odometer in place in one bytearray,
+so a sweep allocates nothing per key. The yielded buffer is reused: copy it
+with bytes(buf) before keeping it.
+
+    space = KeySpace('?d?d?d?d')        # same as KeySpace.from_length(4)
+    for key in space.iter_range(0, len(space)):
+        ...
+"""
+
+import string
+
+BUILTIN_CHARSETS = {
+    'd': string.digits,
+    'l': string.ascii_lowercase,
+    'u': string.ascii_uppercase,
+    's': string.punctuation + ' ',
+}
+BUILTIN_CHARSETS['a'] = (BUILTIN_CHARSETS['l'] + BUILTIN_CHARSETS['u'] +
+                         BUILTIN_CHARSETS['d'] + BUILTIN_CHARSETS['s'])
+
+def parse_mask(mask, custom_charsets=None):
+    """Split a mask into a list of per-position charsets (as bytes)"""
+    custom_charsets = custom_charsets or {}
+    positions = []
+    i = 0
+    while i < len(mask):
+        c = mask[i]
+        if c != '?':
+            positions.append(c.encode('ascii'))
+            i += 1
+            continue
+        if i + 1 >= len(mask):
+            raise ValueError(f"Mask ends with a bare '?': {mask!r}")
+        name = mask[i + 1]
+        if name == '?':
+            charset = '?'
+        elif name in BUILTIN_CHARSETS:
+            charset = BUILTIN_CHARSETS[name]
+        elif name in '1234':
+            if name not in custom_charsets:
+                raise ValueError(f"Mask uses ?{name} but custom charset {name} is not defined")
+            charset = expand_charset(custom_charsets[name])
+        else:
+            raise ValueError(f"Unknown mask placeholder ?{name} in {mask!r}")
+        # Keep order, drop duplicates so every key appears exactly once
+        positions.append(bytes(dict.fromkeys(charset.encode('ascii'))))
+        i += 2
+    if not positions:
+        raise ValueError("Empty mask")
+    return positions
+
+def expand_charset(spec):
+    """Expand builtin placeholders inside a custom charset, e.g. '?dabc'"""
+    out = []
+    i = 0
+    while i < len(spec):
+        if spec[i] == '?' and i + 1 < len(spec) and spec[i + 1] in BUILTIN_CHARSETS:
+            out.append(BUILTIN_CHARSETS[spec[i + 1]])
+            i += 2
+        else:
+            out.append(spec[i])
+            i += 1
+    return ''.join(out)
+
+class KeySpace:
+    """A mixed-radix key space defined by a mask"""
+
+    def __init__(self, mask, custom_charsets=None):
+        self.mask = mask
+        self.charsets = parse_mask(mask, custom_charsets)
+        self.radices = [len(cs) for cs in self.charsets]
+        self.size = 1
+        for r in self.radices:
+            self.size *= r
+
+    @classmethod
+    def from_length(cls, key_length):
+        """The zero-padded decimal key space the crackers used originally"""
+        return cls('?d' * key_length)
+
+    @classmethod
+    def from_spec(cls, spec, custom_charsets=None):
+        """Accept either a decimal key length or a mask"""
+        if isinstance(spec, int) or str(spec).isdigit():
+            return cls.from_length(int(spec))
+        return cls(spec, custom_charsets)
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f"KeySpace({self.mask!r}, size={self.size})"
+
+    def digits_at(self, index):
+        """Mixed-radix digits of a key index (most significant first)"""
+        if not 0 <= index < self.size:
+            raise IndexError(f"Key index {index} outside key space of {self.size}")
+        digits = [0] * len(self.radices)
+        for pos in range(len(self.radices) - 1, -1, -1):
+            index, digits[pos] = divmod(index, self.radices[pos])
+        return digits
+
+    def key_at(self, index):
+        """The key at a given index, as bytes"""
+        return bytes(cs[d] for cs, d in zip(self.charsets, self.digits_at(index)))
+
+    def iter_range(self, start, end, step=1):
+        """Yield keys start, start+step, ... < end in one reused bytearray"""
+        end = min(end, self.size)
+        if start >= end:
+            return
+        digits = self.digits_at(start)
+        charsets = self.charsets
+        radices = self.radices
+        buf = bytearray(cs[d] for cs, d in zip(charsets, digits))
+        last = len(radices) - 1
+        last_radix = radices[last]
+        last_charset = charsets[last]
+        for _ in range((end - start + step - 1) // step):
+            yield buf
+            # Fast path: the last position absorbs the step without carrying
+            d = digits[last] + step
+            if d < last_radix:
+                digits[last] = d
+                buf[last] = last_charset[d]
+                continue
+            carry = step
+            pos = last
+            while carry and pos >= 0:
+                carry, digits[pos] = divmod(digits[pos] + carry, radices[pos])
+                buf[pos] = charsets[pos][digits[pos]]
+                pos -= 1
+
+    def split(self, parts, start=0, end=None):
+        """Divide [start, end) into contiguous (start, end) index ranges"""
+        end = self.size if end is None else min(end, self.size)
+        total = max(0, end - start)
+        parts = max(1, min(parts, total or 1))
+        base, extra = divmod(total, parts)
+        ranges = []
+        lo = start
+        for i in range(parts):
+            hi = lo + base + (1 if i < extra else 0)
+            ranges.append((lo, hi))
+            lo = hi
+        return ranges
+
+def parse_charset_options(args):
+    """Pull hashcat-style -1..-4 charset options out of an argument list"""
+    custom_charsets = {}
+    rest = []
+    i = 0
+    while i < len(args):
+        if args[i] in ('-1', '-2', '-3', '-4') and i + 1 < len(args):
+            custom_charsets[args[i][1]] = args[i + 1]
+            i += 2
+        else:
+            rest.append(args[i])
+            i += 1
+    return custom_charsets, rest
@@ -2,9 +2,10 @@ import hashlib
 import sys
 import os
 import time
-from multiprocessing import Pool, cpu_count
 from collections import Counter
 
+from workers import plan_workers
+
 # Usage: python optimized_crack_puzzle.py PUZZLE.txt 9 [start_key] [end_key]
 
 # Most common English words - these are likely to appear in any text
@@ -155,7 +156,9 @@ def main():
     key_format = '{:0' + str(key_length) + 'd}'
     
     # Set up multiprocessing
-    num_processes = min(cpu_count(), 8)
+    plan = plan_workers()
+    num_processes = plan.count
+    print(plan.describe())
     ranges = distribute_work(key_length, num_processes, start_key, end_key)
     
     print(f"Starting search with {num_processes} processes")
@@ -165,7 +168,7 @@ def main():
     tasks = [(r[0], r[1], r[2], key_format, duplicate_hashes, hash_set, encoded_common_words) for r in ranges]
     
     # Start worker processes
-    with Pool(num_processes) as pool:
+    with plan.make_pool() as pool:
         promising_results = []
         for result in pool.imap_unordered(test_key_range, tasks):
             if result:
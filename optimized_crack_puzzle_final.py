@@ -1,12 +1,20 @@
-import hashlib
 import sys
 import os
 import time
-from multiprocessing import Pool, cpu_count
+from multiprocessing import TimeoutError
 from collections import Counter
 import itertools
 
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from hash_backends import get_hasher
+from keyspace import KeySpace, parse_charset_options
+from pipeline import VerificationPipeline
+from puzzle_solver import find_misspellings, test_key_range
+from workers import plan_workers
+
 # Usage: python optimized_crack_puzzle_final.py PUZZLE.txt 9 [start_key] [end_key]
+#        python optimized_crack_puzzle_final.py PUZZLE.txt '?l?l?d?d' [start_key] [end_key]
+#        python optimized_crack_puzzle_final.py PUZZLE.txt 9 [start_key] [end_key] --construction=md5,sha1:suffix
 
 # Words from the decoded message - using actual words from the text for maximum speed
 TEXT_WORDS = [
@@ -40,77 +48,26 @@ def find_duplicate_hashes(puzzle_hashes):
     duplicates = [(h, count) for h, count in counts.items() if count > 1]
     return sorted(duplicates, key=lambda x: x[1], reverse=True)  # Sort by frequency
 
-def verify_key_fast(key, hash_set, frequent_words):
-    """Quick check if a key matches several frequent words"""
-    key_encoded = str(key).encode('utf-8')
-    matches = 0
-    
-    for word in frequent_words:
-        h = hashlib.md5(key_encoded + word.encode('utf-8')).hexdigest()
-        if h in hash_set:
-            matches += 1
-            if matches >= 3:  # We found multiple matches, this is promising
-                return True
-    
-    return False
+def load_verification_wordlist():
+    """Load the specialized verification wordlist once per run"""
+    if os.path.exists('common_words.txt'):
+        with open('common_words.txt', 'r') as f:
+            return [line.strip() for line in f]
+    return TEXT_WORDS
 
-def test_key_range(args):
-    """Test a range of keys using stride for better distribution"""
-    start_key, end_key, stride, key_format, duplicate_hashes, hash_set, frequent_words, text_words_encoded = args
-    frequent_words_encoded = [(word, word.encode('utf-8')) for word in frequent_words]
-    duplicate_set = {h for h, _ in duplicate_hashes}
-    
-    for key_num in range(start_key, end_key, stride):
-        key = key_format.format(key_num)
-        key_encoded = key.encode('utf-8')
-        
-        # Ultra-quick check: just check the most frequent word in the text
-        # This will eliminate 99.9% of keys immediately
-        h = hashlib.md5(key_encoded + b'the').hexdigest()
-        if h in hash_set:
-            # Quick check with duplicated hashes
-            matched_duplicates = 0
-            for word, word_encoded in frequent_words_encoded:
-                h = hashlib.md5(key_encoded + word_encoded).hexdigest()
-                if h in duplicate_set:
-                    matched_duplicates += 1
-                    if matched_duplicates >= 2:  # Found multiple matches with duplicates
-                        # This key is worth investigating - do a more thorough check
-                        if verify_key_fast(key, hash_set, frequent_words):
-                            # Found a promising key, investigate further
-                            matches = []
-                            matched_hashes = set()
-                            for word, word_encoded in text_words_encoded:
-                                h = hashlib.md5(key_encoded + word_encoded).hexdigest()
-                                if h in hash_set:
-                                    matches.append((h, word))
-                                    matched_hashes.add(h)
-                            
-                            return (key_num, key, matches, matched_hashes)
-            
-        # Periodic status update with very low frequency to minimize overhead
-        if key_num % (stride * 1000000) == start_key:
-            print(f"Process {start_key % stride} checked up to {key_num}")
-            
-    return None
-
-def verify_key(key, puzzle_hashes, wordlist=None):
+def verify_key(key, puzzle_hashes, wordlist=None, hasher=None):
     """Verify if a key is correct by testing it with a larger wordlist"""
     if wordlist is None:
-        # Use a specialized wordlist for verification
-        if os.path.exists('common_words.txt'):
-            with open('common_words.txt', 'r') as f:
-                wordlist = [line.strip() for line in f]
-        else:
-            wordlist = TEXT_WORDS
+        wordlist = load_verification_wordlist()
     
+    hasher = hasher or get_hasher()
     key_encoded = str(key).encode('utf-8')
     hash_set = set(puzzle_hashes)
     matched = 0
     hash_to_word = {}
     
-    for word in wordlist:
-        h = hashlib.md5(key_encoded + word.encode('utf-8')).hexdigest()
+    word_hashes = hasher.many(key_encoded, [word.encode('utf-8') for word in wordlist])
+    for word, h in zip(wordlist, word_hashes):
         if h in hash_set:
             hash_to_word[h] = word
             matched += 1
@@ -134,13 +91,12 @@ def verify_key(key, puzzle_hashes, wordlist=None):
     
     return None
 
-def distribute_work(key_length, num_processes, start_key=None, end_key=None):
+def distribute_work(keyspace, num_processes, start_key=None, end_key=None):
     """Create strided work distribution for better load balancing"""
-    max_key = 10 ** key_length
     if start_key is None:
         start_key = 0
     if end_key is None:
-        end_key = max_key
+        end_key = len(keyspace)
     
     # Use a strided approach to distribute keys among processes
     stride = num_processes
@@ -150,19 +106,21 @@ def distribute_work(key_length, num_processes, start_key=None, end_key=None):
     return ranges
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python optimized_crack_puzzle_final.py PUZZLE.txt key_length [start_key] [end_key]")
+    custom_charsets, argv = parse_charset_options(sys.argv[1:])
+    construction_spec, argv = pop_construction_option(argv)
+    if len(argv) < 2:
+        print("Usage: python optimized_crack_puzzle_final.py PUZZLE.txt key_length|mask [start_key] [end_key] [-1 charset ...] [--construction=SPEC]")
         sys.exit(1)
     
-    puzzle_file = sys.argv[1]
-    key_length = int(sys.argv[2])
+    puzzle_file = argv[0]
+    key_length = argv[1]
     
     start_key = None
     end_key = None
-    if len(sys.argv) >= 4:
-        start_key = int(sys.argv[3])
-    if len(sys.argv) >= 5:
-        end_key = int(sys.argv[4])
+    if len(argv) >= 3:
+        start_key = int(argv[2])
+    if len(argv) >= 4:
+        end_key = int(argv[3])
     
     # Load puzzle hashes and find duplicates
     puzzle_hashes = load_hashes(puzzle_file)
@@ -180,84 +138,116 @@ def main():
     # Pre-encode text words for better performance
     text_words_encoded = [(word, word.encode('utf-8')) for word in TEXT_WORDS]
     
-    # Prepare key format
-    key_format = '{:0' + str(key_length) + 'd}'
+    # Prepare the key space: a decimal key length or a hashcat-style mask
+    keyspace = KeySpace.from_spec(key_length, custom_charsets)
     
     # Set up multiprocessing
-    num_processes = min(cpu_count(), 8)
-    ranges = distribute_work(key_length, num_processes, start_key, end_key)
+    plan = plan_workers()
+    num_processes = plan.count
+    print(plan.describe())
+    ranges = distribute_work(keyspace, num_processes, start_key, end_key)
     
     print(f"Starting search with {num_processes} processes")
     if start_key is not None and end_key is not None:
         print(f"Searching keys from {start_key} to {end_key}")
-        print(f"This is {(end_key - start_key) / 10**key_length * 100:.6f}% of the key space")
+        print(f"This is {(end_key - start_key) / len(keyspace) * 100:.6f}% of the key space")
+    
+    # The sweep (shared with puzzle_solver.py) evaluates every candidate
+    # construction per key; ones whose digest length never occurs in the
+    # puzzle are skipped
+    constructions = applicable_constructions(parse_constructions(construction_spec), puzzle_hashes)
+    if not constructions:
+        print("No construction produces digests of the length found in the puzzle")
+        sys.exit(1)
+    print(f"Trying {len(constructions)} construction(s): {', '.join(c.name for c in constructions)}")
     
     start_time = time.time()
     
     # Prepare arguments for each worker process
     tasks = [
-        (r[0], r[1], r[2], key_format, duplicate_hashes, hash_set, FREQUENT_WORDS, text_words_encoded) 
+        (r[0], r[1], r[2], keyspace, duplicate_hashes, hash_set, FREQUENT_WORDS, text_words_encoded, constructions)
         for r in ranges
     ]
     
+    # Verification and the follow-up (results file + misspelling search) run
+    # in their own stages so the result loop keeps draining the workers
+    wordlist = load_verification_wordlist()
+    
+    def save_and_search(confirmed):
+        (key, hash_to_word), construction = confirmed
+        print(f"\n*** FOUND KEY: {key} ***")
+        print(f"Construction: {construction.name}")
+        
+        # Save the results to file
+        decoded = []
+        unmatched = []
+        for h in puzzle_hashes:
+            if h in hash_to_word:
+                decoded.append(hash_to_word[h])
+            else:
+                decoded.append("[MISSING]")
+                unmatched.append(h)
+        
+        with open(f'found_key_{key}.txt', 'w') as f:
+            f.write(f"Key: {key}\n")
+            f.write(f"Construction: {construction.name}\n")
+            f.write(f"Matched {len(hash_to_word)} out of {len(puzzle_hashes)} hashes\n")
+            f.write("\nDecoded message:\n")
+            f.write(" ".join(decoded))
+            f.write("\n\nUnmatched hashes:\n")
+            for h in unmatched:
+                f.write(h + "\n")
+        
+        print(f"Results saved to found_key_{key}.txt")
+        elapsed_time = time.time() - start_time
+        print(f"Key found in {elapsed_time:.1f} seconds")
+        
+        # Now find the misspelled word
+        print("\nLooking for the misspelled word...")
+        return find_misspellings(key, unmatched, " ".join(decoded), hasher=construction)
+    
+    def verify_candidate(candidate):
+        key, construction = candidate
+        verified = verify_key(key, puzzle_hashes, wordlist, hasher=construction)
+        return verified and (verified, construction)
+    
+    pipeline = VerificationPipeline(verify_candidate, save_and_search)
+    
     # Start worker processes
-    with Pool(num_processes) as pool:
-        promising_results = []
-        for result in pool.imap_unordered(test_key_range, tasks):
+    promising_results = []
+    with pipeline, plan.make_pool() as pool:
+        results = pool.imap_unordered(test_key_range, tasks)
+        while not pipeline.found():
+            # Poll with a timeout so a verified key stops the sweep promptly
+            try:
+                result = results.next(timeout=0.5)
+            except TimeoutError:
+                continue
+            except StopIteration:
+                break
             if result:
-                key_num, key, matches, matched_hashes = result
-                print(f"\nFound promising key: {key}")
+                key_num, key, matches, matched_hashes, construction = result
+                print(f"\nFound promising key: {key} ({construction.name})")
                 print(f"Matched {len(matched_hashes)} hashes with text words")
                 promising_results.append((key_num, key, matches))
-                
-                # Immediately verify if this key is correct
-                verified = verify_key(key, puzzle_hashes)
-                if verified:
-                    key, hash_to_word = verified
-                    print(f"\n*** FOUND KEY: {key} ***")
-                    
-                    # Save the results to file
-                    with open(f'found_key_{key}.txt', 'w') as f:
-                        f.write(f"Key: {key}\n")
-                        f.write(f"Matched {len(hash_to_word)} out of {len(puzzle_hashes)} hashes\n")
-                        
-                        # Create a decoded message file
-                        decoded = []
-                        unmatched = []
-                        for h in puzzle_hashes:
-                            if h in hash_to_word:
-                                decoded.append(hash_to_word[h])
-                            else:
-                                decoded.append("[MISSING]")
-                                unmatched.append(h)
-                        
-                        f.write("\nDecoded message:\n")
-                        f.write(" ".join(decoded))
-                        
-                        f.write("\n\nUnmatched hashes:\n")
-                        for h in unmatched:
-                            f.write(h + "\n")
-                    
-                    print(f"Results saved to found_key_{key}.txt")
-                    elapsed_time = time.time() - start_time
-                    print(f"Key found in {elapsed_time:.1f} seconds")
-                    
-                    # Now find the misspelled word
-                    print("\nLooking for the misspelled word...")
-                    
-                    return
-                
-                print("Not the right key, continuing search...")
+                pipeline.submit((key, construction))
+        
+        if not pipeline.found():
+            # Candidates may still be queued once the sweep finishes
+            pipeline.drain()
+        
+        if pipeline.found():
+            pool.terminate()
+        
+        verified, _ = pipeline.close()
+    
+    if verified:
+        return
     
     elapsed_time = time.time() - start_time
     print(f"\nSearch completed in {elapsed_time:.1f} seconds")
     print(f"Found {len(promising_results)} promising results for further investigation")
-    
-    # If we didn't find the key, we can try the most promising results with more verification
-    if promising_results:
-        print("\nTrying promising keys with more verification:")
-        for key_num, key, matches in promising_results:
-            verify_key(key, puzzle_hashes)
+    print("No promising key passed verification")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
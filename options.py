@@ -0,0 +1,23 @@
+"""
+Command-line option helpers shared by the crackers.
+
+The scripts take positional arguments plus a few --name=value options and
+bare --flags anywhere on the line; these pull them out and return the
+remaining arguments in order.
+"""
+
+def pop_option(args, name, default=None):
+    """Pull --name=value out of args; the last one given wins"""
+    value = default
+    rest = []
+    for arg in args:
+        if arg.startswith(f'--{name}='):
+            value = arg.split('=', 1)[1]
+        else:
+            rest.append(arg)
+    return value, rest
+
+def pop_flag(args, name):
+    """Pull a bare --name out of args; True if it was there"""
+    rest = [arg for arg in args if arg != f'--{name}']
+    return len(rest) != len(args), rest
@@ -0,0 +1,81 @@
+"""
+Verification pipeline for the key crackers.
+
+The sweep hands promising keys to a VerificationPipeline instead of verifying
+them inline, so the parent keeps draining pool.imap_unordered while
+candidates are confirmed and searched for misspellings in their own stages:
+
+    sweep (Pool) -> verify stage (executor) -> followup stage (executor)
+
+Submissions block once max_pending candidates are waiting, which bounds
+memory if the prefilter lets through a burst of false positives.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class VerificationPipeline:
+    """Run verify_fn (and optionally followup_fn) off the sweep's result loop"""
+
+    def __init__(self, verify_fn, followup_fn=None, max_pending=16):
+        self.verify_fn = verify_fn
+        self.followup_fn = followup_fn
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._verify_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='verify')
+        self._followup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='followup')
+        self._found = threading.Event()
+        self._lock = threading.Lock()
+        self.verified = None
+        self.followup = None
+
+    def submit(self, key):
+        """Queue a candidate key for verification (blocks while the queue is full)"""
+        if self._found.is_set():
+            return False
+        self._slots.acquire()
+        future = self._verify_pool.submit(self._verify, key)
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _verify(self, key):
+        if self._found.is_set():
+            return None
+        verified = self.verify_fn(key)
+        if verified:
+            with self._lock:
+                if self.verified is not None:
+                    return None
+                self.verified = verified
+            self._found.set()
+            if self.followup_fn is not None:
+                self.followup = self._followup_pool.submit(self.followup_fn, verified)
+        return verified
+
+    def found(self):
+        """True once some candidate has been verified"""
+        return self._found.is_set()
+
+    def wait(self, timeout=None):
+        """Block until a candidate is verified; returns found()"""
+        return self._found.wait(timeout)
+
+    def drain(self):
+        """Wait for every queued candidate to be verified"""
+        self._verify_pool.shutdown(wait=True)
+        return self.verified
+
+    def close(self):
+        """Finish outstanding work and return (verified, followup_result)"""
+        self._verify_pool.shutdown(wait=True)
+        self._followup_pool.shutdown(wait=True)
+        followup_result = self.followup.result() if self.followup is not None else None
+        return self.verified, followup_result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._found.set()  # stop verifying queued candidates on error paths
+        self._verify_pool.shutdown(wait=True)
+        self._followup_pool.shutdown(wait=True)
+        return False
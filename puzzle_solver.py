@@ -8,19 +8,33 @@ This script combines:
 
 Usage:
 python puzzle_solver.py crack PUZZLE.txt 9 [start_key] [end_key]
-python puzzle_solver.py verify PUZZLE.txt key 
+python puzzle_solver.py crack PUZZLE.txt '?l?l?d?d' [start_key] [end_key]
+python puzzle_solver.py crack PUZZLE.txt '?1?d?d?d' -1 abc [start_key] [end_key]
+python puzzle_solver.py crack PUZZLE.txt 9 --construction=md5,sha1:suffix,sha256:prefix:-
+python puzzle_solver.py crack PUZZLE.txt 9 --stats [--profile=cprofile|sample] [--profile-dir=DIR]
+python puzzle_solver.py verify PUZZLE.txt key [wordlist.txt] [--construction=SPEC]
 python puzzle_solver.py find PUZZLE.txt key decoded.txt [unmatched.txt]
 """
 
-import hashlib
 import sys
 import os
 import time
 import itertools
 import string
-from multiprocessing import Pool, cpu_count
+from multiprocessing import TimeoutError
 from collections import Counter
 
+from candidates import NGramModel, fill_decoded, normalize, resolve_missing
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from hash_backends import get_hasher
+from instrumentation import (
+    new_stage_stats, pop_instrumentation_options, print_stage_summary, run_profiled,
+)
+from keyspace import KeySpace, parse_charset_options
+from pipeline import VerificationPipeline
+from typos import likely_typos, unlikely_typos
+from workers import Supervisor, plan_workers, report_progress
+
 # ======= Configuration =======
 # Words likely to appear in the text - modify based on your knowledge of the text
 TEXT_WORDS = [
@@ -66,13 +80,13 @@ def load_text(text_file):
         return f.read().strip()
 
 # ======= Key Cracking Functions =======
-def verify_key_fast(key, hash_set, frequent_words):
+def verify_key_fast(key, hash_set, frequent_words, hasher=None):
     """Quick check if a key matches several frequent words"""
+    hasher = hasher or get_hasher()
     key_encoded = str(key).encode('utf-8')
     matches = 0
     
-    for word in frequent_words:
-        h = hashlib.md5(key_encoded + word.encode('utf-8')).hexdigest()
+    for h in hasher.many(key_encoded, [word.encode('utf-8') for word in frequent_words]):
         if h in hash_set:
             matches += 1
             if matches >= 3:  # We found multiple matches, promising key
@@ -80,66 +94,127 @@ def verify_key_fast(key, hash_set, frequent_words):
     
     return False
 
-def test_key_range(args):
-    """Test a range of keys using stride for better distribution"""
-    start_key, end_key, stride, key_format, duplicate_hashes, hash_set, frequent_words, text_words_encoded = args
-    frequent_words_encoded = [(word, word.encode('utf-8')) for word in frequent_words]
+def test_key_range(args, stats=None, quiet=False):
+    """Test a range of keys using stride for better distribution
+
+    Given a stats dict (instrumentation.new_stage_stats) the stages after
+    the 'the' prefilter are counted and timed as well. Only keys that pass
+    the prefilter reach them, so the per-key loop is the same either way.
+    quiet drops the periodic status line, for callers sweeping many short
+    ranges.
+    """
+    start_key, end_key, stride, keyspace, duplicate_hashes, hash_set, frequent_words, text_words_encoded, constructions = args
+    frequent_words_bytes = [word.encode('utf-8') for word in frequent_words]
+    text_words_bytes = [word_encoded for _, word_encoded in text_words_encoded]
     duplicate_set = {h for h, _ in duplicate_hashes}
-    
-    for key_num in range(start_key, end_key, stride):
-        key = key_format.format(key_num)
-        key_encoded = key.encode('utf-8')
-        
-        # Ultra-quick check: just check the most frequent word
-        h = hashlib.md5(key_encoded + b'the').hexdigest()
-        if h in hash_set:
+    # Every construction is probed against the same key buffer and hash set
+    probes = [(construction, construction.one) for construction in constructions]
+    clock = time.perf_counter
+    started = clock()
+    
+    # The key buffer is stepped in place, so nothing is allocated per key
+    keys = keyspace.iter_range(start_key, end_key, stride)
+    for key_num, key_encoded in zip(range(start_key, end_key, stride), keys):
+        for construction, one in probes:
+            # Ultra-quick check: just check the most frequent word
+            h = one(key_encoded, b'the')
+            if h not in hash_set:
+                continue
+            if stats is not None:
+                stats['prefilter_pass'] += 1
+                stats['duplicates_in'] += 1
+                t0 = clock()
             # Quick check with duplicated hashes
             matched_duplicates = 0
-            for word, word_encoded in frequent_words_encoded:
-                h = hashlib.md5(key_encoded + word_encoded).hexdigest()
+            for h in construction.many(key_encoded, frequent_words_bytes):
                 if h in duplicate_set:
                     matched_duplicates += 1
                     if matched_duplicates >= 2:  # Found multiple matches with duplicates
-                        # This key is worth investigating further
-                        if verify_key_fast(key, hash_set, frequent_words):
-                            # Found a promising key, investigate more
-                            matches = []
-                            matched_hashes = set()
-                            for word, word_encoded in text_words_encoded:
-                                h = hashlib.md5(key_encoded + word_encoded).hexdigest()
-                                if h in hash_set:
-                                    matches.append((h, word))
-                                    matched_hashes.add(h)
-                            
-                            return (key_num, key, matches, matched_hashes)
+                        break
+            if stats is not None:
+                stats['duplicates_time'] += clock() - t0
+            if matched_duplicates < 2:
+                continue
+            
+            # This key is worth investigating further
+            key = key_encoded.decode('ascii')
+            if stats is not None:
+                stats['duplicates_pass'] += 1
+                stats['frequent_in'] += 1
+                t0 = clock()
+            promising = verify_key_fast(key, hash_set, frequent_words, construction)
+            if stats is not None:
+                stats['frequent_time'] += clock() - t0
+            if not promising:
+                continue
+            
+            # Found a promising key, investigate more
+            if stats is not None:
+                stats['frequent_pass'] += 1
+                stats['text_words_in'] += 1
+                t0 = clock()
+            matches = []
+            matched_hashes = set()
+            text_hashes = construction.many(key_encoded, text_words_bytes)
+            for (word, _), h in zip(text_words_encoded, text_hashes):
+                if h in hash_set:
+                    matches.append((h, word))
+                    matched_hashes.add(h)
+            if stats is not None:
+                stats['text_words_time'] += clock() - t0
+                stats['text_words_pass'] += 1
+                swept = (key_num - start_key) // stride
+                _finish_stage_stats(stats, started, swept + 1,
+                                    swept * len(probes) + constructions.index(construction) + 1)
+            return (key_num, key, matches, matched_hashes, construction)
             
         # Periodic status update with very low frequency
-        if key_num % (stride * 1000000) == start_key:
+        if not quiet and (key_num - start_key) % (stride * 1000000) == 0:
             print(f"Process {start_key % stride} checked up to {key_num}")
-            
+            report_progress(key_num)
+    
+    if stats is not None:
+        swept = len(range(start_key, end_key, stride))
+        _finish_stage_stats(stats, started, swept, swept * len(probes))
     return None
 
-def verify_key(key, puzzle_hashes, wordlist=None, save_to_file=True):
+def _finish_stage_stats(stats, started, keys, probes):
+    """Fill in the per-key counters, which the sweep loop derives instead of counting"""
+    stats['keys'] = keys
+    stats['prefilter_in'] = probes
+    stats['elapsed'] = time.perf_counter() - started
+    # Whatever was not spent in the later stages went to the prefilter loop
+    stats['prefilter_time'] = stats['elapsed'] - (
+        stats['duplicates_time'] + stats['frequent_time'] + stats['text_words_time'])
+
+def test_key_range_instrumented(args, quiet=False):
+    """test_key_range with per-stage counters and timers; returns (result, stats)"""
+    start_key, stride = args[0], args[2]
+    stats = new_stage_stats(start_key % stride if stride > 1 else start_key)
+    return test_key_range(args, stats, quiet), stats
+
+def load_verification_wordlist():
+    """Load the first available verification wordlist (once per run)"""
+    for filename in ['common_words.txt', '20k.txt', 'words.txt', 'combined_wordlist.txt']:
+        if os.path.exists(filename):
+            print(f"Using wordlist: {filename}")
+            return load_words(filename)
+    print("No wordlist found, using built-in word list")
+    return TEXT_WORDS
+
+def verify_key(key, puzzle_hashes, wordlist=None, save_to_file=True, hasher=None):
     """Verify if a key is correct by testing it with a larger wordlist"""
     if wordlist is None:
-        # Try to use a good wordlist for verification
-        for filename in ['common_words.txt', '20k.txt', 'words.txt', 'combined_wordlist.txt']:
-            if os.path.exists(filename):
-                print(f"Using wordlist: {filename}")
-                with open(filename, 'r') as f:
-                    wordlist = [line.strip().lower() for line in f if line.strip()]
-                break
-        else:
-            print("No wordlist found, using built-in word list")
-            wordlist = TEXT_WORDS
+        wordlist = load_verification_wordlist()
     
+    hasher = hasher or get_hasher()
     key_encoded = str(key).encode('utf-8')
     hash_set = set(puzzle_hashes)
     matched = 0
     hash_to_word = {}
     
-    for word in wordlist:
-        h = hashlib.md5(key_encoded + word.encode('utf-8')).hexdigest()
+    word_hashes = hasher.many(key_encoded, [word.encode('utf-8') for word in wordlist])
+    for word, h in zip(wordlist, word_hashes):
         if h in hash_set:
             hash_to_word[h] = word
             matched += 1
@@ -179,13 +254,25 @@ def verify_key(key, puzzle_hashes, wordlist=None, save_to_file=True):
     
     return None
 
-def distribute_work(key_length, num_processes, start_key=None, end_key=None):
+def resume_key_range(task, key_num):
+    """The rest of a test_key_range task whose worker last reported key_num"""
+    if len(task) == 4:
+        # Wrapped for run_profiled: (mode, profile_dir, func, task)
+        return task[:3] + (resume_key_range(task[3], key_num),)
+    start_key, end_key, stride = task[:3]
+    return (key_num + stride, end_key, stride) + task[3:]
+
+def swept_until(task, result):
+    """First key a test_key_range task left unswept: past the promising key it stopped at, or its end"""
+    start_key, end_key, stride = task[:3]
+    return result[0] + stride if result else end_key
+
+def distribute_work(keyspace, num_processes, start_key=None, end_key=None):
     """Create work distribution for better load balancing"""
-    max_key = 10 ** key_length
     if start_key is None:
         start_key = 0
     if end_key is None:
-        end_key = max_key
+        end_key = len(keyspace)
     
     stride = num_processes
     ranges = []
@@ -193,8 +280,10 @@ def distribute_work(key_length, num_processes, start_key=None, end_key=None):
         ranges.append((start_key + i, end_key, stride))
     return ranges
 
-def crack_key(puzzle_file, key_length, start_key=None, end_key=None):
-    """Main function to crack the key"""
+def crack_key(puzzle_file, key_length, start_key=None, end_key=None, custom_charsets=None, constructions=None,
+              instrumentation=None):
+    """Main function to crack the key (key_length may also be a hashcat-style mask)"""
+    instrumentation = instrumentation or {}
     puzzle_hashes = load_hashes(puzzle_file)
     hash_set = set(puzzle_hashes)
     duplicate_hashes = find_duplicate_hashes(puzzle_hashes)
@@ -210,61 +299,110 @@ def crack_key(puzzle_file, key_length, start_key=None, end_key=None):
     # Pre-encode text words for better performance
     text_words_encoded = [(word, word.encode('utf-8')) for word in TEXT_WORDS]
     
-    # Prepare key format
-    key_format = '{:0' + str(key_length) + 'd}'
+    # Prepare the key space: a decimal key length or a hashcat-style mask
+    keyspace = KeySpace.from_spec(key_length, custom_charsets)
     
     # Set up multiprocessing
-    num_processes = min(cpu_count(), 8)
-    ranges = distribute_work(key_length, num_processes, start_key, end_key)
+    plan = plan_workers()
+    num_processes = plan.count
+    print(plan.describe())
+    ranges = distribute_work(keyspace, num_processes, start_key, end_key)
     
     print(f"Starting search with {num_processes} processes")
     if start_key is not None and end_key is not None:
         print(f"Searching keys from {start_key} to {end_key}")
-        print(f"This is {(end_key - start_key) / 10**key_length * 100:.6f}% of the key space")
+        print(f"This is {(end_key - start_key) / len(keyspace) * 100:.6f}% of the key space")
+    
+    # Every candidate construction is evaluated per key in the same sweep;
+    # ones whose digest length never occurs in the puzzle are skipped
+    if constructions is None:
+        constructions = parse_constructions()
+    constructions = applicable_constructions(constructions, puzzle_hashes)
+    if not constructions:
+        print("No construction produces digests of the length found in the puzzle")
+        return None
+    print(f"Trying {len(constructions)} construction(s): {', '.join(c.name for c in constructions)}")
     
     start_time = time.time()
     
     # Prepare arguments for each worker process
     tasks = [
-        (r[0], r[1], r[2], key_format, duplicate_hashes, hash_set, FREQUENT_WORDS, text_words_encoded) 
+        (r[0], r[1], r[2], keyspace, duplicate_hashes, hash_set, FREQUENT_WORDS, text_words_encoded, constructions)
         for r in ranges
     ]
     
+    # --stats runs the same sweep with a stats dict to fill in, and --profile
+    # wraps whichever worker runs in a profiler
+    worker = test_key_range_instrumented if instrumentation.get('stats') else test_key_range
+    if instrumentation.get('profile'):
+        tasks = [(instrumentation['profile'], instrumentation['profile_dir'], worker, task) for task in tasks]
+        worker = run_profiled
+        print(f"Profiling workers with {instrumentation['profile']} into {instrumentation['profile_dir']}/")
+    stats_list = []
+    
+    # Verification and misspelling search run as their own pipeline stages so
+    # the result loop below never stalls while a candidate is being confirmed
+    wordlist = load_verification_wordlist()
+    
+    def verify_candidate(candidate):
+        key, construction = candidate
+        verified = verify_key(key, puzzle_hashes, wordlist, hasher=construction)
+        return verified and (verified, construction)
+    
+    def search_misspellings(confirmed):
+        (key, hash_to_word, decoded_text, unmatched), construction = confirmed
+        print(f"\n*** FOUND KEY: {key} ***")
+        print(f"Construction: {construction.name}")
+        print(f"Key found in {time.time() - start_time:.1f} seconds")
+        print("\nLooking for misspelled words...")
+        return find_misspellings(key, unmatched, decoded_text, hasher=construction)
+    
+    pipeline = VerificationPipeline(verify_candidate, search_misspellings)
+    
     # Start worker processes
-    with Pool(num_processes) as pool:
-        promising_results = []
-        for result in pool.imap_unordered(test_key_range, tasks):
+    promising_results = []
+    # A worker that dies mid-range is replaced and the rest of its range
+    # requeued from the last key it reported
+    with pipeline, Supervisor(plan) as pool:
+        results = pool.imap_unordered(worker, tasks, resume=resume_key_range)
+        while not pipeline.found():
+            # Poll with a timeout so a verified key stops the sweep promptly
+            try:
+                result = results.next(timeout=0.5)
+            except TimeoutError:
+                continue
+            except StopIteration:
+                break
+            if instrumentation.get('stats'):
+                result, stats = result
+                stats_list.append(stats)
             if result:
-                key_num, key, matches, matched_hashes = result
-                print(f"\nFound promising key: {key}")
+                key_num, key, matches, matched_hashes, construction = result
+                print(f"\nFound promising key: {key} ({construction.name})")
                 print(f"Matched {len(matched_hashes)} hashes with text words")
                 promising_results.append((key_num, key, matches))
-                
-                # Immediately verify if this key is correct
-                verified = verify_key(key, puzzle_hashes)
-                if verified:
-                    key, hash_to_word, decoded_text, unmatched = verified
-                    print(f"\n*** FOUND KEY: {key} ***")
-                    elapsed_time = time.time() - start_time
-                    print(f"Key found in {elapsed_time:.1f} seconds")
-                    
-                    # Find misspellings
-                    print("\nLooking for misspelled words...")
-                    find_misspellings(key, unmatched, decoded_text)
-                    
-                    return key, hash_to_word, decoded_text, unmatched
-                
-                print("Not the right key, continuing search...")
+                pipeline.submit((key, construction))
+        
+        if not pipeline.found():
+            # Candidates may still be queued once the sweep finishes
+            pipeline.drain()
+        
+        if pipeline.found():
+            pool.terminate()
+        
+        confirmed, _ = pipeline.close()
+    
+    if instrumentation.get('stats'):
+        # Workers cut short by a verified key never report their counters
+        print_stage_summary(stats_list, promising=len(promising_results), verified=1 if confirmed else 0)
+    
+    if confirmed:
+        return confirmed[0]
     
     elapsed_time = time.time() - start_time
     print(f"\nSearch completed in {elapsed_time:.1f} seconds")
     print(f"Found {len(promising_results)} promising results for further investigation")
-    
-    # If we didn't find the key, try the most promising results again
-    for key_num, key, matches in promising_results:
-        verified = verify_key(key, puzzle_hashes)
-        if verified:
-            return verified
+    print("No promising key passed verification")
     
     return None
 
@@ -308,14 +446,41 @@ def generate_hamming_variants(word, max_distance=2):
     
     return variants
 
-def find_misspellings(key, unmatched_hashes, decoded_text):
+def typo_variants_pass(word, likely):
+    """The likely typos of word, or the rest of its Hamming variants, best-first either way"""
+    return likely_typos(word) if likely else unlikely_typos(word)
+
+def load_misspelling_wordlists():
+    """Load the reference wordlists checked for misspelled variants"""
+    wordlists = []
+    for filename in ['common_words.txt', '20k.txt']:
+        if os.path.exists(filename):
+            wordlists.append((filename, load_words(filename)[:5000]))  # Limit to first 5000 words
+    return wordlists
+
+def find_misspellings(key, unmatched_hashes, decoded_text, wordlists=None, save_to_file=True, hasher=None):
     """Find misspelled words by checking Hamming distance 2 variants"""
+    hasher = hasher or get_hasher()
     key_encoded = str(key).encode('utf-8')
     words = decoded_text.split()
     hash_set = set(unmatched_hashes)
     
-    # Count word frequencies to prioritize checking
-    word_counts = Counter([w for w in words if w != "[MISSING]"])
+    # Context-ranked pass first: fills [MISSING] slots with the words their
+    # neighbours make likely and tries misspellings of those before anything
+    # else. The frequency-ordered sweeps below then check the hashes it left.
+    print("Ranking candidates for missing words by context...")
+    model = NGramModel.build(decoded_text)
+    resolved, ranked_misspellings, _ = resolve_missing(key, unmatched_hashes, decoded_text, hasher=hasher,
+                                                        model=model, variants=unlikely_typos)
+    if resolved:
+        print("\nDecoded message with resolved words:")
+        print(fill_decoded(decoded_text, resolved))
+    hash_set -= {h for _, _, h in resolved.values()}
+    
+    # Count word frequencies to prioritize checking, including the words the
+    # ranked pass resolved (verify_key leaves capitalised ones unmatched)
+    filled = fill_decoded(decoded_text, resolved).split()
+    word_counts = Counter(normalize(w) for w in filled if w != "[MISSING]" and normalize(w))
     common_words = [w for w, _ in word_counts.most_common(50)]  # Top 50 words
     print(f"Checking {len(common_words)} most common words for misspellings")
     
@@ -323,42 +488,56 @@ def find_misspellings(key, unmatched_hashes, decoded_text):
     missing_indices = [i for i, w in enumerate(words) if w == "[MISSING]"]
     print(f"Found {len(missing_indices)} missing words in decoded text")
     
-    # Try to match each common word with a variant
-    found_misspellings = []
-    for word in common_words:
-        if len(word) < 3:  # Skip very short words
-            continue
-            
-        variants = generate_hamming_variants(word)
-        for variant in variants:
-            h = hashlib.md5(key_encoded + variant.encode('utf-8')).hexdigest()
-            if h in hash_set:
-                print(f"FOUND MISSPELLING! '{word}' -> '{variant}'")
-                print(f"Hash: {h}")
-                found_misspellings.append((word, variant, h))
-    
-    # Try with additional word lists
-    for filename in ['common_words.txt', '20k.txt']:
-        if os.path.exists(filename):
+    if wordlists is None:
+        wordlists = load_misspelling_wordlists()
+    
+    def check_variants(word, variants):
+        variants = list(variants)
+        variant_hashes = hasher.many(key_encoded, [v.encode('utf-8') for v in variants])
+        for variant, h in zip(variants, variant_hashes):
+            if h not in hash_set:
+                continue
+            hash_set.discard(h)
+            # A variant the reference corpora know is a word of the text, not a typo
+            if model.known(normalize(variant)):
+                continue
+            print(f"FOUND MISSPELLING! '{word}' -> '{variant}'")
+            print(f"Hash: {h}")
+            found_misspellings.append((word, variant, h))
+    
+    # Two passes over the same words: first only each word's likely typos
+    # (best-first by the typo model), then, while hashes are still
+    # unaccounted for, the rest of its Hamming variants
+    found_misspellings = list(ranked_misspellings)
+    for likely in (True, False):
+        if not likely:
+            if not hash_set:
+                break
+            print(f"\n{len(hash_set)} hashes still unmatched; checking the remaining variants...")
+        
+        # Try to match each common word with a variant
+        for word in common_words:
+            if len(word) < 3:  # Skip very short words
+                continue
+            check_variants(word, typo_variants_pass(word, likely))
+        
+        # Try with additional word lists
+        for filename, wordlist in wordlists:
             print(f"\nChecking misspellings against {filename}...")
             try:
-                wordlist = load_words(filename)[:5000]  # Limit to first 5000 words
                 for word in wordlist:
                     if word in common_words or len(word) < 3:
                         continue
-                        
-                    variants = generate_hamming_variants(word)
-                    for variant in variants:
-                        h = hashlib.md5(key_encoded + variant.encode('utf-8')).hexdigest()
-                        if h in hash_set:
-                            print(f"FOUND MISSPELLING! '{word}' -> '{variant}'")
-                            print(f"Hash: {h}")
-                            found_misspellings.append((word, variant, h))
+                    check_variants(word, typo_variants_pass(word, likely))
             except Exception as e:
                 print(f"Error processing {filename}: {e}")
     
-    # Save results
-    if found_misspellings:
+    save_misspellings(key, found_misspellings, save_to_file)
+    return found_misspellings
+
+def save_misspellings(key, found_misspellings, save_to_file=True):
+    """Report found misspellings and save them to misspellings_<key>.txt"""
+    if found_misspellings and save_to_file:
         with open(f'misspellings_{key}.txt', 'w') as f:
             f.write(f"Key: {key}\n\n")
             f.write("Found misspellings:\n")
@@ -366,24 +545,28 @@ def find_misspellings(key, unmatched_hashes, decoded_text):
                 f.write(f"Correct: '{word}' -> Misspelled: '{variant}' (Hash: {h})\n")
         print(f"\nFound {len(found_misspellings)} potential misspellings")
         print(f"Results saved to misspellings_{key}.txt")
+    elif found_misspellings:
+        print(f"\nFound {len(found_misspellings)} potential misspellings")
     else:
         print("\nNo misspellings found!")
-    
-    return found_misspellings
 
 # ======= Main Functions =======
 def cmd_crack(args):
     """Command to crack a puzzle key"""
     if len(args) < 2:
-        print("Usage: python puzzle_solver.py crack PUZZLE.txt key_length [start_key] [end_key]")
+        print("Usage: python puzzle_solver.py crack PUZZLE.txt key_length|mask [start_key] [end_key] [-1 charset ...] [--construction=SPEC] [--stats] [--profile=cprofile|sample]")
         return
     
+    custom_charsets, args = parse_charset_options(args)
+    construction_spec, args = pop_construction_option(args)
+    instrumentation, args = pop_instrumentation_options(args)
     puzzle_file = args[0]
-    key_length = int(args[1])
+    key_length = args[1]
     start_key = int(args[2]) if len(args) > 2 else None
     end_key = int(args[3]) if len(args) > 3 else None
     
-    result = crack_key(puzzle_file, key_length, start_key, end_key)
+    result = crack_key(puzzle_file, key_length, start_key, end_key, custom_charsets,
+                       parse_constructions(construction_spec), instrumentation)
     if result:
         key, hash_to_word, decoded_text, unmatched = result
         print("\nCracking completed successfully!")
@@ -392,8 +575,9 @@ def cmd_crack(args):
 
 def cmd_verify(args):
     """Command to verify a known key"""
+    construction_spec, args = pop_construction_option(args)
     if len(args) < 2:
-        print("Usage: python puzzle_solver.py verify PUZZLE.txt key [wordlist.txt]")
+        print("Usage: python puzzle_solver.py verify PUZZLE.txt key [wordlist.txt] [--construction=SPEC]")
         return
     
     puzzle_file = args[0]
@@ -405,9 +589,16 @@ def cmd_verify(args):
     if wordlist_file:
         wordlist = load_words(wordlist_file)
     else:
-        wordlist = None
-    
-    result = verify_key(key, puzzle_hashes, wordlist)
+        wordlist = load_verification_wordlist()
+    
+    result = None
+    constructions = applicable_constructions(parse_constructions(construction_spec), puzzle_hashes)
+    for construction in constructions:
+        if len(constructions) > 1:
+            print(f"\nTrying {construction.name}")
+        result = verify_key(key, puzzle_hashes, wordlist, hasher=construction)
+        if result:
+            break
     if result:
         key, hash_to_word, decoded_text, unmatched = result
         print("\nVerification successful!")
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Local job scheduler for CMSC13600-HW6
+Queues crack, verify and find (misspelling) jobs in a SQLite file and runs
+them on one shared worker pool, so puzzles launched by different people on
+the same box stop fighting over cores.
+
+Crack jobs are cut into key blocks sized for about two seconds of work, and
+every free worker slot goes to the best job at that moment: highest
+priority first, then the owner who has used the least worker time, then the
+oldest job. A long sweep is therefore preempted at the next block boundary
+when a short high-priority job arrives, and resumes from its finished
+blocks after a restart. Verify and find jobs run whole, as one pool task.
+
+Usage:
+python scheduler.py run [--forever]
+python scheduler.py submit crack PUZZLE.txt 9|mask [start_key] [end_key] [-1 charset ...] [--construction=SPEC] [--priority=N] [--owner=NAME]
+python scheduler.py submit verify PUZZLE.txt key [--construction=SPEC] [--priority=N] [--owner=NAME]
+python scheduler.py submit find PUZZLE.txt key [decoded.txt] [--priority=N] [--owner=NAME]
+python scheduler.py status [job_id]
+python scheduler.py cancel job_id
+
+The queue lives in jobs.db (override with CRACK_SCHEDULER_DB).
+"""
+
+import getpass
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from multiprocessing import TimeoutError
+
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from crack_puzzle import ChunkSizer, covered_keys, merge_ranges, next_chunk
+from keyspace import KeySpace, parse_charset_options
+from options import pop_option
+from puzzle_solver import (
+    FREQUENT_WORDS, TEXT_WORDS, find_duplicate_hashes, find_misspellings, load_hashes,
+    load_text, load_verification_wordlist, swept_until, test_key_range, verify_key,
+)
+from workers import plan_workers
+
+DEFAULT_DB = os.environ.get('CRACK_SCHEDULER_DB', 'jobs.db')
+
+# Short jobs jump ahead of sweeps unless the submitter says otherwise
+DEFAULT_PRIORITY = {'crack': 0, 'find': 5, 'verify': 10}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    owner TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    done_ranges TEXT NOT NULL DEFAULT '[]',
+    keys_total INTEGER NOT NULL DEFAULT 0,
+    keys_done INTEGER NOT NULL DEFAULT 0,
+    worker_seconds REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+)
+"""
+
+def connect(db_path=DEFAULT_DB):
+    db = sqlite3.connect(db_path, timeout=30)
+    db.row_factory = sqlite3.Row
+    db.execute(SCHEMA)
+    return db
+
+def submit(db, kind, args, priority=None, owner=None):
+    """Queue a job and return its id"""
+    if kind not in DEFAULT_PRIORITY:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if priority is None:
+        priority = DEFAULT_PRIORITY[kind]
+    with db:
+        cur = db.execute(
+            "INSERT INTO jobs (kind, args, priority, owner, created) VALUES (?, ?, ?, ?, ?)",
+            (kind, json.dumps(args), priority, owner or getpass.getuser(), time.time()))
+    return cur.lastrowid
+
+def cancel(db, job_id):
+    with db:
+        db.execute("UPDATE jobs SET state = 'cancelled', finished = ? WHERE id = ? AND state IN ('queued', 'running')",
+                   (time.time(), job_id))
+
+# ======= Pool tasks =======
+# Loaded once per worker by the pool initializer
+_verification_wordlist = None
+
+def init_worker():
+    global _verification_wordlist
+    _verification_wordlist = load_verification_wordlist()
+
+def timed_block(args):
+    """test_key_range over one block, with the time it took"""
+    started = time.perf_counter()
+    result = test_key_range(args)
+    return result, time.perf_counter() - started
+
+def run_verify_job(args):
+    puzzle_file, key, construction_spec = args
+    puzzle_hashes = load_hashes(puzzle_file)
+    wordlist = _verification_wordlist or load_verification_wordlist()
+    for construction in applicable_constructions(parse_constructions(construction_spec), puzzle_hashes):
+        verified = verify_key(key, puzzle_hashes, wordlist, save_to_file=False, hasher=construction)
+        if verified:
+            _, hash_to_word, decoded_text, unmatched = verified
+            return {'key': key, 'verified': True, 'construction': construction.name,
+                    'matched': len(hash_to_word), 'decoded': decoded_text, 'unmatched': unmatched}
+    return {'key': key, 'verified': False}
+
+def run_find_job(args):
+    puzzle_file, key, decoded_file = args
+    verified = run_verify_job((puzzle_file, key, None))
+    if not verified['verified']:
+        return {'key': key, 'misspellings': []}
+    decoded_text = load_text(decoded_file) if decoded_file else verified['decoded']
+    found = find_misspellings(key, verified['unmatched'], decoded_text, save_to_file=False)
+    return {'key': key, 'misspellings': [{'word': w, 'variant': v, 'hash': h} for w, v, h in found]}
+
+def run_candidate_check(args):
+    key, puzzle_hashes, construction = args
+    verified = verify_key(key, puzzle_hashes, _verification_wordlist or load_verification_wordlist(),
+                          save_to_file=False, hasher=construction)
+    return verified and (verified, construction)
+
+# ======= Scheduler =======
+class CrackJob:
+    """In-memory state of a running crack job"""
+
+    def __init__(self, row, num_processes):
+        args = json.loads(row['args'])
+        self.puzzle_hashes = load_hashes(args['puzzle'])
+        self.hash_set = set(self.puzzle_hashes)
+        self.duplicate_hashes = find_duplicate_hashes(self.puzzle_hashes)
+        self.keyspace = KeySpace.from_spec(args['key_length'], args.get('charsets'))
+        self.start_key = int(args.get('start_key') or 0)
+        self.end_key = int(args.get('end_key') or len(self.keyspace))
+        self.constructions = applicable_constructions(parse_constructions(args.get('construction')),
+                                                      self.puzzle_hashes)
+        self.text_words_encoded = [(word, word.encode('utf-8')) for word in TEXT_WORDS]
+        self.done_ranges = merge_ranges(tuple(r) for r in json.loads(row['done_ranges']))
+        self.position = self.start_key
+        self.in_flight = set()
+        self.candidates = []
+        self.checked = []
+        self.sizer = ChunkSizer(num_processes)
+
+    def next_block(self):
+        """(start, end) of the next block nobody has swept or claimed, or None"""
+        claimed = merge_ranges(self.done_ranges + list(self.in_flight))
+        remaining = self.end_key - self.start_key - covered_keys(claimed, self.start_key, self.end_key)
+        if remaining <= 0:
+            return None
+        block = next_chunk(self.position, self.sizer.next_size(remaining), self.end_key, claimed)
+        if block is None:
+            return None
+        self.position = block[1]
+        self.in_flight.add(block)
+        return block
+
+    def task(self, block):
+        return (block[0], block[1], 1, self.keyspace, self.duplicate_hashes, self.hash_set,
+                FREQUENT_WORDS, self.text_words_encoded, self.constructions)
+
+class Scheduler:
+    """Hand each free worker slot to the best runnable job"""
+
+    def __init__(self, db):
+        self.db = db
+        plan = plan_workers()
+        print(plan.describe())
+        self.capacity = plan.count
+        self.pool = plan.make_pool(initializer=init_worker)
+        self.crack_jobs = {}
+        self.pending = []
+        self.served = Counter()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def runnable_jobs(self):
+        rows = self.db.execute(
+            "SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY created").fetchall()
+        busy = {job_id for job_id, kind, _, _ in self.pending if kind in ('verify', 'find')}
+        return [row for row in rows if row['id'] not in busy]
+
+    def pick(self, rows):
+        """Highest priority, then the owner with the least worker time, then oldest"""
+        return min(rows, key=lambda row: (-row['priority'], self.served[row['owner']], row['created']))
+
+    def dispatch(self):
+        """Fill free worker slots; returns False when nothing is left to run"""
+        rows = self.runnable_jobs()
+        while len(self.pending) < self.capacity and rows:
+            row = self.pick(rows)
+            if not self.dispatch_job(row):
+                rows.remove(row)
+        return bool(rows) or bool(self.pending)
+
+    def dispatch_job(self, row):
+        """Start the next unit of work for a job; False if it has none right now"""
+        job_id, kind = row['id'], row['kind']
+        args = json.loads(row['args'])
+        if row['state'] == 'queued':
+            # row was read once for the whole dispatch() pass, so it still
+            # says 'queued' for every later block of the job: only the first
+            # one moves the job to running
+            with self.db:
+                started = self.db.execute(
+                    "UPDATE jobs SET state = 'running', started = ? WHERE id = ? AND state = 'queued'",
+                    (time.time(), job_id)).rowcount
+            if started:
+                print(f"[scheduler] starting job {job_id} ({kind}, priority {row['priority']}, owner {row['owner']})")
+
+        if kind == 'verify':
+            task = (args['puzzle'], args['key'], args.get('construction'))
+            self.pending.append((job_id, kind, None, self.pool.apply_async(run_verify_job, (task,))))
+            return False
+        if kind == 'find':
+            task = (args['puzzle'], args['key'], args.get('decoded'))
+            self.pending.append((job_id, kind, None, self.pool.apply_async(run_find_job, (task,))))
+            return False
+
+        job = self.crack_jobs.get(job_id)
+        if job is None:
+            job = self.crack_jobs[job_id] = CrackJob(row, self.capacity)
+            with self.db:
+                self.db.execute("UPDATE jobs SET keys_total = ? WHERE id = ?",
+                                (job.end_key - job.start_key, job_id))
+        block = job.next_block()
+        if block is None:
+            if not job.in_flight and not job.candidates:
+                self.finish(job_id, {'key': None, 'candidates': job.checked})
+            return False
+        self.pending.append((job_id, 'block', block, self.pool.apply_async(timed_block, (job.task(block),))))
+        return True
+
+    def collect(self, timeout=0.2):
+        """Wait briefly for finished tasks and record their results"""
+        deadline = time.time() + timeout
+        while True:
+            done = [entry for entry in self.pending if entry[3].ready()]
+            if done or time.time() >= deadline:
+                break
+            time.sleep(0.01)
+        for entry in done:
+            self.pending.remove(entry)
+            job_id, kind, block, async_result = entry
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            try:
+                value = async_result.get(timeout=0)
+            except TimeoutError:
+                continue
+            except Exception as e:
+                self.fail(job_id, f"{type(e).__name__}: {e}")
+                continue
+            if row['state'] != 'running':
+                self.crack_jobs.pop(job_id, None)
+                continue
+            if kind in ('verify', 'find'):
+                self.finish(job_id, value)
+            elif kind == 'block':
+                self.block_done(row, block, value)
+            elif kind == 'candidate':
+                self.candidate_done(row, block, value)
+
+    def block_done(self, row, block, value):
+        job_id = row['id']
+        job = self.crack_jobs[job_id]
+        result, elapsed = value
+        job.in_flight.discard(block)
+        # The sweep stops at the first promising key; only what it covered
+        # is done, and the rest of the block goes back to be dispatched
+        stop = swept_until(job.task(block), result)
+        job.done_ranges = merge_ranges(job.done_ranges + [(block[0], stop)])
+        if stop < block[1]:
+            job.position = min(job.position, stop)
+        job.sizer.record(stop - block[0], elapsed)
+        self.served[row['owner']] += elapsed
+        with self.db:
+            self.db.execute(
+                "UPDATE jobs SET done_ranges = ?, keys_done = ?, worker_seconds = worker_seconds + ? WHERE id = ?",
+                (json.dumps(job.done_ranges), covered_keys(job.done_ranges, job.start_key, job.end_key),
+                 elapsed, job_id))
+        if result:
+            key, construction = result[1], result[4]
+            print(f"[scheduler] job {job_id}: promising key {key} ({construction.name})")
+            job.candidates.append(key)
+            task = (key, job.puzzle_hashes, construction)
+            self.pending.append((job_id, 'candidate', key, self.pool.apply_async(run_candidate_check, (task,))))
+
+    def candidate_done(self, row, key, value):
+        job_id = row['id']
+        job = self.crack_jobs[job_id]
+        job.candidates.remove(key)
+        job.checked.append(key)
+        if value:
+            (key, hash_to_word, decoded_text, unmatched), construction = value
+            self.finish(job_id, {'key': key, 'construction': construction.name, 'matched': len(hash_to_word),
+                                 'decoded': decoded_text, 'unmatched': unmatched, 'candidates': job.checked})
+
+    def finish(self, job_id, result):
+        with self.db:
+            self.db.execute("UPDATE jobs SET state = 'done', result = ?, finished = ? WHERE id = ?",
+                            (json.dumps(result), time.time(), job_id))
+        self.crack_jobs.pop(job_id, None)
+        print(f"[scheduler] job {job_id} done")
+
+    def fail(self, job_id, error):
+        with self.db:
+            self.db.execute("UPDATE jobs SET state = 'failed', error = ?, finished = ? WHERE id = ?",
+                            (error, time.time(), job_id))
+        self.crack_jobs.pop(job_id, None)
+        print(f"[scheduler] job {job_id} failed: {error}")
+
+    def run(self, forever=False):
+        """Schedule until the queue is empty (or forever)"""
+        while True:
+            active = self.dispatch()
+            if not active and not forever:
+                break
+            if self.pending:
+                self.collect()
+            else:
+                time.sleep(0.5)
+
+# ======= Main Functions =======
+def cmd_submit(db, args):
+    if len(args) < 3:
+        print(__doc__)
+        return
+    priority, args = pop_option(args, 'priority')
+    owner, args = pop_option(args, 'owner')
+    construction, args = pop_construction_option(args)
+    kind = args[0]
+    if kind == 'crack':
+        charsets, args = parse_charset_options(args)
+        job_args = {
+            'puzzle': os.path.abspath(args[1]), 'key_length': args[2], 'charsets': charsets,
+            'construction': construction,
+            'start_key': int(args[3]) if len(args) > 3 else None,
+            'end_key': int(args[4]) if len(args) > 4 else None,
+        }
+    elif kind == 'verify':
+        job_args = {'puzzle': os.path.abspath(args[1]), 'key': args[2], 'construction': construction}
+    elif kind == 'find':
+        job_args = {'puzzle': os.path.abspath(args[1]), 'key': args[2],
+                    'decoded': os.path.abspath(args[3]) if len(args) > 3 else None}
+    else:
+        print(f"Unknown job kind: {kind}")
+        return
+    job_id = submit(db, kind, job_args, int(priority) if priority is not None else None, owner)
+    print(f"Submitted job {job_id}")
+
+def cmd_status(db, args):
+    if args:
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (int(args[0]),)).fetchone()
+        if row is None:
+            print(f"No job {args[0]}")
+            return
+        for name in row.keys():
+            print(f"{name:>15}: {row[name]}")
+        return
+    rows = db.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+    print(f"{'id':>5} {'kind':<7} {'owner':<10} {'prio':>4} {'state':<10} {'progress':>9} {'cpu s':>8}  result")
+    for row in rows:
+        progress = f"{row['keys_done'] / row['keys_total']:.1%}" if row['keys_total'] else '-'
+        result = json.loads(row['result']) if row['result'] else {}
+        summary = row['error'] or ''
+        if 'key' in result and row['kind'] == 'crack':
+            summary = f"key {result['key']}" if result['key'] else 'no key'
+        elif 'verified' in result:
+            summary = 'verified' if result['verified'] else 'not verified'
+        elif 'misspellings' in result:
+            summary = ', '.join(m['variant'] for m in result['misspellings']) or 'none found'
+        print(f"{row['id']:>5} {row['kind']:<7} {row['owner']:<10} {row['priority']:>4} {row['state']:<10} "
+              f"{progress:>9} {row['worker_seconds']:>8.1f}  {summary}")
+
+def main():
+    """Main entry point"""
+    if len(sys.argv) < 2:
+        print("Usage: python scheduler.py [run|submit|status|cancel] [arguments...]")
+        return
+
+    command = sys.argv[1].lower()
+    args = sys.argv[2:]
+    db = connect()
+
+    if command == 'run':
+        scheduler = Scheduler(db)
+        try:
+            scheduler.run(forever='--forever' in args)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.close()
+    elif command == 'submit':
+        cmd_submit(db, args)
+    elif command == 'status':
+        cmd_status(db, args)
+    elif command == 'cancel' and args:
+        cancel(db, int(args[0]))
+        print(f"Cancelled job {args[0]}")
+    else:
+        print(f"Unknown command: {command}")
+        print(__doc__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Long-running solver daemon for CMSC13600-HW6
+Keeps wordlists, per-puzzle hash indexes and a warm worker pool resident and
+answers crack/verify/find requests over a local Unix socket, so repeated
+queries skip the startup cost of puzzle_solver.py.
+
+Protocol: one JSON object per line in each direction.
+  request:  {"cmd": "verify", "puzzle": "PUZZLE.txt", "key": "485066843"}
+  response: {"ok": true, "result": {...}}  or  {"ok": false, "error": "..."}
+
+crack, verify and find take an optional "construction" spec (see
+constructions.py); a cracked key's result carries the spec it was found
+under, to pass on to verify and find.
+
+Usage:
+python solver_daemon.py serve [socket_path]
+python solver_daemon.py crack PUZZLE.txt 9|mask [start_key] [end_key] [-1 charset ...] [--construction=SPEC]
+python solver_daemon.py verify PUZZLE.txt key [--construction=SPEC]
+python solver_daemon.py find PUZZLE.txt key [decoded.txt] [--construction=SPEC]
+python solver_daemon.py ping|shutdown
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from hash_backends import get_hasher
+from keyspace import KeySpace, parse_charset_options
+from puzzle_solver import (
+    FREQUENT_WORDS, TEXT_WORDS, find_duplicate_hashes, find_misspellings,
+    load_hashes, load_misspelling_wordlists, load_text, load_verification_wordlist,
+    swept_until, test_key_range, verify_key,
+)
+from workers import plan_workers
+
+DEFAULT_SOCKET = os.environ.get('PUZZLE_SOLVER_SOCKET', '/tmp/puzzle_solver.sock')
+
+# Keys per task when the daemon sweeps; small enough that a found key stops
+# the shared pool quickly, large enough to keep IPC overhead negligible
+BLOCK_SIZE = 200000
+
+# Crack requests whose key was verified, as a ring shared with the pool
+# workers: request id r is cancelled when slot r % CANCEL_SLOTS holds r
+CANCEL_SLOTS = 64
+_cancelled = None
+
+def _init_worker(cancelled):
+    global _cancelled
+    _cancelled = cancelled
+
+def crack_block(request_id, task):
+    """test_key_range, skipped once the request it belongs to is cancelled"""
+    if _cancelled is not None and _cancelled[request_id % CANCEL_SLOTS] == request_id:
+        return None
+    return test_key_range(task)
+
+class SolverState:
+    """Everything the daemon keeps warm between requests"""
+
+    def __init__(self, num_processes=None):
+        self.verification_wordlist = load_verification_wordlist()
+        self.misspelling_wordlists = load_misspelling_wordlists()
+        self.text_words_encoded = [(word, word.encode('utf-8')) for word in TEXT_WORDS]
+        get_hasher()  # calibrate md5 once, before the first request
+        plan = plan_workers(max_workers=num_processes)
+        print(plan.describe())
+        self.num_processes = plan.count
+        self.cancelled = multiprocessing.Array('q', [-1] * CANCEL_SLOTS, lock=False)
+        self.pool = plan.make_pool(initializer=_init_worker, initargs=(self.cancelled,))
+        self._request_ids = itertools.count()
+        self._puzzles = {}
+        self._lock = threading.Lock()
+
+    def new_request_id(self):
+        with self._lock:
+            return next(self._request_ids)
+
+    def cancel(self, request_id):
+        """Make the pool skip the request's blocks that have not started yet"""
+        self.cancelled[request_id % CANCEL_SLOTS] = request_id
+
+    def puzzle(self, puzzle_file):
+        """Return (hashes, hash_set, duplicates) for a puzzle, reloading if it changed"""
+        path = os.path.abspath(puzzle_file)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._puzzles.get(path)
+            if cached is None or cached[0] != mtime:
+                hashes = load_hashes(path)
+                cached = (mtime, hashes, set(hashes), find_duplicate_hashes(hashes))
+                self._puzzles[path] = cached
+        return cached[1:]
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+def handle_crack(state, request):
+    """Sweep a key range on the resident pool and verify candidates"""
+    puzzle_hashes, hash_set, duplicate_hashes = state.puzzle(request['puzzle'])
+    keyspace = KeySpace.from_spec(request['key_length'], request.get('charsets'))
+    start_key = int(request.get('start_key') or 0)
+    end_key = int(request.get('end_key') or len(keyspace))
+    constructions = request_constructions(request, puzzle_hashes)
+
+    # Key ranges not handed out yet, in key order. A block stops at its
+    # first promising key, so the rest of it goes back to the front when
+    # that key fails verification.
+    unswept = [(start_key, end_key)]
+
+    def next_task():
+        if not unswept:
+            return None
+        block_start, range_end = unswept.pop(0)
+        block_end = min(block_start + BLOCK_SIZE, range_end)
+        if block_end < range_end:
+            unswept.insert(0, (block_end, range_end))
+        return (block_start, block_end, 1, keyspace, duplicate_hashes, hash_set,
+                FREQUENT_WORDS, state.text_words_encoded, constructions)
+
+    # Keep a bounded window of blocks in flight, and once a key is verified
+    # cancel the request so the pool skips the blocks still queued for it
+    start_time = time.time()
+    request_id = state.new_request_id()
+    pending = []
+    candidates = []
+    window = state.num_processes * 2
+    while True:
+        while len(pending) < window:
+            task = next_task()
+            if task is None:
+                break
+            pending.append((task, state.pool.apply_async(crack_block, (request_id, task))))
+        if not pending:
+            break
+        task, async_result = pending.pop(0)
+        result = async_result.get()
+        if not result:
+            continue
+        stop = swept_until(task, result)
+        if stop < task[1]:
+            unswept.insert(0, (stop, task[1]))
+        key, construction = result[1], result[4]
+        candidates.append(key)
+        verified = verify_key(key, puzzle_hashes, state.verification_wordlist, save_to_file=False,
+                              hasher=construction)
+        if verified:
+            state.cancel(request_id)
+            key, hash_to_word, decoded_text, unmatched = verified
+            return {
+                'key': key,
+                'construction': construction.spec,
+                'matched': len(hash_to_word),
+                'decoded': decoded_text,
+                'unmatched': unmatched,
+                'candidates': candidates,
+                'elapsed': time.time() - start_time,
+            }
+    return {'key': None, 'candidates': candidates, 'elapsed': time.time() - start_time}
+
+def request_constructions(request, puzzle_hashes):
+    """The request's constructions (md5 by default) that fit the puzzle's digests"""
+    return applicable_constructions(parse_constructions(request.get('construction')), puzzle_hashes)
+
+def verify_request(state, request, puzzle_hashes):
+    """(construction, verify_key result) for the first construction the key verifies under"""
+    for construction in request_constructions(request, puzzle_hashes):
+        verified = verify_key(request['key'], puzzle_hashes, state.verification_wordlist,
+                              save_to_file=False, hasher=construction)
+        if verified:
+            return construction, verified
+    return None, None
+
+def handle_verify(state, request):
+    puzzle_hashes, _, _ = state.puzzle(request['puzzle'])
+    construction, verified = verify_request(state, request, puzzle_hashes)
+    if not verified:
+        return {'key': request['key'], 'verified': False}
+    key, hash_to_word, decoded_text, unmatched = verified
+    return {
+        'key': key,
+        'verified': True,
+        'construction': construction.spec,
+        'matched': len(hash_to_word),
+        'decoded': decoded_text,
+        'unmatched': unmatched,
+    }
+
+def handle_find(state, request):
+    puzzle_hashes, _, _ = state.puzzle(request['puzzle'])
+    decoded_text = request.get('decoded')
+    unmatched = request.get('unmatched')
+    if decoded_text is None or unmatched is None:
+        construction, verified = verify_request(state, request, puzzle_hashes)
+        if not verified:
+            return {'key': request['key'], 'misspellings': []}
+        _, _, verified_text, verified_unmatched = verified
+        decoded_text = verified_text if decoded_text is None else decoded_text
+        unmatched = verified_unmatched if unmatched is None else unmatched
+    else:
+        constructions = request_constructions(request, puzzle_hashes)
+        if not constructions:
+            raise ValueError("No construction produces digests of the length found in the puzzle")
+        construction = constructions[0]
+    found = find_misspellings(request['key'], unmatched, decoded_text,
+                              wordlists=state.misspelling_wordlists, save_to_file=False,
+                              hasher=construction)
+    return {
+        'key': request['key'],
+        'construction': construction.spec,
+        'misspellings': [{'word': w, 'variant': v, 'hash': h} for w, v, h in found],
+    }
+
+HANDLERS = {
+    'crack': handle_crack,
+    'verify': handle_verify,
+    'find': handle_find,
+    'ping': lambda state, request: {'pid': os.getpid(), 'processes': state.num_processes},
+}
+
+class SolverRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                cmd = request.get('cmd')
+                if cmd == 'shutdown':
+                    self._reply({'ok': True, 'result': 'shutting down'})
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+                if cmd not in HANDLERS:
+                    raise ValueError(f"unknown command: {cmd}")
+                started = time.time()
+                result = HANDLERS[cmd](self.server.state, request)
+                print(f"[daemon] {cmd} answered in {(time.time() - started) * 1000:.1f} ms")
+                self._reply({'ok': True, 'result': result})
+            except Exception as e:
+                self._reply({'ok': False, 'error': f"{type(e).__name__}: {e}"})
+
+    def _reply(self, payload):
+        self.wfile.write(json.dumps(payload).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+class SolverServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def daemon_listening(socket_path=DEFAULT_SOCKET):
+    """Whether something accepts connections on socket_path"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+def serve(socket_path=DEFAULT_SOCKET):
+    """Load state, start the worker pool and serve requests until shutdown"""
+    if os.path.exists(socket_path):
+        # Only a stale socket left by a dead daemon may be replaced
+        if daemon_listening(socket_path):
+            print(f"A solver daemon is already listening on {socket_path}")
+            sys.exit(1)
+        os.unlink(socket_path)
+    # The pool forks here, before any server threads exist
+    state = SolverState()
+    server = SolverServer(socket_path, SolverRequestHandler)
+    server.state = state
+    print(f"Solver daemon listening on {socket_path} with {state.num_processes} processes")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        state.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def request(payload, socket_path=DEFAULT_SOCKET):
+    """Send one request to the daemon and return its decoded response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+def build_request(command, args):
+    """Translate puzzle_solver.py-style arguments into a daemon request"""
+    if command == 'crack' and len(args) >= 2:
+        charsets, args = parse_charset_options(args)
+        construction, args = pop_construction_option(args)
+        return {
+            'cmd': 'crack', 'puzzle': os.path.abspath(args[0]), 'key_length': args[1],
+            'charsets': charsets, 'construction': construction,
+            'start_key': int(args[2]) if len(args) > 2 else None,
+            'end_key': int(args[3]) if len(args) > 3 else None,
+        }
+    if command in ('verify', 'find'):
+        construction, args = pop_construction_option(args)
+    if command == 'verify' and len(args) >= 2:
+        return {'cmd': 'verify', 'puzzle': os.path.abspath(args[0]), 'key': args[1],
+                'construction': construction}
+    if command == 'find' and len(args) >= 2:
+        payload = {'cmd': 'find', 'puzzle': os.path.abspath(args[0]), 'key': args[1],
+                   'construction': construction}
+        if len(args) > 2:
+            payload['decoded'] = load_text(args[2])
+        return payload
+    if command in ('ping', 'shutdown'):
+        return {'cmd': command}
+    return None
+
+def main():
+    """Main entry point"""
+    if len(sys.argv) < 2:
+        print("Usage: python solver_daemon.py [serve|crack|verify|find|ping|shutdown] [arguments...]")
+        return
+
+    command = sys.argv[1].lower()
+    args = sys.argv[2:]
+
+    if command == 'serve':
+        serve(args[0] if args else DEFAULT_SOCKET)
+        return
+
+    payload = build_request(command, args)
+    if payload is None:
+        print(f"Bad arguments for command: {command}")
+        print(__doc__)
+        return
+
+    start_time = time.time()
+    response = request(payload)
+    if not response['ok']:
+        print(f"Error: {response['error']}")
+        sys.exit(1)
+    print(json.dumps(response['result'], indent=2))
+    print(f"Answered in {(time.time() - start_time) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+
+from puzzle_solver import find_misspellings, load_hashes, verify_key
+
+# The hard puzzle's key and misspelling (hw6-puzzlesolution.txt)
+PUZZLE_KEY = '485066843'
+
+
+@unittest.skipUnless(os.path.exists('PUZZLE.txt'), "needs PUZZLE.txt in the working directory")
+class HardPuzzleMisspellingTest(unittest.TestCase):
+    def test_finds_the_known_misspelling(self):
+        _, _, decoded_text, unmatched = verify_key(PUZZLE_KEY, load_hashes('PUZZLE.txt'), save_to_file=False)
+        # The common words of the (filled-in) text are enough to reach it
+        found = find_misspellings(PUZZLE_KEY, unmatched, decoded_text, wordlists=[], save_to_file=False)
+        self.assertIn(('waiting', 'wkitpng'), [(word, variant) for word, variant, _ in found])
+        # A proper noun landing on another slot's hash is that slot's word, not a typo
+        self.assertNotIn('Huck', [variant for _, variant, _ in found])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Typo model for misspelling search.
+
+generate_hamming_variants() lists every substitution of up to two letters
+in alphabetical order, so a likely slip (a neighbouring key, a swapped
+vowel, a case flip, a doubled letter) waits behind tens of thousands of
+unlikely ones. typo_variants() produces exactly the same set of variants,
+but best-first: every substitution gets a probability from the model
+below, and a variant's probability is the product of its substitutions.
+Variants come off a priority queue whose frontier grows with the number
+of variants taken, so asking for the first few thousand never builds the
+full set. unlikely_typos() continues the same order past that head.
+"""
+
+import heapq
+import math
+import string
+from itertools import islice
+
+LETTERS = string.ascii_lowercase + string.ascii_uppercase
+VOWELS = set('aeiouAEIOU')
+
+QWERTY_ROWS = ('qwertyuiop', 'asdfghjkl', 'zxcvbnm')
+
+# How many best-first variants count as the likely typos of a word; the
+# searches hash these for every candidate before any of the long tail
+TYPO_HEAD = 2000
+
+# Relative weight of each kind of slip against an arbitrary substitution
+WEIGHTS = {
+    'adjacent': 40.0,   # neighbouring key on a QWERTY keyboard
+    'case': 25.0,       # same letter, other case
+    'vowel': 15.0,      # one vowel for another
+    'double': 10.0,     # repeats the letter next to it
+    'other': 1.0,       # any other letter of the same case
+    'other_case': 0.2,  # any other letter of the other case
+}
+
+def _keyboard_neighbours():
+    neighbours = {c: set() for row in QWERTY_ROWS for c in row}
+    for r, row in enumerate(QWERTY_ROWS):
+        for i, c in enumerate(row):
+            for dr, di in ((0, -1), (0, 1), (-1, 0), (-1, 1), (1, -1), (1, 0)):
+                rr, ii = r + dr, i + di
+                if 0 <= rr < len(QWERTY_ROWS) and 0 <= ii < len(QWERTY_ROWS[rr]):
+                    neighbours[c].add(QWERTY_ROWS[rr][ii])
+    return neighbours
+
+NEIGHBOURS = _keyboard_neighbours()
+
+def substitution_weight(word, pos, c):
+    """Unnormalised weight of typing c instead of word[pos]"""
+    original = word[pos]
+    if c.lower() == original.lower():
+        return WEIGHTS['case']
+    same_case = c.islower() == original.islower() or not original.isalpha()
+    weight = WEIGHTS['other'] if same_case else WEIGHTS['other_case']
+    if same_case and c.lower() in NEIGHBOURS.get(original.lower(), ()):
+        weight += WEIGHTS['adjacent']
+    if same_case and original in VOWELS and c in VOWELS:
+        weight += WEIGHTS['vowel']
+    if (pos > 0 and word[pos - 1] == c) or (pos + 1 < len(word) and word[pos + 1] == c):
+        weight += WEIGHTS['double']
+    return weight
+
+def substitutions(word, pos):
+    """(-log p, char) for every letter that can replace word[pos], most likely first"""
+    options = [(substitution_weight(word, pos, c), c) for c in LETTERS if c != word[pos]]
+    total = sum(weight for weight, _ in options)
+    return sorted((-math.log(weight / total), c) for weight, c in options)
+
+def typo_variants(word, max_distance=2):
+    """Yield the variants of generate_hamming_variants(word) most likely first
+
+    Each queue entry is a tuple of positions with an index into each
+    position's sorted substitution list; popping an entry pushes its
+    successors (one index advanced), so every variant is reached exactly
+    once and in order of its total cost.
+    """
+    if not word:
+        return
+    subs = [substitutions(word, pos) for pos in range(len(word))]
+    queue = []
+    for pos in range(len(word)):
+        queue.append((subs[pos][0][0], (pos,), (0,)))
+    if max_distance >= 2:
+        for p1 in range(len(word)):
+            for p2 in range(p1 + 1, len(word)):
+                queue.append((subs[p1][0][0] + subs[p2][0][0], (p1, p2), (0, 0)))
+    heapq.heapify(queue)
+
+    while queue:
+        cost, positions, indices = heapq.heappop(queue)
+        chars = list(word)
+        for pos, index in zip(positions, indices):
+            chars[pos] = subs[pos][index][1]
+        yield ''.join(chars)
+
+        # Advance one index at a time; only advance an earlier index while
+        # the later ones are still 0, so no entry is pushed twice
+        for k in range(len(indices)):
+            if any(indices[k + 1:]):
+                continue
+            if indices[k] + 1 < len(subs[positions[k]]):
+                advanced = list(indices)
+                advanced[k] += 1
+                new_cost = sum(subs[p][i][0] for p, i in zip(positions, advanced))
+                heapq.heappush(queue, (new_cost, positions, tuple(advanced)))
+
+def likely_typos(word, limit=TYPO_HEAD):
+    """The limit most likely variants of word"""
+    return list(islice(typo_variants(word), limit))
+
+def unlikely_typos(word, skip=TYPO_HEAD, max_distance=2):
+    """typo_variants(word) after its first skip variants, in the same order
+
+    The queue pops entries in ascending (cost, positions, indices) order,
+    so sorting every entry up front yields the same sequence; for the long
+    tail that is cheaper than running the queue through the head again.
+    """
+    if not word:
+        return []
+    subs = [substitutions(word, pos) for pos in range(len(word))]
+    entries = [(cost, (pos,), (i,)) for pos in range(len(word)) for i, (cost, _) in enumerate(subs[pos])]
+    if max_distance >= 2:
+        for p1 in range(len(word)):
+            for p2 in range(p1 + 1, len(word)):
+                positions = (p1, p2)
+                second = list(enumerate(subs[p2]))
+                entries.extend((c1 + c2, positions, (i1, i2))
+                               for i1, (c1, _) in enumerate(subs[p1]) for i2, (c2, _) in second)
+    entries.sort()
+    tail = []
+    for _, positions, indices in entries[skip:]:
+        chars = list(word)
+        for pos, index in zip(positions, indices):
+            chars[pos] = subs[pos][index][1]
+        tail.append(''.join(chars))
+    return tail
@@ -1,6 +1,12 @@
-import hashlib
 import sys
 
+from constructions import applicable_constructions, parse_constructions, pop_construction_option
+from hash_backends import get_hasher
+from workers import plan_workers
+
+# Unions smaller than this hash faster in-process than a Pool starts up
+PARALLEL_MIN_WORDS = 200000
+
 def load_hashes(puzzle_file):
     """Load all hash values from the puzzle file"""
     with open(puzzle_file, 'r') as f:
@@ -11,13 +17,59 @@ def load_words(wordlist_file):
     with open(wordlist_file, 'r') as f:
         return [line.strip() for line in f if line.strip()]
 
-def verify_known_key(puzzle_file, key, wordlist_file=None):
-    """Verify a known key works with the puzzle"""
+def union_wordlists(wordlists):
+    """One deduplicated word list plus the names of the lists each word came from
+
+    Words keep the position of their first appearance, so earlier lists
+    win when two words decode the same hash.
+    """
+    sources = {}
+    for wordlist_name, wordlist in wordlists:
+        for word in wordlist:
+            names = sources.setdefault(word, [])
+            if not names or names[-1] != wordlist_name:
+                names.append(wordlist_name)
+    return list(sources), sources
+
+def match_word_chunk(args):
+    """(word, hash) for every word in the chunk whose hash is in the puzzle"""
+    key_encoded, words, hash_set, construction = args
+    word_hashes = construction.many(key_encoded, [word.encode('utf-8') for word in words])
+    return [(word, h) for word, h in zip(words, word_hashes) if h in hash_set]
+
+def match_words(key_encoded, words, hash_set, construction):
+    """Hash every word once, in parallel for large lists; matches in word order"""
+    plan = plan_workers()
+    if len(words) < PARALLEL_MIN_WORDS or plan.count == 1:
+        return match_word_chunk((key_encoded, words, hash_set, construction))
+    chunk_size = -(-len(words) // (plan.count * 4))
+    tasks = [(key_encoded, words[i:i + chunk_size], hash_set, construction)
+             for i in range(0, len(words), chunk_size)]
+    with plan.make_pool() as pool:
+        # map keeps the chunks in order, so the first-seen word still wins
+        return [match for chunk in pool.map(match_word_chunk, tasks) for match in chunk]
+
+def verify_known_key(puzzle_file, key, wordlist_file=None, constructions=None):
+    """Verify a known key works with the puzzle
+
+    Every wordlist goes into one deduplicated union, hashed once per
+    construction; returns (hash_to_word, decoded_text, unmatched_hashes,
+    coverage) for the construction that decodes the most hashes, where
+    coverage maps each list to [hashes its words decode, hashes only it
+    decodes].
+    """
     puzzle_hashes = load_hashes(puzzle_file)
     hash_set = set(puzzle_hashes)
     
     # Try with encoded key
     key_encoded = str(key).encode('utf-8')
+    get_hasher()  # calibrate once here and report the backend
+    if constructions is None:
+        constructions = parse_constructions()
+    constructions = applicable_constructions(constructions, puzzle_hashes)
+    if not constructions:
+        print("No construction produces digests of the length found in the puzzle")
+        return {}, " ".join(["[MISSING]"] * len(puzzle_hashes)), list(puzzle_hashes), {}
     
     # Try with different wordlists
     wordlists = []
@@ -44,29 +96,38 @@ def verify_known_key(puzzle_file, key, wordlist_file=None):
         ]
         wordlists.append(('built-in common words', common_words))
     
-    best_match_count = 0
-    best_hash_to_word = {}
-    best_wordlist = None
+    words, sources = union_wordlists(wordlists)
+    print(f"Testing with {len(wordlists)} wordlists: {len(words)} distinct words "
+          f"out of {sum(len(wordlist) for _, wordlist in wordlists)}")
     
-    for wordlist_name, wordlist in wordlists:
-        print(f"Testing with wordlist: {wordlist_name} ({len(wordlist)} words)")
-        
+    best_hash_to_word = {}
+    best_construction = constructions[0]
+    for construction in constructions:
         hash_to_word = {}
-        matched_count = 0
-        
-        for word in wordlist:
-            h = hashlib.md5(key_encoded + word.encode('utf-8')).hexdigest()
-            if h in hash_set:
-                hash_to_word[h] = word
-                matched_count += 1
-        
-        match_ratio = matched_count / len(puzzle_hashes)
-        print(f"Key {key} matched {matched_count}/{len(puzzle_hashes)} hashes ({match_ratio:.1%})")
-        
-        if matched_count > best_match_count:
-            best_match_count = matched_count
-            best_hash_to_word = hash_to_word
-            best_wordlist = wordlist_name
+        for word, h in match_words(key_encoded, words, hash_set, construction):
+            hash_to_word.setdefault(h, word)
+        if len(constructions) > 1:
+            print(f"  {construction.name}: {len(hash_to_word)} distinct hashes decoded")
+        if len(hash_to_word) > len(best_hash_to_word):
+            best_hash_to_word, best_construction = hash_to_word, construction
+    
+    # Coverage per list: puzzle hashes its own words decode, and how many of
+    # those no other list could have decoded
+    coverage = {}
+    for wordlist_name, _ in wordlists:
+        coverage[wordlist_name] = [0, 0]
+    for h in puzzle_hashes:
+        word = best_hash_to_word.get(h)
+        for wordlist_name in sources.get(word, ()):
+            coverage[wordlist_name][0] += 1
+            if len(sources[word]) == 1:
+                coverage[wordlist_name][1] += 1
+    
+    best_match_count = sum(1 for h in puzzle_hashes if h in best_hash_to_word)
+    best_wordlist = f"union of {len(wordlists)} wordlists, {best_construction.name}"
+    for wordlist_name, (matched_count, unique_count) in coverage.items():
+        print(f"  {wordlist_name}: {matched_count}/{len(puzzle_hashes)} hashes "
+              f"({matched_count / len(puzzle_hashes):.1%}), {unique_count} only from this list")
     
     print(f"\nBest match: {best_match_count}/{len(puzzle_hashes)} hashes ({best_match_count/len(puzzle_hashes):.1%}) using {best_wordlist}")
     
@@ -92,6 +153,8 @@ def verify_known_key(puzzle_file, key, wordlist_file=None):
     with open('verification_results.txt', 'w') as f:
         f.write(f"Key: {key}\n")
         f.write(f"Best match: {best_match_count}/{len(puzzle_hashes)} hashes ({best_match_count/len(puzzle_hashes):.1%}) using {best_wordlist}\n")
+        for wordlist_name, (matched_count, unique_count) in coverage.items():
+            f.write(f"  {wordlist_name}: {matched_count} hashes, {unique_count} only from this list\n")
         f.write("\nPartially decoded message:\n")
         f.write(" ".join(decoded))
         f.write("\n\nUnmatched hashes:\n")
@@ -99,14 +162,16 @@ def verify_known_key(puzzle_file, key, wordlist_file=None):
             f.write(h + "\n")
     
     print("\nResults saved to verification_results.txt")
+    return best_hash_to_word, " ".join(decoded), unmatched_hashes, coverage
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python verify_key.py PUZZLE.txt key [wordlist_file]")
+    construction_spec, argv = pop_construction_option(sys.argv[1:])
+    if len(argv) < 2:
+        print("Usage: python verify_key.py PUZZLE.txt key [wordlist_file] [--construction=SPEC]")
         sys.exit(1)
     
-    puzzle_file = sys.argv[1]
-    key = sys.argv[2]
-    wordlist_file = sys.argv[3] if len(sys.argv) > 3 else None
+    puzzle_file = argv[0]
+    key = argv[1]
+    wordlist_file = argv[2] if len(argv) > 2 else None
     
-    verify_known_key(puzzle_file, key, wordlist_file) 
\ No newline at end of file
+    verify_known_key(puzzle_file, key, wordlist_file, parse_constructions(construction_spec)) 
\ No newline at end of file
@@ -0,0 +1,375 @@
+"""
+Worker pool sizing for the crackers.
+
+cpu_count() reports every CPU on the host, which is wrong in two ways: the
+process may be restricted to fewer CPUs by its affinity mask (taskset,
+cpusets), and a container's CFS quota may allow less CPU time than the
+CPUs it can see. plan_workers() takes the smaller of the two, applies an
+optional oversubscription factor, and can pin each Pool worker to one CPU.
+
+Environment overrides:
+    CRACK_WORKERS=N           use exactly N workers
+    CRACK_OVERSUBSCRIBE=1.5   workers per usable CPU (default 1.0)
+    CRACK_PIN_CPUS=1          pin each worker to a CPU from the affinity set
+
+Supervisor wraps a plan's Pool for long sweeps. multiprocessing.Pool
+replaces a worker that dies (OOM kill, segfault) but silently drops the
+task it was running, so whoever waits for that result hangs. Workers
+announce each task they start, and report_progress() lets a task say how
+far it got; the supervisor notices tasks whose worker is gone, requeues
+the unfinished part on the replacement worker (which runs the pool
+initializer again) and appends the incident to worker_incidents.log.
+"""
+
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pool, SimpleQueue, TimeoutError, Value, cpu_count
+
+def affinity_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(cpu_count()))
+
+def _with_ancestors(mount, path):
+    """mount/path and every cgroup above it, up to the mount itself"""
+    parts = [part for part in path.split('/') if part]
+    return [os.path.join(mount, *parts[:depth]) for depth in range(len(parts), -1, -1)]
+
+def _cgroup_paths():
+    """Cgroup directories whose quota limits this process (v2 first, then v1)
+
+    A quota set on any ancestor applies to everything below it, so each
+    list holds the process's own cgroup and all of its ancestors.
+    """
+    v2 = []
+    v1 = []
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                _, controllers, path = line.strip().split(':', 2)
+                if controllers == '':
+                    v2.extend(_with_ancestors('/sys/fs/cgroup', path))
+                elif 'cpu' in controllers.split(','):
+                    for mount in ('/sys/fs/cgroup/cpu,cpuacct', '/sys/fs/cgroup/cpu'):
+                        v1.extend(_with_ancestors(mount, path))
+    except OSError:
+        pass
+    v2.append('/sys/fs/cgroup')
+    v1.extend(['/sys/fs/cgroup/cpu,cpuacct', '/sys/fs/cgroup/cpu'])
+    return list(dict.fromkeys(v2)), list(dict.fromkeys(v1))
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cgroup_cpu_limit():
+    """Tightest CPU quota in CPUs (e.g. 2.5) from cgroup v2 or v1, or None if unlimited"""
+    v2_paths, v1_paths = _cgroup_paths()
+    found = False
+    limits = []
+    for path in v2_paths:
+        value = _read(os.path.join(path, 'cpu.max'))
+        if value:
+            found = True
+            quota, _, period = value.partition(' ')
+            if quota != 'max':
+                limits.append(int(quota) / int(period or 100000))
+    if not found:
+        for path in v1_paths:
+            quota = _read(os.path.join(path, 'cpu.cfs_quota_us'))
+            period = _read(os.path.join(path, 'cpu.cfs_period_us'))
+            if quota and period and int(quota) > 0:
+                limits.append(int(quota) / int(period))
+    return min(limits) if limits else None
+
+class WorkerPlan:
+    """How many workers to start, on which CPUs, and why"""
+
+    def __init__(self, count, cpus, quota, oversubscribe, pin, forced=False):
+        self.count = count
+        self.cpus = cpus
+        self.quota = quota
+        self.oversubscribe = oversubscribe
+        self.pin = pin
+        self.forced = forced
+
+    def describe(self):
+        parts = [f"affinity {len(self.cpus)} CPUs"]
+        parts.append(f"cgroup quota {self.quota:.2f} CPUs" if self.quota else "no cgroup quota")
+        if self.forced:
+            parts.append("count forced by CRACK_WORKERS")
+        elif self.oversubscribe != 1.0:
+            parts.append(f"oversubscribe x{self.oversubscribe:g}")
+        parts.append("pinned" if self.pin else "not pinned")
+        return f"Workers: {self.count} ({', '.join(parts)})"
+
+    def make_pool(self, initializer=None, initargs=()):
+        """Start a multiprocessing Pool following this plan"""
+        if not self.pin:
+            return Pool(self.count, initializer=initializer, initargs=initargs)
+        return Pool(self.count, initializer=_pin_and_init,
+                    initargs=(self.cpus, Value('i', 0), initializer, initargs))
+
+    def make_executor(self, initializer=None, initargs=()):
+        """Start a concurrent.futures ProcessPoolExecutor following this plan"""
+        if not self.pin:
+            return ProcessPoolExecutor(self.count, initializer=initializer, initargs=initargs)
+        return ProcessPoolExecutor(self.count, initializer=_pin_and_init,
+                                   initargs=(self.cpus, Value('i', 0), initializer, initargs))
+
+def _pin_and_init(cpus, started, initializer, initargs):
+    # Each worker takes the next number from the pool's shared counter, so
+    # replacements keep counting upward and rotate through the CPUs
+    with started.get_lock():
+        index = started.value
+        started.value += 1
+    os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+    if initializer is not None:
+        initializer(*initargs)
+
+def plan_workers(oversubscribe=None, pin=None, max_workers=None):
+    """Decide the worker count from affinity, cgroup quota and settings"""
+    cpus = affinity_cpus()
+    quota = cgroup_cpu_limit()
+    if oversubscribe is None:
+        oversubscribe = float(os.environ.get('CRACK_OVERSUBSCRIBE', '1.0'))
+    if pin is None:
+        pin = os.environ.get('CRACK_PIN_CPUS', '0') not in ('', '0', 'false', 'no')
+    pin = pin and hasattr(os, 'sched_setaffinity')
+
+    forced = os.environ.get('CRACK_WORKERS')
+    if forced:
+        return WorkerPlan(max(1, int(forced)), cpus, quota, oversubscribe, pin, forced=True)
+
+    usable = len(cpus)
+    if quota is not None:
+        # Round the quota down: a fractional CPU's worth of extra workers
+        # only gets throttled by the CFS scheduler
+        usable = min(usable, max(1, math.floor(quota)))
+    count = max(1, int(round(usable * oversubscribe)))
+    if max_workers is not None:
+        count = min(count, max_workers)
+    return WorkerPlan(count, cpus, quota, oversubscribe, pin)
+
+# ======= Supervision =======
+INCIDENT_LOG = 'worker_incidents.log'
+
+# Set in each supervised worker by _supervised_init
+_events = None
+_current = None
+
+def report_progress(value):
+    """Record how far the current task got (a no-op outside a Supervisor)"""
+    if _events is not None and _current is not None:
+        _events.put(('progress', _current, value, None))
+
+def _supervised_init(events, initializer, initargs):
+    global _events
+    _events = events
+    if initializer is not None:
+        initializer(*initargs)
+
+def _supervised_call(args):
+    global _current
+    ident, func, task = args
+    _current = ident
+    _events.put(('start', ident, None, os.getpid()))
+    try:
+        return func(task)
+    finally:
+        _current = None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class SupervisedTask:
+    """One submitted task, tracked across requeues"""
+
+    def __init__(self, task_id, func, task, callback, error_callback, resume):
+        self.task_id = task_id
+        self.func = func
+        self.task = task
+        self.callback = callback
+        self.error_callback = error_callback
+        self.resume = resume
+        self.attempt = 0
+        self.pid = None
+        self.progress = None
+        self.suspect = False
+
+    def describe(self, task=None):
+        task = self.task if task is None else task
+        return repr(tuple(task[:2])) if isinstance(task, tuple) else repr(task)
+
+class Supervisor:
+    """A Pool whose tasks survive the death of the worker running them"""
+
+    def __init__(self, plan, initializer=None, initargs=(), incident_log=INCIDENT_LOG):
+        self.events = SimpleQueue()
+        self.pool = plan.make_pool(initializer=_supervised_init, initargs=(self.events, initializer, initargs))
+        self.incident_log = incident_log
+        self.incidents = []
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.terminate()
+
+    def apply_async(self, func, task, callback=None, error_callback=None, resume=None):
+        """Submit func(task); resume(task, progress) builds the retry after a crash"""
+        with self._lock:
+            self._next_id += 1
+            handle = SupervisedTask(self._next_id, func, task, callback, error_callback, resume)
+            self._tasks[handle.task_id] = handle
+        self._submit(handle)
+        return handle
+
+    def _submit(self, handle):
+        ident = (handle.task_id, handle.attempt)
+        self.pool.apply_async(_supervised_call, ((ident, handle.func, handle.task),),
+                              callback=lambda result: self._finished(ident, result, False),
+                              error_callback=lambda error: self._finished(ident, error, True))
+
+    def _finished(self, ident, value, failed):
+        task_id, attempt = ident
+        with self._lock:
+            handle = self._tasks.get(task_id)
+            if handle is None or handle.attempt != attempt:
+                return
+            del self._tasks[task_id]
+        target = handle.error_callback if failed else handle.callback
+        if target is not None:
+            target(value)
+
+    def check(self):
+        """Requeue tasks whose worker died; returns how many were requeued"""
+        while not self.events.empty():
+            kind, ident, value, pid = self.events.get()
+            task_id, attempt = ident
+            with self._lock:
+                handle = self._tasks.get(task_id)
+            if handle is None or handle.attempt != attempt:
+                continue
+            if kind == 'start':
+                handle.pid = pid
+            else:
+                handle.progress = value
+
+        with self._lock:
+            running = [h for h in self._tasks.values() if h.pid is not None]
+        requeued = 0
+        for handle in running:
+            if _pid_alive(handle.pid):
+                continue
+            # Give the result handler one more round in case the worker
+            # delivered its result just before it went away
+            if not handle.suspect:
+                handle.suspect = True
+                continue
+            self._requeue(handle)
+            requeued += 1
+        return requeued
+
+    def _requeue(self, handle):
+        dead_pid = handle.pid
+        old = handle.describe()
+        if handle.resume is not None and handle.progress is not None:
+            handle.task = handle.resume(handle.task, handle.progress)
+        with self._lock:
+            handle.attempt += 1
+            handle.pid = None
+            handle.progress = None
+            handle.suspect = False
+        incident = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'pid': dead_pid,
+            'task': old,
+            'requeued': handle.describe(),
+            'attempt': handle.attempt,
+        }
+        self.incidents.append(incident)
+        print(f"[supervisor] worker {dead_pid} died running {old}; requeued {incident['requeued']}")
+        try:
+            with open(self.incident_log, 'a') as f:
+                f.write(json.dumps(incident) + '\n')
+        except OSError:
+            pass
+        self._submit(handle)
+
+    def pending(self):
+        with self._lock:
+            return len(self._tasks)
+
+    def imap_unordered(self, func, tasks, resume=None):
+        """Results in completion order; next(timeout) also runs check()"""
+        return SupervisedResults(self, func, tasks, resume)
+
+    def close(self):
+        self.pool.close()
+
+    def join(self):
+        if self.incidents:
+            # The results of the dead workers' tasks never arrive, and
+            # Pool.join() would wait for them forever; everything else has
+            # finished by now, so stop the pool instead
+            self.pool.terminate()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+class SupervisedResults:
+    """Iterator over supervised results, like Pool.imap_unordered"""
+
+    def __init__(self, supervisor, func, tasks, resume=None):
+        self.supervisor = supervisor
+        self.results = queue.Queue()
+        self.remaining = 0
+        for task in tasks:
+            supervisor.apply_async(func, task, callback=lambda r: self.results.put((False, r)),
+                                   error_callback=lambda e: self.results.put((True, e)), resume=resume)
+            self.remaining += 1
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self, timeout=None):
+        if not self.remaining:
+            raise StopIteration
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.supervisor.check()
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            try:
+                failed, value = self.results.get(timeout=max(0.0, wait))
+                break
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError
+        self.remaining -= 1
+        if failed:
+            raise value
+        return value